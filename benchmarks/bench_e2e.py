@@ -0,0 +1,189 @@
+"""Measure a full sync against local Gradescope, Google Calendar and CalDAV servers.
+
+Usage: python -m benchmarks.bench_e2e [--courses N] [--assignments N]
+                                      [--latency MS] [--max-workers N]
+                                      [--parser NAME] [--details]
+                                      [--error-rate F] [--rate N] [--pipeline]
+                                      [--terms N] [--all-terms] [--json]
+
+Every step is run twice, the second run shows the cost of a sync where
+nothing changed. With --pipeline the load and the three writes are a single
+step running them at the same time with GradescopeCalendar.sync(). With
+--terms the courses are split over several terms of which only the most recent
+is loaded, unless --all-terms is passed. Wall time, the requests received by the local servers and
+the peak memory allocated by Python (tracemalloc, which also slows the steps
+down; pass --no-memory to time without it) are reported for every step.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.servers import FakeCalDAV, FakeGoogleCalendar, FakeGradescope
+from gradescopecalendar.calendars.gcal import GCal
+from gradescopecalendar.gradescope.transport import GSTransport, TokenBucket
+from gradescopecalendar.gradescopecalendar import GradescopeCalendar
+
+
+class BenchmarkGCal(GCal):
+    """GCal talking to the local Google Calendar API without OAuth."""
+
+    def __init__(self, server: FakeGoogleCalendar) -> None:
+        super().__init__()
+        self.server = server
+
+    def _gcal_api_setup(self):
+        return self.server.service()
+
+
+def measure(name: str, step, servers: list, memory: bool = True) -> dict:
+    """Run a step and collect its wall time, requests and peak memory."""
+
+    requests_before = [server.total_requests() for server in servers]
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    step()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    requests = sum(
+        server.total_requests() - before
+        for server, before in zip(servers, requests_before)
+    )
+    return {"step": name, "seconds": seconds, "requests": requests, "peak_bytes": peak}
+
+
+def run(args) -> list[dict]:
+    latency = args.latency / 1000
+    results = []
+    with FakeGradescope(
+        args.courses, args.assignments, latency, args.error_rate, args.terms
+    ) as gradescope, FakeGoogleCalendar(latency) as google, FakeCalDAV(
+        latency
+    ) as caldav, tempfile.TemporaryDirectory() as tmp:
+        servers = [gradescope, google, caldav]
+        options = {
+            "max_workers": args.max_workers,
+            "parser": args.parser,
+            "base_url": gradescope.url,
+            "state": str(Path(tmp, "state.db")) if args.state else False,
+            "details": str(Path(tmp, "details")) if args.details else False,
+            "terms": "all" if args.all_terms else "active",
+            # Short backoff so injected errors do not dominate the timings
+            "transport": GSTransport(
+                backoff=0.01,
+                pool_size=args.max_workers,
+                rate_limiter=TokenBucket(args.rate, args.max_workers)
+                if args.rate
+                else None,
+            ),
+        }
+        calendars = []
+        caldav_url = f"{caldav.url}{FakeCalDAV.HOME}"
+
+        def load() -> None:
+            calendars.append(
+                GradescopeCalendar("bench@example.com", "password", **options)
+            )
+
+        def sync() -> None:
+            calendar = GradescopeCalendar(
+                "bench@example.com", "password", load=False, **options
+            )
+            calendars.append(calendar)
+            calendar.sync(
+                {
+                    "ical": {"path": tmp},
+                    "caldav": {"url": caldav_url, "calName": "Gradescope"},
+                    "gcal": lambda assignments: BenchmarkGCal(google).write_to_gcal(
+                        assignments, calendar.state
+                    ),
+                }
+            )
+
+        steps = [
+            ("load", load),
+            ("write_to_ical", lambda: calendars[-1].write_to_ical(tmp)),
+            (
+                "write_to_caldav",
+                lambda: calendars[-1].write_to_caldav(
+                    url=caldav_url, calName="Gradescope"
+                ),
+            ),
+            (
+                "write_to_gcal",
+                lambda: BenchmarkGCal(google).write_to_gcal(
+                    calendars[-1].assignments_all, calendars[-1].state
+                ),
+            ),
+        ]
+        if args.pipeline:
+            steps = [("sync", sync)]
+        for run_name in ("first", "unchanged"):
+            for name, step in steps:
+                result = measure(name, step, servers, args.memory)
+                result["run"] = run_name
+                results.append(result)
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--courses", type=int, default=20, help="in all terms")
+    parser.add_argument("--assignments", type=int, default=50, help="per course")
+    parser.add_argument("--latency", type=float, default=0, help="ms per request")
+    parser.add_argument("--max-workers", type=int, default=1)
+    parser.add_argument("--parser", default="html.parser")
+    parser.add_argument("--state", action="store_true", help="use a sync state")
+    parser.add_argument(
+        "--details", action="store_true", help="fetch the assignment details"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0, help="fraction of failed Gradescope GETs"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0, help="Gradescope requests per second"
+    )
+    parser.add_argument(
+        "--terms", type=int, default=1, help="terms the courses are split over"
+    )
+    parser.add_argument(
+        "--all-terms", action="store_true", help="load the courses of every term"
+    )
+    parser.add_argument(
+        "--pipeline", action="store_true", help="load and write at the same time"
+    )
+    parser.add_argument("--no-memory", dest="memory", action="store_false")
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    print(
+        f"{args.courses} courses x {args.assignments} assignments, "
+        f"{args.latency:g} ms latency, {args.max_workers} workers"
+    )
+    print(f"{'run':<10} {'step':<16} {'seconds':>8} {'requests':>9} {'peak MiB':>9}")
+    for result in results:
+        peak = result["peak_bytes"]
+        print(
+            f"{result['run']:<10} {result['step']:<16} {result['seconds']:>8.3f} "
+            f"{result['requests']:>9} "
+            f"{peak / 2**20 if peak is not None else float('nan'):>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,60 @@
+"""Measure the time to import the package with and without the calendar backends.
+
+Usage: python -m benchmarks.bench_import [runs]
+
+Every scenario is imported in a new interpreter so nothing is cached between
+runs. "all backends" is what importing the package cost before the backends
+were loaded lazily.
+"""
+
+from __future__ import annotations
+
+import statistics
+import subprocess
+import sys
+
+PACKAGE = "import gradescopecalendar.gradescopecalendar"
+SCENARIOS = {
+    "package": PACKAGE,
+    "package + ical": f"{PACKAGE}; "
+    "from gradescopecalendar.calendars import get_backend; get_backend('ical')",
+    "package + caldav": f"{PACKAGE}; "
+    "from gradescopecalendar.calendars import get_backend; get_backend('caldav')",
+    "package + gcal": f"{PACKAGE}; "
+    "from gradescopecalendar.calendars import get_backend; get_backend('gcal')",
+    "all backends": f"{PACKAGE}; "
+    "from gradescopecalendar.calendars import BACKENDS, get_backend; "
+    "[get_backend(name) for name in BACKENDS]",
+}
+TIMER = (
+    "import time; start = time.perf_counter(); {code}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def import_time(code: str) -> float:
+    """Seconds taken by the code in a new interpreter, None if it failed."""
+
+    result = subprocess.run(
+        [sys.executable, "-c", TIMER.format(code=code)],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main(runs: int = 10) -> None:
+    print(f"median of {runs} runs")
+    print(f"{'scenario':<18} {'ms':>8}")
+    for name, code in SCENARIOS.items():
+        times = [import_time(code) for _ in range(runs)]
+        if None in times:
+            print(f"{name:<18} {'n/a':>8}  (dependencies not installed)")
+            continue
+        print(f"{name:<18} {statistics.median(times) * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
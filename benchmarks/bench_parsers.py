@@ -0,0 +1,91 @@
+"""Compare the HTML parsing backends on the saved Gradescope page fixtures.
+
+Usage: python -m benchmarks.bench_parsers [iterations]
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from gradescopecalendar.gradescope.parsers import PARSERS, get_parser
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def legacy_auth_token(html: str) -> str:
+    """Token extraction as done before the parser backends existed."""
+
+    auth_token = None
+    for form in BeautifulSoup(html, "html.parser").find_all("form"):
+        if form.get("action") == "/login":
+            for inp in form.find_all("input"):
+                if inp.get("name") == "authenticity_token":
+                    auth_token = inp.get("value")
+    return auth_token
+
+
+def legacy_assignment_rows(html: str) -> list:
+    """Row extraction as done before the parser backends existed."""
+
+    rows = []
+    for assignment_row in BeautifulSoup(html, "html.parser").find_all("tr", role="row"):
+        cells = assignment_row.find_all("th") + assignment_row.find_all("td")
+        rows.append(
+            [
+                (cell.text, cell.find("a").get("href") if cell.find("a") else None)
+                for cell in cells
+            ]
+        )
+    return rows
+
+
+def main(iterations: int = 20) -> None:
+    home = (FIXTURES / "home.html").read_text()
+    account = (FIXTURES / "account.html").read_text()
+    course = (FIXTURES / "course.html").read_text()
+
+    cases = {
+        "auth_token": (home, (), legacy_auth_token),
+        "course_list": (account, ("Your Courses",), None),
+        "assignment_rows": (course, (), legacy_assignment_rows),
+    }
+
+    backends = {}
+    for name in PARSERS:
+        try:
+            backends[name] = get_parser(name)
+        except ImportError:
+            print(f"{name}: not installed, skipped")
+
+    reference = backends["html.parser"]
+    print(f"{'case':<16} {'backend':<12} {'ms/call':>9} {'speedup':>8}")
+    for case, (html, args, legacy) in cases.items():
+        expected = getattr(reference, case)(html, *args)
+        timings = {}
+        if legacy is not None:
+            assert legacy(html, *args) == expected, f"legacy output differs for {case}"
+            timings["legacy"] = timeit.timeit(
+                lambda: legacy(html, *args), number=iterations
+            )
+        for name, backend in backends.items():
+            method = getattr(backend, case)
+            assert method(html, *args) == expected, f"{name} output differs for {case}"
+            timings[name] = timeit.timeit(
+                lambda: method(html, *args), number=iterations
+            )
+
+        baseline = timings.get("legacy", timings["html.parser"])
+        for name, seconds in timings.items():
+            print(
+                f"{case:<16} {name:<12} {seconds / iterations * 1000:>9.3f} "
+                f"{baseline / seconds:>7.1f}x"
+            )
+    print("All backends returned identical results.")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,188 @@
+"""Measure the reminder scheduler with the deadlines of many accounts.
+
+Usage: python -m benchmarks.bench_reminders [--users N] [--assignments N]
+                                            [--changed F] [--fire N] [--json]
+
+Every account gets assignments closing over the next weeks. The first update
+of every account, a sync where a fraction of the close dates moved and a sync
+where nothing changed are timed. Then --fire assignments are moved to close
+just after their reminder offset and the time until all reminders were
+delivered is measured, through a counting notifier and, for a few of them,
+the local webhook and SMTP servers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import random
+import sys
+import threading
+import time
+
+from benchmarks.servers import FakeSMTP, FakeWebhook
+from gradescopecalendar.gradescope.assignment import GSAssignment
+from gradescopecalendar.gradescope.course import GSCourse
+from gradescopecalendar.gradescope.store import GSAssignmentStore
+from gradescopecalendar.reminders import (
+    EmailNotifier,
+    ReminderScheduler,
+    WebhookNotifier,
+)
+
+# Offset of the reminders, the fired assignments close this long from now
+OFFSET = datetime.timedelta(hours=1)
+
+
+class CountingNotifier:
+    def __init__(self, expected: int) -> None:
+        self.count = 0
+        self.expected = expected
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, reminder) -> None:
+        with self._lock:
+            self.count += 1
+            if self.count >= self.expected:
+                self.done.set()
+
+
+def make_stores(users: int, assignments: int, now: datetime.datetime) -> dict:
+    rand = random.Random(0)
+    stores = {}
+    for user in range(users):
+        store = GSAssignmentStore()
+        course = GSCourse(f"Course {user}", f"C{user}", str(100000 + user), "", None)
+        for aid in range(assignments):
+            close = now + datetime.timedelta(hours=rand.uniform(2, 24 * 28))
+            store.add(
+                GSAssignment(
+                    f"Homework {aid}",
+                    str(1000000 + aid),
+                    course,
+                    "open",
+                    now,
+                    close,
+                )
+            )
+        stores[f"user{user}@example.edu"] = store
+    return stores
+
+
+def only_account(account: str, notify):
+    def notifier(reminder) -> None:
+        if reminder.account == account:
+            notify(reminder)
+
+    return notifier
+
+
+def move(stores: dict, fraction: float, close) -> int:
+    """Change the close date of a fraction of the assignments of every account."""
+
+    rand = random.Random(1)
+    moved = 0
+    for store in stores.values():
+        for assignment in rand.sample(list(store.values()), int(len(store) * fraction)):
+            assignment.close_date = close(assignment)
+            store.add(assignment)
+            moved += 1
+    return moved
+
+
+def update_all(scheduler: ReminderScheduler, stores: dict) -> tuple[float, int]:
+    start = time.perf_counter()
+    changed = sum(scheduler.update(account, store) for account, store in stores.items())
+    return time.perf_counter() - start, changed
+
+
+def run(args) -> list[dict]:
+    now = datetime.datetime.now().astimezone()
+    stores = make_stores(args.users, args.assignments, now)
+    counter = CountingNotifier(args.fire)
+    results = []
+    with FakeWebhook() as webhook, FakeSMTP() as smtp:
+        notifiers = [counter]
+        # Only the first account is also sent to the local servers, one
+        # connection per reminder is not what is being measured
+        first = next(iter(stores))
+        for notifier in (
+            WebhookNotifier(f"{webhook.url}/reminders"),
+            EmailNotifier(smtp.host, smtp.port),
+        ):
+            notifiers.append(only_account(first, notifier))
+        scheduler = ReminderScheduler(notifiers, offsets=[OFFSET])
+
+        seconds, changed = update_all(scheduler, stores)
+        results.append({"step": "first sync", "seconds": seconds, "changed": changed})
+        move(
+            stores,
+            args.changed,
+            lambda a: a.close_date + datetime.timedelta(days=1),
+        )
+        seconds, changed = update_all(scheduler, stores)
+        results.append({"step": "changed sync", "seconds": seconds, "changed": changed})
+        seconds, changed = update_all(scheduler, stores)
+        results.append({"step": "same sync", "seconds": seconds, "changed": changed})
+
+        # Move assignments to close right after their reminder is due
+        due = datetime.datetime.now().astimezone() + OFFSET
+        fired = 0
+        for store in stores.values():
+            for assignment in list(store.values())[: args.fire - fired]:
+                assignment.close_date = due + datetime.timedelta(milliseconds=200)
+                store.add(assignment)
+                fired += 1
+        thread = threading.Thread(target=scheduler.run)
+        thread.start()
+        start = time.perf_counter()
+        update_all(scheduler, stores)
+        counter.done.wait(60)
+        results.append(
+            {
+                "step": "fire",
+                "seconds": time.perf_counter() - start,
+                "changed": counter.count,
+            }
+        )
+        scheduler.stop()
+        thread.join()
+        results.append(
+            {
+                "step": "local servers",
+                "seconds": 0.0,
+                "changed": len(webhook.received) + len(smtp.messages),
+            }
+        )
+        results.append({"step": "pending", "seconds": 0.0, "changed": len(scheduler)})
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--assignments", type=int, default=50, help="per user")
+    parser.add_argument(
+        "--changed", type=float, default=0.02, help="fraction of moved close dates"
+    )
+    parser.add_argument(
+        "--fire", type=int, default=1000, help="reminders sent at the end"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    print(f"{args.users} users x {args.assignments} assignments")
+    print(f"{'step':<14} {'seconds':>8} {'count':>8}")
+    for result in results:
+        print(f"{result['step']:<14} {result['seconds']:>8.3f} {result['changed']:>8}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
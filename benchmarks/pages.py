@@ -0,0 +1,141 @@
+"""Generators for synthetic Gradescope pages used by the benchmarks."""
+
+from __future__ import annotations
+
+import datetime
+import html
+import json
+import random
+
+HOMEPAGE = (
+    "<!DOCTYPE html><html><head><title>Gradescope</title></head><body>"
+    '<nav><form action="/search" method="get"><input name="q" type="text"></form></nav>'
+    '<div class="loginForm"><form class="form" action="/login" accept-charset="UTF-8" method="post">'
+    '<input name="utf8" type="hidden" value="&#x2713;">'
+    '<input type="hidden" name="authenticity_token" value="{token}">'
+    '<input id="session_email" name="session[email]" type="email">'
+    '<input id="session_password" name="session[password]" type="password">'
+    '<input type="submit" name="commit" value="Log In"></form></div>'
+    "{padding}</body></html>"
+)
+
+TERMS = ["Fall", "Summer", "Spring", "Winter"]
+
+
+def homepage(token: str = "token", padding: int = 200) -> str:
+    """Homepage with the login form and unrelated marketing content."""
+
+    filler = "".join(
+        f'<section class="feature"><h2>Feature {i}</h2><p>{"lorem ipsum " * 20}</p></section>'
+        for i in range(padding)
+    )
+    return HOMEPAGE.format(token=token, padding=filler)
+
+
+def term_name(index: int, year: int = 2021) -> str:
+    """Name of the term ``index`` terms before the most recent one."""
+
+    return f"{TERMS[index % len(TERMS)]} {year - index // len(TERMS)}"
+
+
+def course_ids(courses: int, terms: int = 1) -> list[list[str]]:
+    """Course IDs for every term, the most recent term first."""
+
+    per_term = -(-courses // terms)
+    cids = [str(100000 + i) for i in range(courses)]
+    return [cids[i : i + per_term] for i in range(0, courses, per_term)]
+
+
+def account_page(courses: int = 20, terms: int = 4, instructor: bool = False) -> str:
+    """Account page listing the courses grouped by term."""
+
+    parts = [
+        "<!DOCTYPE html><html><head><title>Your Dashboard | Gradescope</title></head><body>"
+    ]
+    heading = "Student Courses" if instructor else "Your Courses"
+    parts.append(f'<h1 class="pageHeading">{heading}</h1><div class="courseList">')
+    for index, cids in enumerate(course_ids(courses, terms)):
+        parts.append(
+            f'<div class="courseList--term pageSubheading">{term_name(index)}</div>'
+            '<div class="courseList--coursesForTerm">'
+        )
+        for cid in cids:
+            parts.append(
+                f'<a class="courseBox" href="/courses/{cid}">'
+                f'<h3 class="courseBox--shortname">CS {cid[-3:]}</h3>'
+                f'<div class="courseBox--name">Course number {cid}</div>'
+                f'<div class="courseBox--assignments">{int(cid) % 7} assignments</div></a>'
+            )
+        parts.append(
+            '<button class="courseBox courseBox-new" type="button">Add a course</button></div>'
+        )
+    parts.append("</div></body></html>")
+    return "".join(parts)
+
+
+def course_page(cid: str, assignments: int = 50, seed: int = 0) -> str:
+    """Course page with the assignment table."""
+
+    rng = random.Random(f"{cid}-{seed}")
+    start = datetime.datetime(2021, 9, 1, 10, 0)
+    rows = [
+        '<tr role="row"><th class="table--header" scope="col">Name</th>'
+        '<th class="table--header" scope="col">Status</th>'
+        '<th class="table--header" scope="col">Released</th>'
+        '<th class="table--header" scope="col">Due (PDT)</th></tr>'
+    ]
+    for i in range(assignments):
+        aid = int(cid) * 100 + i
+        open_date = start + datetime.timedelta(days=i)
+        close_date = open_date + datetime.timedelta(days=7, hours=13, minutes=59)
+        if rng.random() < 0.5:
+            status = f"{rng.randint(0, 10)}.0 / 10.0"
+        else:
+            status = rng.choice(["No Submission", "Submitted", "Late"])
+        rows.append(
+            '<tr role="row" class="odd">'
+            f'<th class="table--primaryLink" role="rowheader" scope="row">'
+            f'<a aria-label="View Homework {i}" href="/courses/{cid}/assignments/{aid}/submissions/{aid * 3}">'
+            f"Homework {i}</a></th>"
+            f'<td class="submissionStatus"><div class="submissionStatus--text">{status}</div></td>'
+            '<td class="hidden-column"></td>'
+            f'<td class="sorting_1">{open_date:%Y-%m-%d %H:%M:%S} -0700</td>'
+            f'<td class="sorting_2">{close_date:%Y-%m-%d %H:%M:%S} -0700</td>'
+            "</tr>"
+        )
+    return (
+        "<!DOCTYPE html><html><head><title>Course Dashboard | Gradescope</title></head><body>"
+        '<nav class="sidebar">'
+        + "".join(f'<a href="/courses/{cid}/nav/{i}">Link {i}</a>' for i in range(50))
+        + "</nav>"
+        '<table class="table" id="assignments-student-table"><thead>'
+        + rows[0]
+        + "</thead><tbody>"
+        + "".join(rows[1:])
+        + "</tbody></table></body></html>"
+    )
+
+
+def assignment_page(
+    cid: str, aid: str, questions: int = 5, regrades: bool = False
+) -> str:
+    """Submission page of an assignment, rendered from React component props."""
+
+    props = {
+        "assignment": {
+            "id": int(aid),
+            "title": f"Homework {int(aid) % 100}",
+            "regrade_requests_open": regrades,
+        },
+        "questions": [
+            {"id": int(aid) * 10 + i, "full_index": str(i + 1), "title": f"Question {i + 1}"}
+            for i in range(questions)
+        ],
+    }
+    return (
+        "<!DOCTYPE html><html><head><title>Submission | Gradescope</title></head><body>"
+        f'<nav class="sidebar"><a href="/courses/{cid}">Dashboard</a></nav>'
+        '<div data-react-class="AssignmentSubmissionViewer" '
+        f'data-react-props="{html.escape(json.dumps(props))}"></div>'
+        "</body></html>"
+    )
@@ -0,0 +1,610 @@
+"""Local stand-ins for Gradescope, the Google Calendar API, a CalDAV server and
+the webhook and SMTP server reminders are sent to.
+
+Every server runs in a background thread on a free port of 127.0.0.1, counts
+the requests it receives, can add a fixed latency to every response and can
+fail a fraction of the GET requests to exercise retries.
+"""
+
+from __future__ import annotations
+
+import datetime
+import email.parser
+import hashlib
+import itertools
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+import icalendar
+
+from benchmarks import pages
+
+
+class FakeServer:
+    """Threaded HTTP server answering requests with the ``handle`` method.
+
+    Attributes
+    ----------
+    url : str
+        base URL of the server
+    requests : Counter
+        number of requests received by "METHOD kind", requests sent inside a
+        batch request are counted with a "(batched)" suffix
+    latency : float
+        seconds waited before answering every request
+    error_rate : float
+        fraction of GET requests answered with 503 or 429 instead, counted as
+        "GET (error)"
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._httpd.daemon_threads = True
+        host, port = self._httpd.server_address[:2]
+        self.url = f"http://{host}:{port}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self) -> FakeServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def count(self, kind: str) -> None:
+        with self._lock:
+            self.requests[kind] += 1
+
+    def injected_error(self, method: str) -> tuple:
+        """A failure to answer the request with, None to handle it."""
+
+        if method != "GET" or not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.requests["GET (error)"] += 1
+            if self._random.random() < 0.5:
+                return 429, {"Retry-After": "0"}, b""
+            return 503, {}, b""
+
+    def total_requests(self) -> int:
+        """Number of HTTP requests received, not counting batched requests."""
+
+        with self._lock:
+            return sum(
+                count
+                for kind, count in self.requests.items()
+                if not kind.endswith("(batched)")
+            )
+
+    def handle(self, method: str, path: str, headers, body: bytes) -> tuple:
+        """Answer a request.
+
+        Returns
+        -------
+        tuple (int, dict, bytes)
+            status, headers and body of the response
+        """
+
+        raise NotImplementedError
+
+
+def _handler(server: FakeServer) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, without this every response
+        # on a kept alive connection waits for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def _dispatch(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            if server.latency:
+                time.sleep(server.latency)
+            response = server.injected_error(self.command)
+            if response is None:
+                response = server.handle(self.command, self.path, self.headers, body)
+            status, headers, data = response
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+        do_HEAD = do_OPTIONS = do_PROPFIND = do_REPORT = _dispatch
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return Handler
+
+
+class FakeGradescope(FakeServer):
+    """Gradescope serving generated account, course and assignment pages.
+
+    Any email and password are accepted. The account lists ``courses``
+    courses with ``assignments`` assignments each, split over ``terms`` terms,
+    and pages are sent with an ETag so the page cache can be exercised.
+    """
+
+    def __init__(
+        self,
+        courses: int = 20,
+        assignments: int = 50,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        terms: int = 1,
+    ) -> None:
+        super().__init__(latency, error_rate)
+        self.assignments = assignments
+        self.homepage = pages.homepage(token="benchmark-token").encode()
+        self.account = pages.account_page(courses, terms=terms).encode()
+        self._course_pages = {}
+        self._sessions = itertools.count()
+
+    def course_page(self, cid: str) -> bytes:
+        page = self._course_pages.get(cid)
+        if page is None:
+            page = pages.course_page(cid, self.assignments).encode()
+            self._course_pages[cid] = page
+        return page
+
+    def handle(self, method, path, headers, body):
+        path = urlparse(path).path
+        if method == "GET" and path == "/":
+            self.count("GET /")
+            return self._page(headers, self.homepage)
+        if method == "POST" and path == "/login":
+            self.count("POST /login")
+            return (
+                302,
+                {
+                    "Location": "/account",
+                    "Set-Cookie": f"_gradescope_session={next(self._sessions)}; Path=/",
+                },
+                b"",
+            )
+        if "_gradescope_session=" not in headers.get("Cookie", ""):
+            self.count("GET (logged out)")
+            return 302, {"Location": "/login"}, b""
+        if method == "GET" and path == "/account":
+            self.count("GET /account")
+            return self._page(headers, self.account)
+        match = re.fullmatch(r"/courses/(\d+)/?", path)
+        if method == "GET" and match:
+            self.count("GET /courses")
+            return self._page(headers, self.course_page(match.group(1)))
+        match = re.fullmatch(r"/courses/(\d+)/assignments/(\d+)/?", path)
+        if method == "GET" and match:
+            self.count("GET /assignments")
+            cid, aid = match.groups()
+            page = pages.assignment_page(cid, aid, regrades=int(aid) % 3 == 0)
+            return self._page(headers, page.encode())
+        self.count("unknown")
+        return 404, {}, b""
+
+    def _page(self, headers, page: bytes) -> tuple:
+        etag = f'"{hashlib.sha1(page).hexdigest()}"'
+        if headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"Content-Type": "text/html; charset=utf-8", "ETag": etag}, page
+
+
+class FakeGoogleCalendar(FakeServer):
+    """Google Calendar API v3 for the calls made by GCal, including batches.
+
+    Serves the API at ``url`` as its root URL, see ``service()``.
+
+    Attributes
+    ----------
+    batch_errors : list[tuple[int, str]]
+        (status, reason) errors answered instead of the next batch requests
+    part_errors : list[tuple[int, str]]
+        (status, reason) errors answered instead of the next requests inside
+        a batch, such as ``(403, "rateLimitExceeded")``
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(latency)
+        self.batch_errors = []
+        self.part_errors = []
+        self.calendars = {}
+        self.events = {}
+        self._ids = itertools.count(1)
+        self._version = 0
+        # Version at which every event last changed, for sync tokens
+        self._changed = {}
+        self._state_lock = threading.Lock()
+
+    def service(self):
+        """googleapiclient resource talking to this server."""
+
+        import httplib2
+        from googleapiclient.discovery import build_from_document
+        from googleapiclient.discovery_cache import get_static_doc
+
+        doc = json.loads(get_static_doc("calendar", "v3"))
+        doc["rootUrl"] = f"{self.url}/"
+        doc["baseUrl"] = f"{self.url}/calendar/v3/"
+        return build_from_document(doc, http=httplib2.Http())
+
+    def handle(self, method, path, headers, body):
+        url = urlparse(path)
+        if method == "POST" and url.path == "/batch/calendar/v3":
+            self.count("POST batch")
+            return self._batch(headers, body)
+        self.count(f"{method} {self._kind(url.path)}")
+        with self._state_lock:
+            return self._call(method, url.path, parse_qs(url.query), body)
+
+    @staticmethod
+    def _kind(path: str) -> str:
+        return re.sub(r"/calendars/[^/]+/events/[^/]+", "/calendars/-/events/-", path)
+
+    def _call(self, method: str, path: str, query: dict, body: bytes) -> tuple:
+        path = unquote(path)
+        data = json.loads(body) if body else {}
+        if path == "/calendar/v3/users/me/calendarList" and method == "GET":
+            return self._json({"items": list(self.calendars.values())})
+        if path == "/calendar/v3/calendars" and method == "POST":
+            calendar = dict(data, id=f"cal{next(self._ids)}")
+            self.calendars[calendar["id"]] = calendar
+            self.events[calendar["id"]] = {}
+            return self._json(calendar)
+
+        match = re.fullmatch(r"/calendar/v3/calendars/([^/]+)/events(?:/([^/]+))?", path)
+        if not match or match.group(1) not in self.events:
+            return self._json({"error": {"code": 404}}, 404)
+        events = self.events[match.group(1)]
+        event_id = match.group(2)
+        if event_id is None and method == "GET":
+            return self._list(events, query)
+        if event_id is None and method == "POST":
+            event = dict(data, id=f"ev{next(self._ids)}", status="confirmed")
+            return self._save(events, event)
+        if event_id not in events or events[event_id]["status"] == "cancelled":
+            return self._json({"error": {"code": 404}}, 404)
+        if method == "PUT":
+            return self._save(events, dict(data, id=event_id, status="confirmed"))
+        if method == "PATCH":
+            event = dict(events[event_id])
+            for key, value in data.items():
+                event[key] = value
+            return self._save(events, event)
+        if method == "DELETE":
+            self._save(events, dict(events[event_id], status="cancelled"))
+            return 204, {}, b""
+        return self._json({"error": {"code": 405}}, 405)
+
+    def _save(self, events: dict, event: dict) -> tuple:
+        for key in ("start", "end"):
+            if key in event:
+                event[key] = {"dateTime": _utc(event[key]["dateTime"])}
+        self._version += 1
+        self._changed[event["id"]] = self._version
+        events[event["id"]] = event
+        return self._json(event)
+
+    def _list(self, events: dict, query: dict) -> tuple:
+        since = 0
+        if "syncToken" in query:
+            since = int(query["syncToken"][0])
+            if since > self._version:
+                return self._json({"error": {"code": 410}}, 410)
+        items = [
+            event
+            for event_id, event in events.items()
+            if self._changed[event_id] > since
+            and (since or event["status"] != "cancelled")
+        ]
+        start = int(query.get("pageToken", ["0"])[0])
+        size = int(query.get("maxResults", ["250"])[0])
+        page = {"items": items[start : start + size]}
+        if start + size < len(items):
+            page["nextPageToken"] = str(start + size)
+        else:
+            page["nextSyncToken"] = str(self._version)
+        return self._json(page)
+
+    def _next_error(self, errors: list) -> tuple:
+        """Pop the next injected error as a response, None if there is none."""
+
+        with self._lock:
+            if not errors:
+                return None
+            status, reason = errors.pop(0)
+        error = {"code": status, "message": reason, "errors": [{"reason": reason}]}
+        return self._json({"error": error}, status)
+
+    def _batch(self, headers, body: bytes) -> tuple:
+        error = self._next_error(self.batch_errors)
+        if error is not None:
+            return error
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode() + body
+        )
+        boundary = "batch_benchmark"
+        parts = []
+        for part in message.get_payload():
+            request = part.get_payload(decode=True) or part.get_payload().encode()
+            head, _, request_body = request.partition(b"\r\n\r\n")
+            if not _:
+                head, _, request_body = request.partition(b"\n\n")
+            method, target = head.split(b" ")[:2]
+            url = urlparse(target.decode())
+            self.count(f"{method.decode()} {self._kind(url.path)} (batched)")
+            response = self._next_error(self.part_errors)
+            if response is None:
+                with self._state_lock:
+                    response = self._call(
+                        method.decode(), url.path, parse_qs(url.query), request_body
+                    )
+            status, _, data = response
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'].strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n{data.decode()}\r\n"
+            )
+        data = ("".join(parts) + f"--{boundary}--\r\n").encode()
+        return 200, {"Content-Type": f"multipart/mixed; boundary={boundary}"}, data
+
+    @staticmethod
+    def _json(data: dict, status: int = 200) -> tuple:
+        return status, {"Content-Type": "application/json"}, json.dumps(data).encode()
+
+
+class FakeCalDAV(FakeServer):
+    """CalDAV server with a single calendar at ``/calendars/user/gradescope/``.
+
+    Supports the principal discovery of the caldav client, calendar-query
+    with a VEVENT time-range, calendar-multiget and conditional GET/PUT.
+
+    Attributes
+    ----------
+    objects : dict[str, str]
+        iCalendar data of the events by path
+    etags : bool
+        whether GET responses carry an ETag, some servers leave it out
+    time_ranges : list[tuple[datetime, datetime]]
+        start and end of every calendar-query received
+    """
+
+    PRINCIPAL = "/principals/user/"
+    HOME = "/calendars/user/"
+    CALENDAR = "/calendars/user/gradescope/"
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(latency)
+        self.objects = {}
+        self.etags = True
+        self.time_ranges = []
+        self._state_lock = threading.Lock()
+
+    def handle(self, method, path, headers, body):
+        path = unquote(urlparse(path).path)
+        self.count(f"{method} {'event' if path.endswith('.ics') else path}")
+        text = body.decode()
+        if method == "OPTIONS":
+            return 200, {"DAV": "1, 2, calendar-access", "Allow": "OPTIONS, GET, PUT, PROPFIND, REPORT"}, b""
+        if method == "PROPFIND":
+            return self._propfind(path, headers.get("Depth", "0"))
+        with self._state_lock:
+            if method == "REPORT" and "calendar-multiget" in text:
+                hrefs = [unquote(h) for h in re.findall(r"<D:href>(.*?)</D:href>", text)]
+                return self._multistatus(
+                    [(href, self.objects.get(href)) for href in hrefs]
+                )
+            if method == "REPORT":
+                return self._query(text)
+            if method == "GET":
+                data = self.objects.get(path)
+                if data is None:
+                    return 404, {}, b""
+                response_headers = {"Content-Type": "text/calendar"}
+                if self.etags:
+                    response_headers["ETag"] = _etag(data)
+                return 200, response_headers, data.encode()
+            if method == "PUT":
+                current = self.objects.get(path)
+                if headers.get("If-None-Match") == "*" and current is not None:
+                    return 412, {}, b""
+                if_match = headers.get("If-Match")
+                if if_match and (current is None or _etag(current) != if_match):
+                    return 412, {}, b""
+                self.objects[path] = text
+                return (201 if current is None else 204), {"ETag": _etag(text)}, b""
+        return 405, {}, b""
+
+    def _query(self, text: str) -> tuple:
+        start, end = (
+            datetime.datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(
+                tzinfo=datetime.timezone.utc
+            )
+            for value in re.search(r'start="(\w+)" end="(\w+)"', text).groups()
+        )
+        self.time_ranges.append((start, end))
+        items = []
+        for href, data in self.objects.items():
+            for event in icalendar.Calendar.from_ical(data).walk("VEVENT"):
+                dtstart = event.decoded("dtstart")
+                if dtstart.tzinfo is None:
+                    dtstart = dtstart.replace(tzinfo=datetime.timezone.utc)
+                if start <= dtstart < end:
+                    items.append((href, data))
+        return self._multistatus(items)
+
+    def _propfind(self, path: str, depth: str) -> tuple:
+        def response(href: str, props: str) -> str:
+            return (
+                f"<d:response><d:href>{href}</d:href><d:propstat><d:prop>{props}"
+                "</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+            )
+
+        collection = "<d:resourcetype><d:collection/></d:resourcetype>"
+        calendar = (
+            "<d:resourcetype><d:collection/><c:calendar/></d:resourcetype>"
+            "<d:displayname>Gradescope</d:displayname>"
+            '<c:supported-calendar-component-set><c:comp name="VEVENT"/>'
+            "</c:supported-calendar-component-set>"
+        )
+        principal = (
+            f"<d:current-user-principal><d:href>{self.PRINCIPAL}</d:href>"
+            "</d:current-user-principal>"
+            f"<c:calendar-home-set><d:href>{self.HOME}</d:href></c:calendar-home-set>"
+        )
+        responses = []
+        if path == self.CALENDAR:
+            responses.append(response(path, calendar))
+        elif path == self.HOME:
+            responses.append(response(path, collection + principal))
+            if depth != "0":
+                responses.append(response(self.CALENDAR, calendar))
+        else:
+            responses.append(response(path, collection + principal))
+        data = (
+            '<?xml version="1.0"?><d:multistatus xmlns:d="DAV:" '
+            'xmlns:c="urn:ietf:params:xml:ns:caldav">'
+            + "".join(responses)
+            + "</d:multistatus>"
+        )
+        return 207, {"Content-Type": "application/xml; charset=utf-8"}, data.encode()
+
+    @staticmethod
+    def _multistatus(items: list) -> tuple:
+        parts = [
+            '<?xml version="1.0"?><d:multistatus xmlns:d="DAV:" '
+            'xmlns:c="urn:ietf:params:xml:ns:caldav">'
+        ]
+        for href, data in items:
+            if data is None:
+                parts.append(
+                    f"<d:response><d:href>{escape(href)}</d:href>"
+                    "<d:status>HTTP/1.1 404 Not Found</d:status></d:response>"
+                )
+                continue
+            parts.append(
+                f"<d:response><d:href>{escape(href)}</d:href><d:propstat><d:prop>"
+                f"<d:getetag>{_etag(data)}</d:getetag>"
+                f"<c:calendar-data>{escape(data)}</c:calendar-data>"
+                "</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+            )
+        parts.append("</d:multistatus>")
+        data = "".join(parts).encode()
+        return 207, {"Content-Type": "application/xml; charset=utf-8"}, data
+
+
+class FakeWebhook(FakeServer):
+    """Endpoint recording the JSON bodies POSTed to it in ``received``."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(latency)
+        self.received = []
+
+    def handle(self, method, path, headers, body):
+        self.count(f"{method} webhook")
+        with self._lock:
+            self.received.append(json.loads(body))
+        return 204, {}, b""
+
+
+class FakeSMTP:
+    """SMTP server recording the messages it accepts in ``messages``.
+
+    Speaks just enough SMTP for smtplib: greeting, EHLO/HELO, MAIL, RCPT, DATA,
+    RSET, NOOP and QUIT, without authentication or TLS.
+
+    Attributes
+    ----------
+    host, port : str, int
+        address of the server
+    messages : list[email.message.Message]
+        the received messages
+    """
+
+    def __init__(self) -> None:
+        self.messages = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(
+            ("127.0.0.1", 0), _smtp_handler(self)
+        )
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self) -> FakeSMTP:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def receive(self, data: bytes) -> None:
+        with self._lock:
+            self.messages.append(email.parser.BytesParser().parsebytes(data))
+
+
+def _smtp_handler(server: FakeSMTP) -> type:
+    class Handler(socketserver.StreamRequestHandler):
+        def reply(self, line: str) -> None:
+            self.wfile.write(f"{line}\r\n".encode())
+
+        def handle(self) -> None:
+            self.reply("220 localhost ESMTP")
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line.decode().strip().split(" ", 1)[0].upper()
+                if command == "EHLO":
+                    self.reply("250-localhost")
+                    self.reply("250 8BITMIME")
+                elif command == "DATA":
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    for data in self.rfile:
+                        if data in (b".\r\n", b".\n"):
+                            break
+                        # Undo the dot stuffing of lines starting with a dot
+                        lines.append(data[1:] if data.startswith(b"..") else data)
+                    server.receive(b"".join(lines))
+                    self.reply("250 OK")
+                elif command == "QUIT":
+                    self.reply("221 Bye")
+                    return
+                elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                    self.reply("250 OK")
+                else:
+                    self.reply("502 Command not implemented")
+
+    return Handler
+
+
+def _etag(data: str) -> str:
+    return f'"{hashlib.sha1(data.encode()).hexdigest()}"'
+
+
+def _utc(value: str) -> str:
+    """Normalize an RFC 3339 date the way Google Calendar returns it."""
+
+    date = datetime.datetime.strptime(value.replace("Z", "+0000"), "%Y-%m-%dT%H:%M:%S%z")
+    return date.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
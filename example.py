@@ -1,3 +1,4 @@
+from gradescopecalendar import enable_file_logging
 from gradescopecalendar.gradescopecalendar import GradescopeCalendar
 import logging
 
@@ -15,8 +16,8 @@ if __name__ == "__main__":
     # logging.INFO, logging.DEBUG, logging.WARN, logging.CRITICAL
     # ------------------------------------------------------------ #
 
-    logger = logging.getLogger("gradescopecalendar" if LOGGING_ENABLED else None)
-    logger.setLevel(LOGGING_LEVEL)
+    if LOGGING_ENABLED:
+        enable_file_logging("gradescopecalendar.log", LOGGING_LEVEL)
     calendar = GradescopeCalendar(EMAIL, PASSWORD, IS_INSTRUCTOR)
     calendar.write_to_ical()
     # Uncomment below to update Google Calendar directly
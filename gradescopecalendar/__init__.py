@@ -1,12 +1,39 @@
+from __future__ import annotations
+
 import logging
 
 logger = logging.getLogger(__name__)
-handler = logging.StreamHandler()
-handler = logging.FileHandler("gradescopecalendar.log")
-formatter = logging.Formatter(
-    "%(asctime)s %(name)-12s %(levelname)-8s %(message)s",
-    datefmt="%a, %d %b %Y %H:%M:%S",
-)
-handler.setFormatter(formatter)
-logger.addHandler(handler)
 logger.addHandler(logging.NullHandler())
+
+
+def enable_file_logging(
+    path: str = "gradescopecalendar.log", level: int | str = None
+) -> logging.Handler:
+    """Write the log messages of the package to a file.
+
+    Nothing is logged to a file unless this is called, so importing the package
+    does not create files in the working directory.
+
+    Parameters
+    ----------
+    path : str
+        the log file, appended to if it exists
+    level : int or str (optional)
+        logging level of the package logger, left unchanged if not given
+
+    Returns
+    -------
+    logging.Handler
+        the added handler, pass it to ``logger.removeHandler`` to stop logging
+    """
+
+    handler = logging.FileHandler(path)
+    formatter = logging.Formatter(
+        "%(asctime)s %(name)-12s %(levelname)-8s %(message)s",
+        datefmt="%a, %d %b %Y %H:%M:%S",
+    )
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    if level is not None:
+        logger.setLevel(level)
+    return handler
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import importlib
+
+# Calendar backends by name: module, class and the extra installing their
+# dependencies. They are only imported when first used, so writing an .ics
+# file never imports the Google or CalDAV client libraries.
+BACKENDS = {
+    "ical": ("gradescopecalendar.calendars.ical", "ICal", None),
+    "caldav": ("gradescopecalendar.calendars.caldav", "CalDav", "caldav"),
+    "gcal": ("gradescopecalendar.calendars.gcal", "GCal", "gcal"),
+}
+
+
+def get_backend(name: str) -> type:
+    """Import a calendar backend by name.
+
+    Parameters
+    ----------
+    name : str
+        "ical", "caldav" or "gcal"
+
+    Returns
+    -------
+    type
+        the class of the backend
+
+    Exceptions
+    ----------
+    ValueError
+        Unknown backend name.
+    ImportError
+        The packages required by the backend are not installed.
+    """
+
+    if name not in BACKENDS:
+        raise ValueError(f"Invalid backend {name}, expected one of {list(BACKENDS)}")
+    module_name, class_name, extra = BACKENDS[name]
+    try:
+        module = importlib.import_module(module_name)
+    except ModuleNotFoundError as e:
+        missing = (e.name or "").split(".")[0]
+        if extra is None or missing in ("", "gradescopecalendar"):
+            raise
+        raise ImportError(
+            f"{missing} is required for the {name} backend, "
+            f"install it with `pip install gradescopecalendar[{extra}]`"
+        ) from e
+    return getattr(module, class_name)
@@ -1,16 +1,113 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import itertools
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote, urljoin, urlparse
+from xml.sax.saxutils import escape
 
 import caldav
+import icalendar
+from caldav.elements import cdav, dav
+from caldav.lib import error
+
+from gradescopecalendar.calendars.state import SyncState
+from gradescopecalendar.gradescope.assignment import INVALID_ASSIGNMENT_ID
+from gradescopecalendar.metrics import SyncStats
+from gradescopecalendar.utils import assignment_items, event_uid
 
 logger = logging.getLogger(__name__)
 
+CALDAV_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+PRODID = "-//gradescopecalendar//Gradescope Calendar//EN"
+# Number of events written to the server at the same time
+MAX_WORKERS = 8
+# Maximum number of events requested in one calendar-multiget
+MULTIGET_SIZE = 100
+# Close date of assignments without a deadline
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+# Largest UTC offset of a time zone. Older versions wrote the deadlines with a
+# TZID like "UTC-07:00" and no VTIMEZONE, which servers read as floating or UTC
+# times, so those events can be this far from the deadline in a time-range
+LEGACY_SLACK = datetime.timedelta(hours=14)
+# Only the properties used to identify and compare assignments are requested
+EVENT_DATA = (
+    '<C:calendar-data><C:comp name="VCALENDAR"><C:comp name="VEVENT">'
+    '<C:prop name="UID"/><C:prop name="SUMMARY"/><C:prop name="LOCATION"/>'
+    '<C:prop name="DTSTART"/>'
+    "</C:comp></C:comp></C:calendar-data>"
+)
+CALENDAR_QUERY = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<C:calendar-query xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">'
+    "<D:prop><D:getetag/>{data}</D:prop>"
+    '<C:filter><C:comp-filter name="VCALENDAR"><C:comp-filter name="VEVENT">'
+    '<C:time-range start="{start}" end="{end}"/>'
+    "</C:comp-filter></C:comp-filter></C:filter>"
+    "</C:calendar-query>"
+)
+CALENDAR_MULTIGET = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<C:calendar-multiget xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">'
+    "<D:prop><D:getetag/>{data}</D:prop>{hrefs}"
+    "</C:calendar-multiget>"
+)
+
 
 class CalDav:
-    def write_to_caldav(self, assignments_all: dict, url, calName, username, password):
+    """A class to write assignments to a CalDAV calendar.
+
+    Every assignment is stored as the event ``<uid>.ics`` of the calendar, with
+    a UID made of its course and assignment ID, so its event is found by href
+    without searching the calendar. Events are only written when their
+    summary, location or deadline changed, using conditional PUT requests so
+    concurrent edits on the server are never overwritten.
+
+    Attributes
+    ----------
+    stats : SyncStats
+        timings of listing, creating and updating events and HTTP counters
+
+    Methods
+    -------
+    write_to_caldav(assignments_all, url, calName, username, password, state)
+        creates or updates the events of the assignments
+    """
+
+    def __init__(
+        self, max_workers: int = MAX_WORKERS, stats: SyncStats = None
+    ) -> None:
+        """
+        Parameters
+        ----------
+        max_workers : int
+            number of events written to the server at the same time
+        stats : SyncStats (optional)
+            collects the timings and HTTP counters of the writes
+        """
+
+        self.max_workers = max(1, max_workers)
+        self.stats = stats if stats is not None else SyncStats()
+
+    def write_to_caldav(
+        self,
+        assignments_all: dict,
+        url,
+        calName,
+        username,
+        password,
+        state: SyncState = None,
+    ):
         """Write assignment details to a CalDAV server.
 
         Parameters
         ----------
+        assignments_all : dict or Iterable
+            all assignments from Gradescope, or a stream of (name, assignment)
+            pairs
         url : str
             the URL of the CalDAV server
         calName: str
@@ -19,34 +116,378 @@ class CalDav:
             the username of the CalDAV user
         password: str
             the password of the CalDAV user
+        state: SyncState
+            record of previous syncs, assignments unchanged since the last sync
+            are skipped without connecting to the server (optional)
         """
+        target = f"{url}#{calName or ''}"
+        pending = self._pending_assignments(assignments_all, state, target)
+        # Only connect to the server once something has to be written
+        first = next(pending, None)
+        if first is None:
+            logger.info("No assignments changed since the last CalDAV sync")
+            return
+
         with caldav.DAVClient(url=url, username=username, password=password) as client:
+            client.session.hooks["response"].append(self.stats.record_response)
             calendar: caldav.Calendar
+            principal = client.principal()
             if calName is not None:
-                principal = client.principal()
                 logger.info(
                     f"Found calendars: {[(calendar.name, calendar.id, calendar.url) for calendar in principal.calendars()]}")
                 calendar = principal.calendar(name=calName)
+            else:
+                calendar = principal.calendars()[0]
+
+            # Sessions of requests are not thread-safe, so every worker writes
+            # with its own client, closed once all events are written
+            local = threading.local()
+            clients = []
+            clients_lock = threading.Lock()
+
+            def worker_client() -> caldav.DAVClient:
+                if not hasattr(local, "client"):
+                    local.client = caldav.DAVClient(
+                        url=url, username=username, password=password
+                    )
+                    local.client.session.hooks["response"].append(
+                        self.stats.record_response
+                    )
+                    with clients_lock:
+                        clients.append(local.client)
+                return local.client
 
-            currentEvents: set[str] = self._get_caldav_current_assignments(calendar)
+            def write(args) -> None:
+                name, assignment, fingerprint, href = args
+                mode = "create" if href is None else "update"
+                with self.stats.timer(mode, backend="caldav"):
+                    event_url = self._write_event(
+                        worker_client(), calendar, name, assignment, href
+                    )
+                if event_url is None:
+                    return
+                self.stats.count("events_written", backend="caldav", mode=mode)
+                if state is not None:
+                    state.record(
+                        "caldav", target, assignment.uid, fingerprint, event_url
+                    )
 
-            for name, assignment in assignments_all.items():
-                if f"{name} {assignment.url}" in currentEvents:
-                    logger.debug(f"Skipped Assignment <{name}> as it is already present.")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = []
+                # Look up and write the events a multiget at a time, so writing
+                # starts while the rest of a stream is still being read
+                pending = itertools.chain([first], pending)
+                for chunk in _chunks(pending, MULTIGET_SIZE):
+                    with self.stats.timer("list", backend="caldav"):
+                        currentEvents: dict[str, tuple[str, dict]] = (
+                            self._get_caldav_current_assignments(
+                                calendar, chunk, state, target
+                            )
+                        )
+
+                    for name, assignment, fingerprint in chunk:
+                        href, event = currentEvents.get(
+                            assignment.uid, (None, None)
+                        )
+                        if event is not None and not self._is_different(
+                            event, name, assignment
+                        ):
+                            logger.debug(
+                                f"Skipped Assignment <{name}> as it is already present."
+                            )
+                            if state is not None:
+                                state.record(
+                                    "caldav",
+                                    target,
+                                    assignment.uid,
+                                    fingerprint,
+                                    self._event_url(calendar, href),
+                                )
+                            continue
+                        futures.append(
+                            pool.submit(write, (name, assignment, fingerprint, href))
+                        )
+                try:
+                    # Raise the exceptions of the workers
+                    for future in futures:
+                        future.result()
+                finally:
+                    pool.shutdown()
+                    for worker in clients:
+                        worker.close()
+
+    def _pending_assignments(self, assignments_all, state: SyncState, target: str):
+        """Yield the assignments which changed since the last sync.
+
+        Yields
+        ------
+        tuple (str, GSAssignment, str)
+            the event name, the assignment and its fingerprint
+        """
+
+        for name, assignment in assignment_items(assignments_all):
+            fingerprint = None
+            if state is not None:
+                fingerprint = state.fingerprint(name, assignment)
+                if state.get("caldav", target, assignment.uid)[0] == fingerprint:
+                    logger.debug(f"Skipped Assignment <{name}> as it is unchanged.")
                     continue
-                calendar.save_event(
-                    summary=name,
-                    location=assignment.url,
-                    dtstart=assignment.close_date,
-                    dtend=assignment.close_date)
-                logger.debug(f"Wrote New Assignment <{name}> to CalDAV")
-
-    def _get_caldav_current_assignments(self, calendar: caldav.Calendar) -> set[str]:
-        events_raw: list[caldav.Event] = calendar.events()
-        todos_raw: list[caldav.Todo] = calendar.todos(include_completed=True)
-        assignments = set()
-
-        for event_raw in events_raw:
-            assignments.add(f"{str(event_raw.vobject_instance.vevent.summary.value)} {str(event_raw.vobject_instance.vevent.location.value)}")
-
-        return assignments
+            yield name, assignment, fingerprint
+
+    def _get_caldav_current_assignments(
+        self,
+        calendar: caldav.Calendar,
+        pending: list[tuple],
+        state: SyncState = None,
+        target: str = None,
+    ) -> dict[str, tuple[str, dict]]:
+        """Find the events of the assignments on the calendar.
+
+        Events are fetched by their deterministic href, or the href recorded in
+        the sync state, with calendar-multiget. Events written before their
+        href was deterministic are looked up around the deadlines of the
+        remaining assignments and matched by summary, location and start. Only
+        the properties used to compare assignments are requested.
+
+        Parameters
+        ----------
+        calendar : caldav.Calendar
+            calendar to search
+        pending : list[tuple]
+            event name, assignment and fingerprint of the assignments
+        state : SyncState (optional)
+            record of the events written by previous syncs
+        target : str (optional)
+            key of the calendar in the sync state
+
+        Returns
+        -------
+        dict[str, tuple[str, dict]]
+            href and properties of the events by assignment uid
+        """
+
+        candidates = {}
+        for _, assignment, _ in pending:
+            hrefs = [self._event_href(calendar, assignment)]
+            if state is not None:
+                remote_id = state.get("caldav", target, assignment.uid)[1]
+                if remote_id is not None:
+                    hrefs.append(unquote(urlparse(remote_id).path))
+            candidates[assignment.uid] = hrefs
+
+        hrefs = sorted({href for hrefs in candidates.values() for href in hrefs})
+        events = {}
+        for i in range(0, len(hrefs), MULTIGET_SIZE):
+            events.update(
+                self._caldav_report(
+                    calendar,
+                    CALENDAR_MULTIGET.format(
+                        data=EVENT_DATA,
+                        hrefs="".join(
+                            f"<D:href>{escape(quote(href))}</D:href>"
+                            for href in hrefs[i : i + MULTIGET_SIZE]
+                        ),
+                    ),
+                )
+            )
+
+        found = {}
+        missing = []
+        for name, assignment, _ in pending:
+            for href in candidates[assignment.uid]:
+                if href in events:
+                    found[assignment.uid] = (href, events[href])
+                    break
+            else:
+                missing.append((name, assignment))
+
+        # Assignments without a deadline would stretch the range back to 1970
+        # and download the whole calendar
+        close_dates = [
+            assignment.close_date
+            for _, assignment in missing
+            if assignment.close_date > EPOCH
+        ]
+        if close_dates:
+            start = min(close_dates).astimezone(datetime.timezone.utc)
+            start -= LEGACY_SLACK
+            # Events last zero seconds, so the end of the range must be after them
+            end = max(close_dates).astimezone(datetime.timezone.utc)
+            end += LEGACY_SLACK + datetime.timedelta(seconds=1)
+            legacy = {}
+            for href, event in self._caldav_report(
+                calendar,
+                CALENDAR_QUERY.format(
+                    data=EVENT_DATA,
+                    start=start.strftime(CALDAV_TIME_FORMAT),
+                    end=end.strftime(CALDAV_TIME_FORMAT),
+                ),
+            ).items():
+                key = f"{event['summary']} {event['location']}"
+                legacy.setdefault(key, []).append((href, event))
+            for name, assignment in missing:
+                for href, event in legacy.get(f"{name} {assignment.url}", ()):
+                    if _starts_at(event["dtstart"], assignment.close_date):
+                        found[assignment.uid] = (href, event)
+                        break
+        logger.debug(f"Found {len(found)} of {len(pending)} assignments on CalDAV")
+
+        return found
+
+    def _caldav_report(self, calendar: caldav.Calendar, query: str) -> dict:
+        """Send a REPORT request to the calendar and parse the returned events.
+
+        Returns
+        -------
+        dict
+            etag, uid, summary, location and start of the events by href
+        """
+
+        response = calendar.client.report(str(calendar.url), query, depth=1)
+        props = response.expand_simple_props([dav.GetEtag(), cdav.CalendarData()])
+
+        events = {}
+        for href, values in props.items():
+            data = values.get(cdav.CalendarData.tag)
+            if not data:
+                # Missing event of a multiget
+                continue
+            for vevent in icalendar.Calendar.from_ical(data).walk("VEVENT"):
+                dtstart = vevent.get("DTSTART")
+                events[unquote(urlparse(href).path)] = {
+                    "etag": values.get(dav.GetEtag.tag),
+                    "uid": str(vevent.get("UID", "")),
+                    "summary": str(vevent.get("SUMMARY", "")),
+                    "location": str(vevent.get("LOCATION", "")),
+                    "dtstart": dtstart.dt if dtstart is not None else None,
+                }
+        return events
+
+    def _is_different(self, event: dict, name: str, assignment) -> bool:
+        """Whether the event differs from the assignment."""
+
+        return (
+            event["summary"] != name
+            or event["location"] != (assignment.url or "")
+            or event["dtstart"] != assignment.close_date
+        )
+
+    def _write_event(
+        self, client, calendar: caldav.Calendar, name: str, assignment, href: str
+    ) -> str:
+        """Create or update the event of an assignment.
+
+        New events are created at their deterministic href and only if no event
+        exists there yet. Existing events are fetched in full so fields edited
+        in the calendar are kept, and only replaced if they did not change on
+        the server since. Events deleted since they were listed are created
+        again at the same href.
+
+        Returns
+        -------
+        str
+            URL of the event, None if it changed on the server in the meantime
+
+        Exceptions
+        ----------
+        caldav.lib.error.DAVError
+            The server failed to return the existing event.
+        caldav.lib.error.PutError
+            The server refused to write the event.
+        """
+
+        cal = None
+        if href is None:
+            event_url = self._event_url(
+                calendar, self._event_href(calendar, assignment)
+            )
+        else:
+            event_url = self._event_url(calendar, href)
+            response = client.request(event_url)
+            if response.status == 200:
+                cal = icalendar.Calendar.from_ical(response.raw)
+                vevent = next(iter(cal.walk("VEVENT")))
+                etag = response.headers.get("ETag")
+                # Servers not sending an ETag cannot be written conditionally
+                headers = {"If-Match": etag} if etag else {}
+                logger.debug(f"Updated Assignment <{name}> on CalDAV")
+            elif response.status != 404:
+                raise error.DAVError(
+                    f"{response.status} {response.reason}: {event_url}"
+                )
+
+        if cal is None:
+            cal = icalendar.Calendar()
+            cal.add("prodid", PRODID)
+            cal.add("version", "2.0")
+            vevent = icalendar.Event()
+            vevent.add("uid", event_uid(assignment))
+            cal.add_component(vevent)
+            headers = {"If-None-Match": "*"}
+            logger.debug(f"Wrote New Assignment <{name}> to CalDAV")
+
+        # Priority given to Gradescope for {summary, location, start, end}
+        for key in ("summary", "location", "dtstart", "dtend", "dtstamp"):
+            vevent.pop(key, None)
+        # Gradescope dates have fixed offsets without a time zone definition
+        close_date = assignment.close_date.astimezone(datetime.timezone.utc)
+        vevent.add("summary", name)
+        vevent["location"] = icalendar.vText(assignment.url)
+        vevent.add("dtstart", close_date)
+        vevent.add("dtend", close_date)
+        vevent.add("dtstamp", datetime.datetime.now(datetime.timezone.utc))
+
+        headers["Content-Type"] = "text/calendar; charset=utf-8"
+        response = client.put(event_url, cal.to_ical().decode(), headers)
+        if response.status == 412:
+            self.stats.count("conflicts", backend="caldav")
+            logger.warning(
+                f"Assignment <{name}> changed on CalDAV while writing, "
+                "it will be written again on the next sync"
+            )
+            return None
+        if response.status not in (200, 201, 204):
+            raise error.PutError(f"{response.status} {response.reason}: {event_url}")
+        return event_url
+
+    def _event_href(self, calendar: caldav.Calendar, assignment) -> str:
+        """Deterministic path of the event of an assignment.
+
+        Assignments without an ID are identified by their name, which can
+        contain a "/", so the name is hashed instead of used in the path.
+        """
+
+        path = unquote(urlparse(str(calendar.url)).path).rstrip("/")
+        uid = event_uid(assignment)
+        if assignment.aid == INVALID_ASSIGNMENT_ID:
+            digest = hashlib.sha256(assignment.name.encode()).hexdigest()
+            uid = f"{assignment.course.cid}-{digest}@gradescope.com"
+        return f"{path}/{uid}.ics"
+
+    def _event_url(self, calendar: caldav.Calendar, href: str) -> str:
+        return urljoin(str(calendar.url), quote(href))
+
+
+def _starts_at(dtstart, close_date: datetime.datetime) -> bool:
+    """Whether an event starts at a deadline.
+
+    A start without a time zone, floating or with a TZID the parser does not
+    know, is compared as the wall clock time of the deadline.
+    """
+
+    if not isinstance(dtstart, datetime.datetime):
+        return False
+    if dtstart.tzinfo is None:
+        return dtstart == close_date.replace(tzinfo=None)
+    return dtstart == close_date
+
+
+def _chunks(items, size: int):
+    """Split an iterable into lists of up to size items."""
+
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import secrets
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from gradescopecalendar.calendars.ical import ICal
+
+logger = logging.getLogger(__name__)
+
+FEED_PATH = "/feeds/{token}.ics"
+
+
+class _Feed:
+    """Serialized calendar of an account, ready to be sent."""
+
+    __slots__ = ("body", "gzip_body", "etag", "last_modified")
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.gzip_body = gzip.compress(body, mtime=0)
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.last_modified = formatdate(usegmt=True)
+
+
+class FeedServer:
+    """HTTP server publishing the calendar of each account as an ICS feed.
+
+    Every feed is served at ``/feeds/<token>.ics`` from a serialized and
+    compressed copy kept in memory, which is only replaced when a sync changes
+    its contents. Clients are sent ``304 Not Modified`` when their copy is up
+    to date and a gzip body when they accept it.
+
+    Attributes
+    ----------
+    address : tuple (str, int)
+        host and port the server listens on
+
+    Methods
+    -------
+    new_token()
+        returns a new random token for a feed URL
+    publish(token, assignments)
+        serializes the assignments of an account as its feed
+    remove(token)
+        stops serving a feed
+    start() / shutdown()
+        serves requests in a background thread / stops serving them
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        """
+        Parameters
+        ----------
+        host : str
+            address to listen on
+        port : int
+            port to listen on, 0 picks a free port
+        """
+
+        # Feeds are keyed by a hash of their token so lookups do not reveal
+        # how much of a guessed token is right
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+        self.address = self._httpd.server_address[:2]
+
+    @staticmethod
+    def new_token() -> str:
+        return secrets.token_urlsafe(32)
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def url(self, token: str) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}" + FEED_PATH.format(token=token)
+
+    def publish(self, token: str, assignments) -> bool:
+        """Serialize the assignments of an account as its feed.
+
+        Parameters
+        ----------
+        token : str
+            secret token of the feed URL
+        assignments : dict or Iterable
+            assignments of the account, or a stream of (name, assignment) pairs
+
+        Returns
+        -------
+        bool
+            whether the feed changed
+        """
+
+        body = ICal().serialize(assignments)
+        key = self._key(token)
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is not None and feed.body == body:
+                logger.debug("Feed unchanged")
+                return False
+        feed = _Feed(body)
+        with self._lock:
+            self._feeds[key] = feed
+        logger.info(f"Published feed with ETag {feed.etag}")
+        return True
+
+    def remove(self, token: str) -> None:
+        with self._lock:
+            self._feeds.pop(self._key(token), None)
+
+    def _get(self, token: str) -> _Feed:
+        with self._lock:
+            return self._feeds.get(self._key(token))
+
+    def serve_forever(self) -> None:
+        logger.info(f"Serving feeds on {self.address[0]}:{self.address[1]}")
+        self._httpd.serve_forever()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="FeedServer", daemon=True
+        )
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def _handler(server: FeedServer) -> type:
+    """Request handler class bound to a feed server."""
+
+    prefix, suffix = FEED_PATH.split("{token}")
+
+    class FeedRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_HEAD(self) -> None:
+            self.do_GET(send_body=False)
+
+        def do_GET(self, send_body: bool = True) -> None:
+            path = self.path.split("?", 1)[0]
+            feed = None
+            if path.startswith(prefix) and path.endswith(suffix):
+                feed = server._get(path[len(prefix) : -len(suffix)])
+            if feed is None:
+                self._send(404, b"Not Found\n", {"Content-Type": "text/plain"})
+                return
+
+            headers = {
+                "ETag": feed.etag,
+                "Last-Modified": feed.last_modified,
+                "Cache-Control": "private, no-cache",
+                "Vary": "Accept-Encoding",
+            }
+            if_none_match = self.headers.get("If-None-Match", "")
+            if if_none_match.strip() == "*" or feed.etag in (
+                tag.strip() for tag in if_none_match.split(",")
+            ):
+                self._send(304, b"", headers, send_body=False)
+                return
+
+            headers["Content-Type"] = "text/calendar; charset=utf-8"
+            body = feed.body
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                headers["Content-Encoding"] = "gzip"
+                body = feed.gzip_body
+            self._send(200, body, headers, send_body)
+
+        def _send(
+            self, status: int, body: bytes, headers: dict, send_body: bool = True
+        ) -> None:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if status != 304:
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            # Paths contain the secret tokens, so they are not logged
+            status = args[1] if len(args) > 1 else ""
+            logger.debug(f"Feed request {getattr(self, 'command', '')} {status}")
+
+    return FeedRequestHandler
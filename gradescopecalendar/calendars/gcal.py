@@ -1,15 +1,23 @@
 from __future__ import annotations
 
-import time
 import datetime
 import os.path
 import logging
 
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 
+from gradescopecalendar.calendars.ratelimit import (
+    AdaptiveRateLimiter,
+    is_rate_limit_error,
+)
+from gradescopecalendar.calendars.state import SyncState
+from gradescopecalendar.metrics import SyncStats
+from gradescopecalendar.utils import assignment_items
+
 # If modifying these scopes, delete the file token.json.
 # calendar                      See, edit, share, and permanently delete all the calendars you can access using Google Calendar
 # calendar.events               View and edit events on all your calendars
@@ -18,11 +26,40 @@ from google.oauth2.credentials import Credentials
 # calendar.settings.readonly    View your Calendar settings
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
+# Key of the Gradescope calendar in the sync state, followed by the account
+# since accounts can write to different Google accounts with one state file
+STATE_TARGET = "Gradescope"
+# Event fields needed to compare events with assignments
+LIST_FIELDS = (
+    "items(id,status,summary,location,start,end,extendedProperties),"
+    "nextPageToken,nextSyncToken"
+)
+# Private extended property storing the uid of the assignment of an event
+UID_PROPERTY = "gradescopeUid"
+# Maximum number of requests in a batch request allowed by Google Calendar
+BATCH_SIZE = 50
+# Attempts for a rate limited request before giving up
+MAX_RETRIES = 8
+
 logger = logging.getLogger(__name__)
 
 
 class GCal:
-    """A class to handle connection with Google Calendar."""
+    """A class to handle connection with Google Calendar.
+
+    Attributes
+    ----------
+    rate_limiter : AdaptiveRateLimiter
+        delays batch requests while Google Calendar is rate limiting
+    stats : SyncStats
+        timings of listing and writing events, API requests and retries
+    """
+
+    def __init__(
+        self, rate_limiter: AdaptiveRateLimiter = None, stats: SyncStats = None
+    ) -> None:
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.stats = stats if stats is not None else SyncStats()
 
     # API setup taken from Google docs quickstart
     def _gcal_api_setup(self):
@@ -76,173 +113,540 @@ class GCal:
         logger.debug(f"Calendar already exists!\n{gs_cal}")
         return gs_cal
 
-    def _get_gcal_current_assignments(self, service, gs_cal_id: str) -> dict:
+    def _get_gcal_current_assignments(
+        self, service, gs_cal_id: str, state: SyncState = None
+    ) -> dict:
         """Connects to the Gradescope calendar on Google Calendar and gets all event details.
 
+        Only the event fields used for comparing are requested. With a sync
+        state the events are kept locally and later runs only request the
+        events changed since the previous listing using a sync token.
+
         Parameters
         ----------
         service : googleapiclient.discovery.Resource
             resource object to interact with Google API
         gs_cal_id : str
             ID of the Gradescope calendar on Google Calendar
+        state : SyncState (optional)
+            store for the sync token and the local copy of the events
+
+        Returns
+        -------
+        dict
+            events keyed by the uid of their assignment, or by summary for
+            events created before the uid was stored
         """
 
+        sync_token = None
+        events = {}
+        if state is not None:
+            sync_token = state.get_meta("gcal", gs_cal_id, "sync_token")
+            if sync_token is not None:
+                events = state.remote_events("gcal", gs_cal_id)
+
+        with self.stats.timer("list", backend="gcal"):
+            try:
+                changed, deleted, next_sync_token = self._gcal_list_events(
+                    service, gs_cal_id, sync_token
+                )
+            except HttpError as e:
+                # Sync token expired, list the whole calendar again
+                if sync_token is None or e.resp.status != 410:
+                    raise
+                logger.info("Google Calendar sync token expired, listing all events")
+                sync_token = None
+                events = {}
+                changed, deleted, next_sync_token = self._gcal_list_events(
+                    service, gs_cal_id
+                )
+
+        logger.debug(
+            f"Listed {len(changed)} changed and {len(deleted)} deleted gcal events"
+        )
+        for event_id in deleted:
+            events.pop(event_id, None)
+        events.update(changed)
+
+        if state is not None:
+            state.update_remote_events(
+                "gcal", gs_cal_id, changed, deleted, replace=sync_token is None
+            )
+            state.set_meta("gcal", gs_cal_id, "sync_token", next_sync_token)
+
         current_assignments = {}
+        for event in events.values():
+            current_assignments[_event_key(event)] = event
+        return current_assignments
+
+    def _gcal_list_events(
+        self, service, gs_cal_id: str, sync_token: str = None
+    ) -> tuple[dict, list, str]:
+        """List the events of the calendar, or those changed since a sync token.
+
+        Returns
+        -------
+        tuple (dict, list, str)
+            changed events by ID, IDs of deleted events and the next sync token
+        """
+
+        changed = {}
+        deleted = []
         page_token = None
 
         # Loop through all events
         while True:
             assignment_list = (
                 service.events()
-                .list(calendarId=gs_cal_id, pageToken=page_token)
+                .list(
+                    calendarId=gs_cal_id,
+                    pageToken=page_token,
+                    syncToken=sync_token,
+                    maxResults=2500,
+                    fields=LIST_FIELDS,
+                )
                 .execute()
             )
-            for event in assignment_list["items"]:
-                name = event["summary"]
-                current_assignments[name] = event
+            self.stats.count("api_requests", backend="gcal", method="list")
+            for event in assignment_list.get("items", []):
+                if event.get("status") == "cancelled":
+                    deleted.append(event["id"])
+                else:
+                    changed[event["id"]] = event
             page_token = assignment_list.get("nextPageToken")
             if not page_token:
                 break
 
-        return current_assignments
+        return changed, deleted, assignment_list.get("nextSyncToken")
 
-    def write_to_gcal(self, assignments_all: dict) -> bool:
+    def write_to_gcal(
+        self,
+        assignments_all: dict,
+        state: SyncState = None,
+        prune: bool = False,
+        account: str = None,
+    ) -> bool:
         """Connects to Google Calendar API to add events for Gradescope assignments.
 
+        Events are matched to assignments by the course and assignment ID
+        stored on them, so a renamed assignment patches the summary of its
+        event instead of creating a new one. Creates, patches and deletes are
+        sent in batch requests of up to BATCH_SIZE events. Rate limited
+        requests are retried with an increasing delay.
+
         Parameters
         ----------
-        assignments_all : dict
-            all assignments from Gradescope
+        assignments_all : dict or Iterable
+            all assignments from Gradescope, or a stream of (name, assignment)
+            pairs
+        state : SyncState (optional)
+            record of previous syncs, assignments unchanged since the last sync
+            are skipped and known events are updated without listing the
+            calendar
+        prune : bool
+            delete the events of the written courses whose assignment is not
+            among the written assignments any more; only events created for an
+            assignment are deleted, never events added by hand
+        account : str (optional)
+            the Gradescope account, usually its email, keeping its events apart
+            from those of other accounts in the sync state
         """
 
-        # Connect to Google Calendar API service
-        service = self._gcal_api_setup()
-
-        # Search for existing calendar and create if needed
-        gs_cal = self._find_gradescope_calendar(service)
-
-        # Loop through all current assignments on Google Calendar and get their info
-        current_assignments = self._get_gcal_current_assignments(
-            service=service, gs_cal_id=gs_cal["id"]
-        )
+        target = _state_target(account)
+        service = None
+        gs_cal = None
+        current_assignments = None
+        writes = []
+        # Identity of the written assignments and their courses for pruning
+        seen_uids = set()
+        seen_courses = set()
 
         # Loop through all assignments from Gradescope and update/create events in Google Calendar as needed
         # Priority given to Gradescope for {open time, close time, location}
         # Priority given to Google Calendar for all other fields
-        EPOCHTIME = "1970-01-01T00:00:00+0000"
-        for name, assignment in assignments_all.items():
+        for name, assignment in assignment_items(assignments_all):
+            seen_uids.add(assignment.uid)
+            seen_courses.add(assignment.course.cid)
+            fingerprint = event_id = None
+            if state is not None:
+                fingerprint = state.fingerprint(name, assignment)
+                synced_fingerprint, event_id = state.get(
+                    "gcal", target, assignment.uid
+                )
+                if synced_fingerprint == fingerprint:
+                    logger.debug(f"Google Calendar: unchanged assignment: {name}")
+                    continue
+
+            # Only connect to the API once something has to be written
+            if service is None:
+                # Connect to Google Calendar API service
+                service = self._gcal_api_setup()
+                # Search for existing calendar and create if needed
+                gs_cal = self._find_gradescope_calendar(service)
+
             # Format time to match time from API
             end_time = datetime.datetime.strftime(
                 assignment.close_date, "%Y-%m-%dT%H:%M:%S%z"
             )
             start_time = end_time  # Zero duration event
 
-            event_mode = None
-            event_body = None
-            # Update existing event details
-            if name in current_assignments:
-                # Attributes to compare between Google Calendar and Gradescope
-                is_different_url = (
-                    assignment.url != ""
-                    and current_assignments[name].get("location", "") != assignment.url
-                )
-                is_different_start = assignment.open_date not in (
-                    EPOCHTIME,
-                    "",
-                ) and current_assignments[name]["start"]["dateTime"] != time.strftime(
-                    "%Y-%m-%dT%H:%M:%SZ", assignment.close_date.utctimetuple()
-                )
-                is_different_end = assignment.close_date not in (
-                    EPOCHTIME,
-                    "",
-                ) and current_assignments[name]["end"]["dateTime"] != time.strftime(
-                    "%Y-%m-%dT%H:%M:%SZ",
-                    assignment.close_date.utctimetuple(),
-                )
-
-                # Only modify events with divergent urls, start, or end times to speed up execution
-                if is_different_url or is_different_start or is_different_end:
-                    # Check if assignment url exists and update if different from gcal
-                    if is_different_url:
-                        logger.debug("URL location will be updated")
-                        current_assignments[name]["location"] = assignment.url
-                    # Check if assignment open date exists and update if different from gcal
-                    if is_different_start:
-                        logger.debug("Start time will be updated")
-                        current_assignments[name]["start"]["dateTime"] = start_time
-                    # Check if assignment close date exists and update if different from gcal
-                    if is_different_end:
-                        logger.debug("End time will be updated")
-                        current_assignments[name]["end"]["dateTime"] = end_time
-                    event_mode = "update"
-                    event_body = current_assignments[name]
-
-            # Create new event details
-            elif assignment.close_date != EPOCHTIME:
-                logger.debug(f"Creating new event {name}")
-                event_mode = "create"
-                event_body = {
+            write = {
+                "name": name,
+                "uid": assignment.uid,
+                "fingerprint": fingerprint,
+                "mode": None,
+                "event_id": event_id,
+                "event_body": {
                     "summary": name,
                     "location": assignment.url,
-                    "start": {
-                        "dateTime": start_time,
-                    },
-                    "end": {
-                        "dateTime": end_time,
+                    "start": {"dateTime": start_time},
+                    "end": {"dateTime": end_time},
+                    "extendedProperties": {
+                        "private": {UID_PROPERTY: assignment.uid}
                     },
-                }
+                },
+            }
 
-            if event_mode != None:
-                try:
-                    self._gcal_event_modify(
-                        mode=event_mode,
-                        service=service,
-                        gs_cal_id=gs_cal["id"],
-                        event_body=event_body,
-                        event_id=current_assignments[name].get("id", None)
-                        if name in current_assignments
-                        else None,
+            # Event known from a previous sync, update it without listing
+            if event_id is not None:
+                write["mode"] = "patch"
+            else:
+                # Loop through all current assignments on Google Calendar and get their info
+                if current_assignments is None:
+                    current_assignments = self._get_gcal_current_assignments(
+                        service=service, gs_cal_id=gs_cal["id"], state=state
                     )
-                    time.sleep(0.25)  # Delay to help with rate limits
-                except ValueError as e:
-                    logger.exception(e)
+                event = current_assignments.get(assignment.uid)
+                if event is None:
+                    # Events created before the uid was stored on them
+                    event = current_assignments.get(name)
+                write.update(self._gcal_compare_event(event, assignment, write))
+
+            if write["mode"] is not None:
+                writes.append(write)
+            elif state is not None and write["event_id"] is not None:
+                # Already up to date on Google Calendar
+                state.record(
+                    "gcal",
+                    target,
+                    assignment.uid,
+                    fingerprint,
+                    write["event_id"],
+                )
+
+            # Send full batches while assignments are still being read
+            if len(writes) >= BATCH_SIZE:
+                self._gcal_execute_batches(
+                    service, gs_cal["id"], writes, state, target
+                )
+                writes = []
 
             logger.debug(f"Google Calendar: done with assignment: {assignment.name}")
 
-    # create new gcal event
-    def _gcal_event_modify(
-        self, service, gs_cal_id: str, event_body: dict, mode: str, event_id: str = None
-    ) -> None:
-        """Creates or updates a Google Calendar event.
+        if writes:
+            self._gcal_execute_batches(service, gs_cal["id"], writes, state, target)
+
+        if not prune:
+            return
+        stale = self._gcal_stale_events(
+            current_assignments, state, seen_uids, seen_courses, target
+        )
+        if not stale:
+            return
+        if service is None:
+            service = self._gcal_api_setup()
+            gs_cal = self._find_gradescope_calendar(service)
+        logger.info(f"Deleting {len(stale)} events of removed assignments")
+        self._gcal_execute_batches(
+            service,
+            gs_cal["id"],
+            [
+                {"name": uid, "uid": uid, "mode": "delete", "event_id": event_id}
+                for uid, event_id in stale.items()
+            ],
+            state,
+            target,
+        )
+
+    def _gcal_stale_events(
+        self,
+        current_assignments: dict,
+        state: SyncState,
+        seen_uids: set,
+        seen_courses: set,
+        target: str = STATE_TARGET,
+    ) -> dict[str, str]:
+        """Find the events of the written courses without a written assignment.
+
+        Events are taken from the sync state and from the listing of the
+        calendar if it was listed, so without changes nothing is requested.
+
+        Parameters
+        ----------
+        current_assignments : dict
+            events keyed by assignment uid, None if the calendar was not listed
+        state : SyncState
+            record of the events written by previous syncs, None if disabled
+        seen_uids : set
+            uids of the written assignments
+        seen_courses : set
+            IDs of the courses of the written assignments
+        target : str
+            key of the calendar of the account in the sync state
+
+        Returns
+        -------
+        dict[str, str]
+            event ID of every stale event by assignment uid
+        """
+
+        candidates = {}
+        if state is not None:
+            for uid, (_, event_id) in state.all("gcal", target).items():
+                if event_id is not None:
+                    candidates[uid] = event_id
+        for event in (current_assignments or {}).values():
+            uid = event.get("extendedProperties", {}).get("private", {}).get(
+                UID_PROPERTY
+            )
+            # Events without a uid were added by hand or not matched yet
+            if uid is not None:
+                candidates[uid] = event["id"]
+        return {
+            uid: event_id
+            for uid, event_id in candidates.items()
+            if uid not in seen_uids and uid.split("-", 1)[0] in seen_courses
+        }
+
+    def _gcal_compare_event(self, event: dict, assignment, write: dict) -> dict:
+        """Decide how to write an assignment given its current event.
+
+        Changed events are patched with only the fields that differ, so a
+        renamed assignment is a single patch of the summary.
+
+        Returns
+        -------
+        dict
+            the mode ("create", "patch" or None if up to date), patched fields
+            and event ID of the write
+        """
+
+        if event is None:
+            # Create new event details
+            logger.debug(f"Creating new event {write['name']}")
+            return {"mode": "create"}
+
+        # Attributes to compare between Google Calendar and Gradescope
+        is_different_url = (
+            assignment.url != "" and event.get("location", "") != assignment.url
+        )
+        # Zero duration events, both start and end are at the close date
+        is_different_start = not _is_at(event.get("start"), assignment.close_date)
+        is_different_end = not _is_at(event.get("end"), assignment.close_date)
+
+        is_missing_uid = _event_key(event) != assignment.uid
+        is_renamed = event.get("summary") != write["name"]
+
+        # Only modify events with divergent names, urls, start, or end times to speed up execution
+        if not (
+            is_different_url
+            or is_different_start
+            or is_different_end
+            or is_missing_uid
+            or is_renamed
+        ):
+            return {"event_id": event["id"]}
+
+        body = write["event_body"]
+        patch = {}
+        # Store the assignment uid on events identified by their summary
+        if is_missing_uid:
+            logger.debug("Assignment uid will be added")
+            private = dict(event.get("extendedProperties", {}).get("private", {}))
+            private[UID_PROPERTY] = assignment.uid
+            patch["extendedProperties"] = {"private": private}
+        if is_renamed:
+            logger.debug("Summary will be updated")
+            patch["summary"] = body["summary"]
+        # Check if assignment url exists and update if different from gcal
+        if is_different_url:
+            logger.debug("URL location will be updated")
+            patch["location"] = body["location"]
+        # Check if assignment open date exists and update if different from gcal
+        if is_different_start:
+            logger.debug("Start time will be updated")
+            patch["start"] = body["start"]
+        # Check if assignment close date exists and update if different from gcal
+        if is_different_end:
+            logger.debug("End time will be updated")
+            patch["end"] = body["end"]
+        return {"mode": "patch", "patch_body": patch, "event_id": event["id"]}
+
+    def _gcal_request(self, service, gs_cal_id: str, write: dict):
+        """Build the API request that creates, updates or patches an event.
 
         Parameters
         ----------
-        mode : str
-            "create", "update"
         service : googleapiclient.discovery.Resource
             resource object to interact with Google API
         gs_cal_id : str
             ID of the Gradescope calendar
-        event_body : dict
-            details about the calendar event to modify
-        event_id : str (optional)
-            eventID to update
+        write : dict
+            mode, event body, optionally the patched fields, and event ID of
+            the write
+
+        Exceptions
+        ----------
+        ValueError
+            Invalid mode of the write.
         """
 
-        if mode.lower() == "create":
-            logger.debug(f"Creating a new gcal event...")
-            event = (
-                service.events().insert(calendarId=gs_cal_id, body=event_body).execute()
+        mode = write["mode"]
+        if mode == "create":
+            return service.events().insert(
+                calendarId=gs_cal_id, body=write["event_body"]
             )
-            logger.info(f"Event created: {event.get('htmlLink')}")
-        elif mode.lower() == "update":
-            logger.debug(f"Updating a gcal event...")
-            updated_event = (
-                service.events()
-                .update(calendarId=gs_cal_id, body=event_body, eventId=event_id)
-                .execute()
+        if mode == "patch":
+            return service.events().patch(
+                calendarId=gs_cal_id,
+                body=write.get("patch_body") or write["event_body"],
+                eventId=write["event_id"],
+            )
+        if mode == "delete":
+            return service.events().delete(
+                calendarId=gs_cal_id, eventId=write["event_id"]
             )
-            logger.info(f"Event update: {updated_event.get('htmlLink')}")
-        else:
-            raise ValueError(f"Invalid mode {mode} for {event_body.get('name')}")
-        logger.debug(f"Done modifying event")
+        raise ValueError(f"Invalid mode {mode} for {write['name']}")
+
+    def _gcal_execute_batches(
+        self,
+        service,
+        gs_cal_id: str,
+        writes: list[dict],
+        state: SyncState = None,
+        target: str = STATE_TARGET,
+    ) -> None:
+        """Send writes in batch requests, retrying the rate limited ones.
+
+        Parameters
+        ----------
+        service : googleapiclient.discovery.Resource
+            resource object to interact with Google API
+        gs_cal_id : str
+            ID of the Gradescope calendar
+        writes : list[dict]
+            the writes to send
+        state : SyncState (optional)
+            record of previous syncs to save the written events to
+        target : str
+            key of the calendar of the account in the sync state
+        """
+
+        limiter = self.rate_limiter
+        pending = list(writes)
+        while pending:
+            batch_writes, pending = pending[:BATCH_SIZE], pending[BATCH_SIZE:]
+            retry = []
+            rate_limited = []
+
+            def retry_rate_limited(write: dict) -> None:
+                rate_limited.append(write)
+                write["attempts"] = write.get("attempts", 0) + 1
+                if write["attempts"] <= MAX_RETRIES:
+                    retry.append(write)
+                    self.stats.count("retries", backend="gcal")
+                else:
+                    logger.error(f"Giving up on rate limited event {write['name']}")
+
+            def callback(request_id: str, event: dict, exception: Exception) -> None:
+                write = batch_writes[int(request_id)]
+                if exception is None and write["mode"] == "delete":
+                    logger.info(f"Event delete: {write['event_id']}")
+                    self.stats.count("events_written", backend="gcal", mode="delete")
+                    if state is not None:
+                        state.forget("gcal", target, write["uid"])
+                elif exception is None:
+                    logger.info(f"Event {write['mode']}: {event.get('htmlLink')}")
+                    self.stats.count(
+                        "events_written", backend="gcal", mode=write["mode"]
+                    )
+                    if state is not None:
+                        state.record(
+                            "gcal",
+                            target,
+                            write["uid"],
+                            write["fingerprint"],
+                            event["id"],
+                        )
+                elif is_rate_limit_error(exception):
+                    retry_rate_limited(write)
+                elif write["mode"] == "patch" and exception.resp.status in (404, 410):
+                    # Event was deleted from Google Calendar, create it again
+                    logger.debug(f"Event {write['event_id']} no longer exists")
+                    retry.append(
+                        dict(write, mode="create", event_id=None, patch_body=None)
+                    )
+                elif write["mode"] == "delete" and exception.resp.status in (404, 410):
+                    # Already deleted from Google Calendar
+                    logger.debug(f"Event {write['event_id']} no longer exists")
+                    if state is not None:
+                        state.forget("gcal", target, write["uid"])
+                else:
+                    logger.exception(exception)
+
+            limiter.wait()
+            batch = service.new_batch_http_request(callback=callback)
+            for i, write in enumerate(batch_writes):
+                try:
+                    batch.add(
+                        self._gcal_request(service, gs_cal_id, write),
+                        request_id=str(i),
+                    )
+                except ValueError as e:
+                    logger.exception(e)
+            try:
+                with self.stats.timer("write", backend="gcal"):
+                    batch.execute()
+            except HttpError as e:
+                # The whole batch request was rate limited, retry all its writes
+                if not is_rate_limit_error(e):
+                    raise
+                for write in batch_writes:
+                    retry_rate_limited(write)
+            self.stats.count("api_requests", backend="gcal", method="batch")
+            logger.debug(f"Sent batch of {len(batch_writes)} Google Calendar writes")
+
+            if rate_limited:
+                limiter.backoff()
+            else:
+                limiter.success()
+            pending = retry + pending
+
+
+def _state_target(account: str = None) -> str:
+    """Key of the Gradescope calendar of an account in the sync state."""
+
+    if not account:
+        return STATE_TARGET
+    return f"{STATE_TARGET}#{account.strip().lower()}"
+
+
+def _is_at(event_time: dict, date: datetime.datetime) -> bool:
+    """Whether the start or end of an event is at the same instant as a date.
+
+    Google Calendar returns times in the offset of the calendar, so the
+    instants are compared rather than the strings.
+    """
+
+    value = (event_time or {}).get("dateTime")
+    if not value:
+        return False
+    # fromisoformat() only accepts the Z suffix from Python 3.11
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")) == date
+
+
+def _event_key(event: dict) -> str:
+    """Identity of the assignment of an event, the summary for older events."""
+
+    private = event.get("extendedProperties", {}).get("private", {})
+    return private.get(UID_PROPERTY) or event.get("summary")
@@ -1,41 +1,130 @@
 from __future__ import annotations
 
+import datetime
 import logging
 from pathlib import Path
-from icalendar import Calendar, Event
+from typing import Iterator
+
+from icalendar import Event
 from icalendar import vText
 
+from gradescopecalendar.calendars.state import SyncState
+from gradescopecalendar.metrics import SyncStats
+from gradescopecalendar.utils import assignment_items, atomic_write_chunks, event_uid
+
 logger = logging.getLogger(__name__)
 
+CALENDAR_HEADER = (
+    b"BEGIN:VCALENDAR\r\n"
+    b"VERSION:2.0\r\n"
+    b"PRODID:-//gradescopecalendar//Gradescope Calendar//EN\r\n"
+)
+CALENDAR_FOOTER = b"END:VCALENDAR\r\n"
+
 
 class ICal:
-    def write_to_ical(self, assignments_all: dict, path: str = None) -> None:
+    """A class to write assignments to an iCalendar file.
+
+    Attributes
+    ----------
+    stats : SyncStats
+        timings of writing the file
+    """
+
+    def __init__(self, stats: SyncStats = None) -> None:
+        self.stats = stats if stats is not None else SyncStats()
+
+    def write_to_ical(
+        self, assignments_all: dict, path: str = None, state: SyncState = None
+    ) -> bool:
         """Write assignment details to .ics file.
 
+        Events are serialized one at a time while the file is written, with a
+        UID and DTSTAMP that only depend on the assignment. The file is
+        replaced atomically and left untouched if its contents did not change,
+        so subscribed calendar clients keep their cached copy.
+
         Parameters
         ----------
+        assignments_all : dict or Iterable
+            all assignments from Gradescope, or a stream of (name, assignment)
+            pairs
         path : str
-            the path of the output file, defaults to the script location
+            the directory of the output file, defaults to the script location
+        state : SyncState (optional)
+            record of previous syncs, updated with the written assignments
+
+        Returns
+        -------
+        bool
+            whether the file was written
         """
 
         if not path:
             path = Path.cwd()
+        target = Path(path, "gradescopecal.ics")
+
+        entries = {}
+        with self.stats.timer("write", backend="ical"):
+            written = atomic_write_chunks(
+                target,
+                self._ical_chunks(assignment_items(assignments_all), entries, state),
+                mode=0o644,
+            )
+        if written:
+            logger.info(f"Wrote file to: {target}")
+        else:
+            logger.info(f"No assignments changed since writing: {target}")
+
+        if state is not None:
+            state.replace("ical", str(target.resolve()), entries)
+        return written
+
+    def serialize(self, assignments_all: dict) -> bytes:
+        """Serialize assignment details to the contents of an .ics file.
 
-        # Extract relevant details from assignment for calendar event
-        cal = Calendar()
-        for name, assignment in assignments_all.items():
-            end_time = assignment.close_date
-            start_time = end_time  # Zero duration event for deadlines
+        Parameters
+        ----------
+        assignments_all : dict or Iterable
+            all assignments from Gradescope, or a stream of (name, assignment)
+            pairs
+        """
+
+        return b"".join(self._ical_chunks(assignment_items(assignments_all), {}))
+
+    def _ical_chunks(
+        self, assignments, entries: dict, state: SyncState = None
+    ) -> Iterator[bytes]:
+        """Serialize the calendar one event at a time.
+
+        Parameters
+        ----------
+        assignments : Iterable
+            (name, assignment) pairs
+        entries : dict
+            filled with the fingerprint of every written assignment by uid
+        state : SyncState (optional)
+            used to fingerprint the assignments
+        """
+
+        yield CALENDAR_HEADER
+        for name, assignment in assignments:
+            # Zero duration event for deadlines, in UTC since Gradescope dates
+            # have fixed offsets without a time zone definition
+            end_time = assignment.close_date.astimezone(datetime.timezone.utc)
+            start_time = end_time
 
             event = Event()
+            event.add("uid", event_uid(assignment))
+            # Stable between runs so unchanged assignments serialize identically,
+            # the close date always exists while the open date may be missing
+            event.add("dtstamp", end_time)
             event.add("summary", name)
             event.add("dtstart", start_time)
             event.add("dtend", end_time)
             event["location"] = vText(assignment.url)
 
-            cal.add_component(event)
-
-        # Write to file
-        with open(f"{path}/gradescopecal.ics", "wb") as f:
-            f.write(cal.to_ical())
-            logger.info(f"Wrote file to: {path}/gradescopecal.ics")
+            if state is not None:
+                entries[assignment.uid] = (state.fingerprint(name, assignment), None)
+            yield event.to_ical()
+        yield CALENDAR_FOOTER
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveRateLimiter:
+    """Delay between requests that only grows while the API is rate limiting.
+
+    Requests run at full speed until backoff() is called. Every consecutive
+    backoff doubles the delay (with jitter) up to max_delay, and every success
+    halves it again until it drops back to zero.
+
+    Attributes
+    ----------
+    delay : float
+        seconds to wait before the next request
+
+    Methods
+    -------
+    wait()
+        sleeps for the current delay
+    backoff()
+        increases the delay after a rate limited response
+    success()
+        decreases the delay after a successful response
+    """
+
+    def __init__(
+        self, base_delay: float = 1.0, max_delay: float = 64.0, sleep=time.sleep
+    ) -> None:
+        """
+        Parameters
+        ----------
+        base_delay : float
+            delay after the first rate limited response in seconds
+        max_delay : float
+            maximum delay in seconds
+        sleep : Callable[[float], None]
+            function used to wait, replaceable for testing
+        """
+
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self._sleep = sleep
+
+    def wait(self) -> None:
+        if self.delay > 0:
+            logger.debug(f"Waiting {self.delay:.2f}s for rate limits")
+            self._sleep(self.delay)
+
+    def backoff(self) -> None:
+        delay = self.base_delay if self.delay == 0 else self.delay * 2
+        self.delay = min(self.max_delay, delay * random.uniform(1.0, 1.25))
+        logger.info(f"Rate limited, backing off for {self.delay:.2f}s")
+
+    def success(self) -> None:
+        self.delay = self.delay / 2 if self.delay >= self.base_delay else 0.0
+
+
+def is_rate_limit_error(exception: Exception) -> bool:
+    """Whether an API error means the request was rate limited.
+
+    Google APIs answer 429, or 403 with a rateLimitExceeded reason.
+    """
+
+    resp = getattr(exception, "resp", None)
+    if resp is None:
+        return False
+    if resp.status == 429:
+        return True
+    if resp.status == 403:
+        reasons = getattr(exception, "error_details", None) or []
+        reason_text = str(reasons) + str(getattr(exception, "content", b""))
+        return "rateLimitExceeded" in reason_text or "RateLimitExceeded" in reason_text
+    return False
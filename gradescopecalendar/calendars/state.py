@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class SyncState:
+    """Local SQLite store of what was last written to each calendar.
+
+    For every assignment the fingerprint of the event details and the ID of the
+    remote event are recorded per backend and target calendar. Writers compare
+    the fingerprints with the current assignments to find the events to create
+    or update without listing the remote calendar.
+
+    Attributes
+    ----------
+    path : Path
+        location of the SQLite database
+
+    Methods
+    -------
+    fingerprint(name, assignment)
+        returns a hash of the event details of an assignment
+    get(backend, target, uid)
+        returns the recorded fingerprint and remote ID of an assignment
+    record(backend, target, uid, fingerprint, remote_id)
+        saves the fingerprint and remote ID of an assignment
+    replace(backend, target, entries)
+        replaces all recorded assignments of a target calendar
+    get_meta(backend, target, key) / set_meta(backend, target, key, value)
+        reads or saves other per calendar values such as sync tokens
+    remote_events(backend, target) / update_remote_events(...)
+        reads or updates the local copy of the events of a remote calendar
+    """
+
+    def __init__(self, path: str = None) -> None:
+        """Open or create the database.
+
+        Parameters
+        ----------
+        path : str (optional)
+            location of the database, defaults to
+            ``~/.cache/gradescopecalendar/state.db``
+        """
+
+        if not path:
+            path = Path.home() / ".cache" / "gradescopecalendar" / "state.db"
+        self.path = Path(path)
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # Writers may record from worker threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS synced ("
+                "backend TEXT, target TEXT, uid TEXT, fingerprint TEXT, remote_id TEXT, "
+                "PRIMARY KEY (backend, target, uid))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS remote_events ("
+                "backend TEXT, target TEXT, remote_id TEXT, body TEXT, "
+                "PRIMARY KEY (backend, target, remote_id))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                "backend TEXT, target TEXT, key TEXT, value TEXT, "
+                "PRIMARY KEY (backend, target, key))"
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+    @staticmethod
+    def fingerprint(name: str, assignment) -> str:
+        """Hash of the assignment details written to calendar events."""
+
+        details = "\n".join(
+            (
+                name,
+                assignment.url or "",
+                assignment.open_date.isoformat(),
+                assignment.close_date.isoformat(),
+            )
+        )
+        return hashlib.sha1(details.encode()).hexdigest()
+
+    def get(self, backend: str, target: str, uid: str) -> tuple[str, str]:
+        """Get the recorded fingerprint and remote ID of an assignment.
+
+        Returns
+        -------
+        tuple (str, str)
+            fingerprint and remote ID, both None if the assignment is unknown
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint, remote_id FROM synced "
+                "WHERE backend = ? AND target = ? AND uid = ?",
+                (backend, target, uid),
+            ).fetchone()
+        return row if row is not None else (None, None)
+
+    def all(self, backend: str, target: str) -> dict[str, tuple[str, str]]:
+        """Get the fingerprint and remote ID of every recorded assignment."""
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT uid, fingerprint, remote_id FROM synced "
+                "WHERE backend = ? AND target = ?",
+                (backend, target),
+            ).fetchall()
+        return {uid: (fingerprint, remote_id) for uid, fingerprint, remote_id in rows}
+
+    def record(
+        self,
+        backend: str,
+        target: str,
+        uid: str,
+        fingerprint: str,
+        remote_id: str = None,
+    ) -> None:
+        """Save the fingerprint and remote ID written for an assignment."""
+
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO synced VALUES (?, ?, ?, ?, ?)",
+                (backend, target, uid, fingerprint, remote_id),
+            )
+
+    def forget(self, backend: str, target: str, uid: str) -> None:
+        """Remove the record of an assignment."""
+
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM synced WHERE backend = ? AND target = ? AND uid = ?",
+                (backend, target, uid),
+            )
+
+    def replace(
+        self, backend: str, target: str, entries: dict[str, tuple[str, str]]
+    ) -> None:
+        """Replace all recorded assignments of a target calendar.
+
+        Parameters
+        ----------
+        entries : dict[str, tuple[str, str]]
+            fingerprint and remote ID keyed by assignment uid
+        """
+
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM synced WHERE backend = ? AND target = ?", (backend, target)
+            )
+            self._db.executemany(
+                "INSERT INTO synced VALUES (?, ?, ?, ?, ?)",
+                [
+                    (backend, target, uid, fingerprint, remote_id)
+                    for uid, (fingerprint, remote_id) in entries.items()
+                ],
+            )
+
+    def get_meta(self, backend: str, target: str, key: str) -> str:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE backend = ? AND target = ? AND key = ?",
+                (backend, target, key),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, backend: str, target: str, key: str, value: str) -> None:
+        with self._lock, self._db:
+            if value is None:
+                self._db.execute(
+                    "DELETE FROM meta WHERE backend = ? AND target = ? AND key = ?",
+                    (backend, target, key),
+                )
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?)",
+                    (backend, target, key, value),
+                )
+
+    def remote_events(self, backend: str, target: str) -> dict[str, dict]:
+        """Get the local copy of the events of a remote calendar by ID."""
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT remote_id, body FROM remote_events "
+                "WHERE backend = ? AND target = ?",
+                (backend, target),
+            ).fetchall()
+        return {remote_id: json.loads(body) for remote_id, body in rows}
+
+    def update_remote_events(
+        self,
+        backend: str,
+        target: str,
+        events: dict[str, dict],
+        deleted: list[str] = (),
+        replace: bool = False,
+    ) -> None:
+        """Update the local copy of the events of a remote calendar.
+
+        Parameters
+        ----------
+        events : dict[str, dict]
+            new or changed events by ID
+        deleted : list[str]
+            IDs of the events removed from the calendar
+        replace : bool
+            whether to drop all previously stored events first
+        """
+
+        with self._lock, self._db:
+            if replace:
+                self._db.execute(
+                    "DELETE FROM remote_events WHERE backend = ? AND target = ?",
+                    (backend, target),
+                )
+            self._db.executemany(
+                "DELETE FROM remote_events "
+                "WHERE backend = ? AND target = ? AND remote_id = ?",
+                [(backend, target, remote_id) for remote_id in deleted],
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO remote_events VALUES (?, ?, ?, ?)",
+                [
+                    (backend, target, remote_id, json.dumps(body))
+                    for remote_id, body in events.items()
+                ],
+            )
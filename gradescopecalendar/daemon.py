@@ -0,0 +1,463 @@
+"""Long running sync of many Gradescope accounts.
+
+Run ``python -m gradescopecalendar.daemon accounts.json`` with a JSON list of
+accounts such as::
+
+    [
+        {
+            "email": "student@example.edu",
+            "password": "...",
+            "ical": "/srv/calendars/student",
+            "caldav": {"url": "...", "calName": "Gradescope",
+                       "username": "...", "password": "..."},
+            "feed": "<random token>",
+            "options": {"session_cache": true, "state": true}
+        }
+    ]
+
+``ical`` is the directory of the .ics file, ``caldav`` the arguments of
+write_to_caldav(), ``gcal`` enables write_to_gcal() (``{"prune": true}`` also
+deletes the events of removed assignments), ``feed`` is the token of
+the URL the calendar is served at with ``--feed-port`` and ``options`` are
+passed to GradescopeCalendar.
+
+With ``--remind-stdout``, ``--remind-webhook`` or ``--remind-smtp`` reminders
+are also sent ``--remind-before`` hours before every assignment closes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gradescopecalendar import enable_file_logging
+from gradescopecalendar.calendars.feed import FeedServer
+from gradescopecalendar.gradescope.transport import GSTransport, TokenBucket
+from gradescopecalendar.gradescopecalendar import GradescopeCalendar
+from gradescopecalendar.reminders import (
+    OFFSETS,
+    EmailNotifier,
+    ReminderScheduler,
+    StdoutNotifier,
+    WebhookNotifier,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two syncs of an account
+INTERVAL = 900
+# Fraction of the interval by which syncs are randomly moved
+JITTER = 0.1
+# Keys of an account in the accounts file, the arguments of SyncAccount
+ACCOUNT_KEYS = frozenset(
+    ("email", "password", "ical", "caldav", "gcal", "feed", "options")
+)
+
+
+class SyncAccount:
+    """A Gradescope account and the calendars it is synced to.
+
+    The GradescopeCalendar, and with it the Gradescope session, is kept
+    between syncs so the account only logs in again once the session expires.
+
+    Attributes
+    ----------
+    email : str
+        email address of the account
+    calendar : GradescopeCalendar
+        the calendar interface of the account, None before the first sync
+    last_sync : float
+        time.time() of the last successful sync, None if none succeeded
+    failures : int
+        number of consecutive failed syncs
+    """
+
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        ical: str = None,
+        caldav: dict = None,
+        gcal: bool | dict = False,
+        feed: str = None,
+        options: dict = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        email : str
+            email address to login as
+        password : str
+            password of the account
+        ical : str (optional)
+            directory to write the .ics file of the account to
+        caldav : dict (optional)
+            arguments of GradescopeCalendar.write_to_caldav()
+        gcal : bool or dict
+            whether to write the assignments to Google Calendar, or the
+            arguments of GradescopeCalendar.write_to_gcal()
+        feed : str (optional)
+            token of the URL the assignments are served at by the feed server
+        options : dict (optional)
+            keyword arguments of GradescopeCalendar
+        """
+
+        self.email = email
+        self._password = password
+        self.ical = ical
+        self.caldav = caldav
+        self.gcal = gcal
+        self.feed = feed
+        self.options = options or {}
+        self.calendar = None
+        self.last_sync = None
+        self.failures = 0
+
+    def sync(
+        self, feed_server: FeedServer = None, transport: GSTransport = None
+    ) -> None:
+        """Load the assignments of the account and write them to its calendars.
+
+        Parameters
+        ----------
+        feed_server : FeedServer (optional)
+            server to publish the feed of the account on
+        transport : GSTransport (optional)
+            transport shared with the other accounts, used when the calendar
+            of the account is created
+        """
+
+        if self.calendar is None:
+            options = dict(self.options)
+            if transport is not None:
+                options.setdefault("transport", transport)
+            self.calendar = GradescopeCalendar(
+                self.email, self._password, load=False, **options
+            )
+        targets = {}
+        if self.ical is not None:
+            targets["ical"] = {"path": self.ical}
+        if self.caldav is not None:
+            targets["caldav"] = self.caldav
+        if self.gcal:
+            targets["gcal"] = self.gcal if isinstance(self.gcal, dict) else {}
+        if self.feed is not None and feed_server is not None:
+            targets["feed"] = {"server": feed_server, "token": self.feed}
+        # Calendars are written while the courses are loaded
+        self.calendar.sync(targets)
+        self.last_sync = time.time()
+
+
+class SyncDaemon:
+    """Periodically syncs many accounts on a bounded pool of workers.
+
+    Every account is synced once per interval, moved by a random jitter so the
+    requests of different accounts are spread out instead of arriving in
+    bursts. At most ``workers`` accounts are synced at the same time, each
+    fetching up to its ``max_workers`` option courses at once, and an account
+    is never synced twice at the same time.
+
+    Methods
+    -------
+    run()
+        syncs the accounts until stop() is called
+    stop()
+        stops scheduling syncs, run() returns once the running syncs finish
+    """
+
+    def __init__(
+        self,
+        accounts: list[SyncAccount],
+        interval: float = INTERVAL,
+        jitter: float = JITTER,
+        workers: int = 4,
+        feed_server: FeedServer = None,
+        metrics_file: str = None,
+        transport: GSTransport = None,
+        reminders: ReminderScheduler = None,
+        clock=time.monotonic,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        accounts : list[SyncAccount]
+            accounts to sync
+        interval : float
+            seconds between two syncs of an account
+        jitter : float
+            fraction of the interval by which syncs are randomly moved, the
+            first syncs are spread over this fraction of the interval
+        workers : int
+            maximum number of accounts synced at the same time
+        feed_server : FeedServer (optional)
+            server publishing the feeds of the accounts
+        metrics_file : str (optional)
+            file the stats of every sync are appended to as JSON lines
+        transport : GSTransport (optional)
+            transport shared by the accounts, for example to limit their
+            combined rate of requests to Gradescope
+        reminders : ReminderScheduler (optional)
+            scheduler updated with the assignments of every successful sync
+        clock : Callable[[], float]
+            monotonic time function, replaceable for testing
+        """
+
+        self.accounts = accounts
+        self.interval = interval
+        self.jitter = max(0.0, min(jitter, 1.0))
+        self.workers = max(1, workers)
+        self.feed_server = feed_server
+        self.metrics_file = metrics_file
+        self.transport = transport
+        self.reminders = reminders
+        self._metrics_lock = threading.Lock()
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._queue = []
+        self._order = itertools.count()
+        self._running = 0
+        self._stopped = False
+
+        now = self._clock()
+        for account in accounts:
+            self._schedule(account, now + random.uniform(0, self.interval * self.jitter))
+
+    def _schedule(self, account: SyncAccount, due: float) -> None:
+        heapq.heappush(self._queue, (due, next(self._order), account))
+
+    def _next_delay(self, account: SyncAccount) -> float:
+        """Seconds until the next sync of an account, longer after failures."""
+
+        delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        if account.failures:
+            # Retry failing accounts sooner at first, then back off to the interval
+            delay = min(delay, 30 * 2 ** (account.failures - 1))
+        return delay
+
+    def run(self) -> None:
+        """Sync the accounts until stop() is called."""
+
+        logger.info(
+            f"Syncing {len(self.accounts)} accounts every {self.interval}s "
+            f"with {self.workers} workers"
+        )
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                with self._condition:
+                    account = self._next_due()
+                    if account is None:
+                        break
+                    self._running += 1
+                pool.submit(self._sync_account, account)
+        logger.info("Stopped syncing accounts")
+
+    def _next_due(self) -> SyncAccount:
+        """Wait until an account is due and a worker is free.
+
+        Must be called holding the condition.
+
+        Returns
+        -------
+        SyncAccount
+            the account to sync, None once the daemon is stopped
+        """
+
+        while not self._stopped:
+            timeout = None
+            if self._running < self.workers and self._queue:
+                due, _, account = self._queue[0]
+                timeout = due - self._clock()
+                if timeout <= 0:
+                    heapq.heappop(self._queue)
+                    return account
+            self._condition.wait(timeout)
+        return None
+
+    def _sync_account(self, account: SyncAccount) -> None:
+        ok = False
+        try:
+            account.sync(self.feed_server, self.transport)
+            account.failures = 0
+            ok = True
+            logger.debug(f"Synced account {account.email}")
+            if self.reminders is not None:
+                # Only the assignments whose close date changed are rescheduled
+                self.reminders.update(account.email, account.calendar.assignments_all)
+        except Exception:
+            account.failures += 1
+            logger.exception(f"Failed to sync account {account.email}")
+        finally:
+            self._write_metrics(account, ok)
+            with self._condition:
+                self._running -= 1
+                self._schedule(account, self._clock() + self._next_delay(account))
+                self._condition.notify()
+
+    def _write_metrics(self, account: SyncAccount, ok: bool) -> None:
+        """Append the stats of the last sync of an account to the metrics file."""
+
+        if self.metrics_file is None or account.calendar is None:
+            return
+        lines = account.calendar.stats.to_json_lines(
+            account=account.email, time=time.time(), ok=ok
+        )
+        try:
+            with self._metrics_lock, open(self.metrics_file, "a") as f:
+                f.write(lines)
+        except OSError:
+            logger.exception(f"Failed to write metrics to {self.metrics_file}")
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+def load_accounts(path: str) -> list[SyncAccount]:
+    """Read the accounts to sync from a JSON file.
+
+    Exceptions
+    ----------
+    ValueError
+        The file is not a list of accounts with an email and password, or an
+        account has an unknown key.
+    """
+
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"Expected a list of accounts in {path}")
+    accounts = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError(f"Expected an object for every account in {path}")
+        if "email" not in entry or "password" not in entry:
+            raise ValueError(f"Account without an email or password in {path}")
+        unknown = sorted(set(entry) - ACCOUNT_KEYS)
+        if unknown:
+            raise ValueError(
+                f"Unknown key {unknown[0]!r} in the account {entry['email']} in "
+                f"{path}, expected some of {sorted(ACCOUNT_KEYS)}"
+            )
+        accounts.append(SyncAccount(**entry))
+    return accounts
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Periodically sync Gradescope accounts to their calendars."
+    )
+    parser.add_argument("accounts", help="JSON file listing the accounts")
+    parser.add_argument(
+        "--interval", type=float, default=INTERVAL, help="seconds between syncs"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=JITTER, help="random fraction of the interval"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="accounts synced at the same time"
+    )
+    parser.add_argument(
+        "--feed-port", type=int, help="serve the feeds of the accounts on this port"
+    )
+    parser.add_argument(
+        "--feed-host", default="127.0.0.1", help="address to serve the feeds on"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="maximum requests per second to Gradescope of all accounts together",
+    )
+    parser.add_argument(
+        "--metrics-file", help="append the stats of every sync to this file"
+    )
+    parser.add_argument(
+        "--log-file", default="gradescopecalendar.log", help="file to log to"
+    )
+    parser.add_argument("--log-level", default="INFO", help="logging level")
+    parser.add_argument(
+        "--remind-before",
+        type=float,
+        nargs="+",
+        default=[offset.total_seconds() / 3600 for offset in OFFSETS],
+        metavar="HOURS",
+        help="hours before an assignment closes to send reminders at",
+    )
+    parser.add_argument(
+        "--remind-stdout", action="store_true", help="print reminders to stdout"
+    )
+    parser.add_argument("--remind-webhook", help="POST reminders as JSON to this URL")
+    parser.add_argument(
+        "--remind-smtp",
+        metavar="HOST[:PORT]",
+        help="email reminders to the accounts through this SMTP server",
+    )
+    parser.add_argument(
+        "--remind-from",
+        default="gradescopecalendar@localhost",
+        help="sender of the reminder emails",
+    )
+    args = parser.parse_args(argv)
+    enable_file_logging(args.log_file, args.log_level.upper())
+
+    feed_server = None
+    if args.feed_port is not None:
+        feed_server = FeedServer(args.feed_host, args.feed_port)
+        feed_server.start()
+    accounts = load_accounts(args.accounts)
+    transport = None
+    if args.rate is not None:
+        # Every account gets its own pool, large enough for its workers
+        pool_size = max(
+            (account.options.get("max_workers", 1) for account in accounts), default=1
+        )
+        transport = GSTransport(
+            pool_size=pool_size, rate_limiter=TokenBucket(args.rate, args.workers)
+        )
+    notifiers = []
+    if args.remind_stdout:
+        notifiers.append(StdoutNotifier())
+    if args.remind_webhook:
+        notifiers.append(WebhookNotifier(args.remind_webhook))
+    if args.remind_smtp:
+        host, _, port = args.remind_smtp.partition(":")
+        notifiers.append(EmailNotifier(host, int(port or 25), sender=args.remind_from))
+    reminders = None
+    if notifiers:
+        reminders = ReminderScheduler(
+            notifiers,
+            offsets=[datetime.timedelta(hours=hours) for hours in args.remind_before],
+        )
+        threading.Thread(target=reminders.run, daemon=True).start()
+    daemon = SyncDaemon(
+        accounts,
+        interval=args.interval,
+        jitter=args.jitter,
+        workers=args.workers,
+        feed_server=feed_server,
+        metrics_file=args.metrics_file,
+        transport=transport,
+        reminders=reminders,
+    )
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    try:
+        daemon.run()
+    finally:
+        if feed_server is not None:
+            feed_server.shutdown()
+        if reminders is not None:
+            reminders.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Address of Gradescope, replaceable to run against a local server
+BASE_URL = "https://www.gradescope.com"
@@ -1,8 +1,22 @@
 from __future__ import annotations
 
+import datetime
+import logging
+from typing import Iterable
+
 import requests
-from bs4 import BeautifulSoup
+from gradescopecalendar.gradescope import BASE_URL
 from gradescopecalendar.gradescope.course import GSCourse
+from gradescopecalendar.gradescope.courselistcache import GSCourseListCache
+from gradescopecalendar.gradescope.pagecache import GSPageCache
+from gradescopecalendar.gradescope.parsers import HTMLParserBackend, get_parser
+from gradescopecalendar.metrics import SyncStats
+
+logger = logging.getLogger(__name__)
+
+# Terms selected by default, only the most recent term on the account page
+ACTIVE_TERM = "active"
+ALL_TERMS = "all"
 
 
 class GSAccount:
@@ -12,53 +26,144 @@ class GSAccount:
     ----------
     session : requests.Session
         the requests library Session object to manage authentication
+    page_cache : GSPageCache
+        cache of the account and course pages, None if disabled
+    course_list_cache : GSCourseListCache
+        cache of the courses listed on the account page, None if disabled
+    parser : HTMLParserBackend
+        backend used to parse the account and course pages
+    current_date : datetime
+        time the courses were last loaded, shared with all assignments
+    base_url : str
+        address of Gradescope
+    stats : SyncStats
+        timings of fetching and parsing the pages
     courses : dict(str : GSCourse)
         dictionary using course ID as key and GSCourse as value
 
     Methods
     -------
-    add_courses_in_account()
-        adds all courses available in user account
+    add_courses_in_account(is_instructor, terms)
+        adds the courses of the selected terms available in user account
     add_course()
     """
 
-    def __init__(self, session: requests.Session):
+    def __init__(
+        self,
+        session: requests.Session,
+        page_cache: GSPageCache = None,
+        parser: HTMLParserBackend = None,
+        base_url: str = BASE_URL,
+        stats: SyncStats = None,
+        course_list_cache: GSCourseListCache = None,
+    ):
         self.session = session
+        self.page_cache = page_cache
+        self.course_list_cache = course_list_cache
+        self.parser = get_parser(parser)
+        self.base_url = base_url
+        self.stats = stats if stats is not None else SyncStats()
         self.courses = {}
+        self.current_date = None
+        # Account page fetched while checking the login, used once if set
+        self._account_page = None
+
+    def add_courses_in_account(
+        self, is_instructor: bool = False, terms: str | Iterable[str] = ACTIVE_TERM
+    ) -> None:
+        """Finds the courses of the selected terms in the account and adds them.
+
+        Parameters
+        ----------
+        is_instructor : bool
+            whether the account is an instructor for any course
+        terms : str or Iterable[str]
+            "active" for the most recent term on the account page, "all" for
+            every term or the names of the terms, such as ``["Fall 2021"]``;
+            courses not listed under a term are always added
+        """
+
+        # One snapshot of the current time for every assignment of this sync
+        self.current_date = datetime.datetime.now().astimezone()
+
+        with self.stats.timer("account_fetch"):
+            courses = self._cached_course_list(is_instructor)
+            if courses is None:
+                # Get account page and parse it
+                url = f"{self.base_url}/account"
+                if self._account_page is not None:
+                    html = self._account_page
+                    courses = self._parse_course_list(html, is_instructor)
+                elif self.page_cache is not None:
+                    courses = self.page_cache.fetch(
+                        self.session,
+                        url,
+                        lambda html: self._parse_course_list(html, is_instructor),
+                        # Course lists cached before terms were parsed lack them
+                        variant=f"{is_instructor}:terms",
+                    )
+                else:
+                    resp = self.session.get(url)
+                    # An error page would parse into an account without courses
+                    resp.raise_for_status()
+                    html = resp.text
+                    courses = self._parse_course_list(html, is_instructor)
+                self._store_course_list(is_instructor, courses)
+        self._add_courses(courses, terms)
+
+    def _cached_course_list(self, is_instructor: bool) -> list[dict]:
+        """Cached course list, None if expired or the account page is known.
+
+        The account page fetched while checking the login is always parsed
+        instead, it is newer than any cached list.
+        """
+
+        if self._account_page is not None:
+            return None
+        if self.course_list_cache is not None:
+            return self.course_list_cache.get(str(is_instructor))
+        return None
+
+    def _store_course_list(self, is_instructor: bool, courses: list[dict]) -> None:
+        """Forget the account page once parsed and cache the course list."""
+
+        self._account_page = None
+        if self.course_list_cache is not None:
+            self.course_list_cache.store(str(is_instructor), courses)
+
+    def _add_courses(self, courses: list[dict], terms: str | Iterable[str]) -> None:
+        """Add the courses of the selected terms."""
 
-    def add_courses_in_account(self, is_instructor: bool = False) -> None:
-        """Finds all courses in the current user account and adds them"""
+        selected = select_terms(courses, terms)
+        skipped = len(courses) - len(selected)
+        if skipped:
+            logger.debug(f"Skipping {skipped} courses of inactive terms")
+        self.stats.count("courses", len(selected), result="selected")
+        self.stats.count("courses", skipped, result="skipped")
+        for course in selected:
+            self.add_course(**course)
 
-        # Get account page and parse it using bs4
-        account_resp = self.session.get("https://www.gradescope.com/account")
-        account_resp_parsed = BeautifulSoup(account_resp.text, "html.parser")
+    def _parse_course_list(self, html: str, is_instructor: bool = False) -> list[dict]:
+        """Parse the details of all courses listed on the account page.
+
+        Parameters
+        ----------
+        html : str
+            content of the account page
+        is_instructor : bool
+            whether the account is an instructor for any course
+
+        Returns
+        -------
+        list[dict]
+            keyword arguments for add_course() of every course
+        """
 
-        # Parameters
-        ACCOUNT_COURSES_CLASS = "pageHeading"
         # TODO:  Add way to add instructor courses to calendar?
         ACCOUNT_COURSES_HEADING = "Student Courses" if is_instructor else "Your Courses"
-        COURSE_CLASS = "courseBox"
-        COURSE_SHORTNAME_CLASS = "courseBox--shortname"
-        COURSE_NAME_CLASS = "courseBox--name"
-
-        courses = account_resp_parsed.find(
-            "h1",
-            class_=ACCOUNT_COURSES_CLASS,
-            string=ACCOUNT_COURSES_HEADING,
-            # text="Student Courses",
-        ).next_sibling
-
-        for course in courses.find_all("a", class_=COURSE_CLASS):
-            short_name = course.find("h3", class_=COURSE_SHORTNAME_CLASS).text
-            name = course.find("div", class_=COURSE_NAME_CLASS).text
-            cid = course.get("href").split("/")[-1]
-
-            year = None
-            for tag in course.parent.previous_siblings:
-                if tag.get("class") == "courseList--term pageSubheading":
-                    year = tag.body
-                    break
-            self.add_course(cid=cid, name=name, short_name=short_name, year=year)
+
+        with self.stats.timer("parse", page="account"):
+            return self.parser.course_list(html, ACCOUNT_COURSES_HEADING)
 
     def add_course(self, cid: str, name: str, short_name: str, year: str) -> None:
         """Creates a GSCourse object and adds it to the courses dictionary.
@@ -72,9 +177,60 @@ class GSAccount:
         shortname : str
             shortname of the course
         year : str
-            year of the course
+            term of the course, such as "Fall 2021"
         """
 
         self.courses[cid] = GSCourse(
-            cid=cid, name=name, short_name=short_name, year=year, session=self.session
+            cid=cid,
+            name=name,
+            short_name=short_name,
+            year=year,
+            session=self.session,
+            page_cache=self.page_cache,
+            parser=self.parser,
+            current_date=self.current_date,
+            base_url=self.base_url,
+            stats=self.stats,
         )
+
+
+def select_terms(
+    courses: list[dict], terms: str | Iterable[str] = ACTIVE_TERM
+) -> list[dict]:
+    """Keep the courses of the selected terms.
+
+    Parameters
+    ----------
+    courses : list[dict]
+        courses in the order of the account page, the most recent term first,
+        with their term as ``year``
+    terms : str or Iterable[str]
+        "active" for the most recent term, "all" for every term or the names
+        of the terms, compared ignoring case and whitespace; courses without a
+        term are always kept
+
+    Returns
+    -------
+    list[dict]
+        the selected courses in their original order
+    """
+
+    if terms is None or terms == ALL_TERMS:
+        return list(courses)
+    if terms == ACTIVE_TERM:
+        wanted = {
+            next((_term_key(c["year"]) for c in courses if c.get("year")), None)
+        }
+    elif isinstance(terms, str):
+        wanted = {_term_key(terms)}
+    else:
+        wanted = {_term_key(term) for term in terms}
+    return [
+        course
+        for course in courses
+        if not course.get("year") or _term_key(course["year"]) in wanted
+    ]
+
+
+def _term_key(term: str) -> str:
+    return " ".join(term.split()).lower()
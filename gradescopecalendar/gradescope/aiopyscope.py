@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import itertools
+import logging
+from http.cookies import SimpleCookie
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+from gradescopecalendar.gradescope import BASE_URL
+from gradescopecalendar.gradescope.account import ACTIVE_TERM, GSAccount
+from gradescopecalendar.gradescope.course import GSCourse
+from gradescopecalendar.gradescope.courselistcache import GSCourseListCache
+from gradescopecalendar.gradescope.pagecache import GSPageCache
+from gradescopecalendar.gradescope.parsers import HTMLParserBackend, get_parser
+from gradescopecalendar.gradescope.pyscope import GSConnection
+from gradescopecalendar.gradescope.sessioncache import GSSessionCache
+from gradescopecalendar.gradescope.transport import (
+    RETRY_METHODS,
+    RETRY_STATUSES,
+    GSTransport,
+)
+from gradescopecalendar.metrics import SyncStats
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGSConnection:
+    """Asyncio counterpart of GSConnection using an aiohttp session.
+
+    The requests of the session are rate limited, retried and timed out
+    following the transport, like the sessions of GSConnection.
+
+    Attributes
+    ----------
+    session : aiohttp.ClientSession
+        the aiohttp ClientSession object to manage authentication
+    account : AsyncGSAccount
+        the account object created after logging into Gradescope
+    stats : SyncStats
+        timings and HTTP counters of the connection
+    transport : GSTransport
+        timeouts, retries, pool size and rate limit of the session
+
+    Methods
+    -------
+    login(email, pwd)
+        login to Gradescope and create the account object
+    close()
+        close the underlying aiohttp session
+    """
+
+    def __init__(
+        self,
+        connector: aiohttp.BaseConnector = None,
+        page_cache: GSPageCache = None,
+        parser: str | HTMLParserBackend = None,
+        base_url: str = BASE_URL,
+        stats: SyncStats = None,
+        course_list_cache: GSCourseListCache = None,
+        transport: GSTransport = None,
+        session_cache: GSSessionCache = None,
+    ) -> None:
+        """Create the aiohttp session for the connection to Gradescope.
+
+        Parameters
+        ----------
+        connector : aiohttp.BaseConnector (optional)
+            connection pool to share between several connections, it is not
+            closed together with this connection
+        page_cache : GSPageCache (optional)
+            cache of the account and course pages
+        parser : str or HTMLParserBackend (optional)
+            backend used to parse the pages, defaults to "html.parser"
+        base_url : str (optional)
+            address of Gradescope
+        stats : SyncStats (optional)
+            collects the timings and HTTP counters of the connection
+        course_list_cache : GSCourseListCache (optional)
+            cache of the courses listed on the account page
+        transport : GSTransport (optional)
+            settings of the session, defaults to GSTransport(), its pool size
+            only applies without a connector
+        session_cache : GSSessionCache (optional)
+            cache of session cookies to reuse instead of logging in again
+        """
+
+        if aiohttp is None:
+            raise ImportError(
+                "aiohttp is required for async support, "
+                "install it with `pip install gradescopecalendar[async]`"
+            )
+        # Every connection keeps its own cookie jar so several accounts can
+        # share one connector without sharing their login
+        self.stats = stats if stats is not None else SyncStats()
+        self.transport = transport if transport is not None else GSTransport()
+        if connector is None:
+            connector = aiohttp.TCPConnector(limit=self.transport.pool_size)
+            connector_owner = True
+        else:
+            connector_owner = False
+        connect, read = (
+            self.transport.timeout
+            if isinstance(self.transport.timeout, tuple)
+            else (self.transport.timeout, self.transport.timeout)
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=connector_owner,
+            # The default jar drops the cookies of IP addresses, such as those
+            # of a local Gradescope, and the login would redirect forever
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            timeout=aiohttp.ClientTimeout(
+                total=None, sock_connect=connect, sock_read=read
+            ),
+            middlewares=(_transport_middleware(self.transport),),
+            trace_configs=[_trace_config(self.stats)],
+        )
+        self.session_cache = session_cache
+        self.page_cache = page_cache
+        self.course_list_cache = course_list_cache
+        self.parser = get_parser(parser)
+        self.base_url = base_url
+        self.account = None
+
+    async def __aenter__(self) -> AsyncGSConnection:
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self.session.close()
+
+    async def login(self, email: str, pwd: str) -> bool:
+        """Login to Gradescope using passed in credentials.
+
+        Parameters
+        ----------
+        email : str
+            the email address of the Gradescope account to login as
+        pwd : str
+            the password for the account
+
+        Exceptions
+        ----------
+        ValueError
+            Invalid credentials for the Gradescope account.
+        aiohttp.ClientResponseError
+            Gradescope could not be reached after retrying.
+        """
+
+        # Reuse the cached session if Gradescope still accepts it
+        if self.session_cache is not None and self._load_cookies(email):
+            with self.stats.timer("session_probe"):
+                account_page = await self._probe_session()
+            if account_page is not None:
+                logger.debug("Reusing cached Gradescope session")
+                self.account = self._new_account()
+                # The probe already fetched the account page
+                self.account._account_page = account_page
+                return True
+            self.session.cookie_jar.clear()
+
+        with self.stats.timer("login"):
+            # Get auth_token
+            async with self.session.get(f"{self.base_url}/") as init_resp:
+                init_resp.raise_for_status()
+                auth_token = self.parser.auth_token(await init_resp.text())
+
+            # Login to Gradescope
+            login_data = {
+                key: str(value)
+                for key, value in GSConnection._login_data(
+                    email, pwd, auth_token
+                ).items()
+            }
+            async with self.session.post(
+                f"{self.base_url}/login", params=login_data
+            ) as login_resp:
+                history = login_resp.history
+
+        # Verify login status
+        if len(history) != 0 and history[0].status == 302:
+            self.account = self._new_account()
+            if self.session_cache is not None:
+                self._save_cookies(email)
+            return True
+        raise ValueError("Invalid credentials.")
+
+    async def _probe_session(self) -> str:
+        """Check whether the cookies of the session are still logged in.
+
+        Returns
+        -------
+        str
+            the account page if the session is logged in, otherwise None
+        """
+
+        async with self.session.get(
+            f"{self.base_url}/account", allow_redirects=False
+        ) as probe_resp:
+            if probe_resp.status == 200:
+                return await probe_resp.text()
+            # An outage is not an expired session, logging in again would fail too
+            if probe_resp.status >= 500 or probe_resp.status == 429:
+                probe_resp.raise_for_status()
+        logger.debug("Gradescope session has expired")
+        return None
+
+    def _load_cookies(self, email: str) -> bool:
+        """Add the cached cookies of Gradescope to the cookie jar.
+
+        Returns
+        -------
+        bool
+            whether any cookies were found for the account
+        """
+
+        url = URL(self.base_url)
+        cookies = [
+            cookie
+            for cookie in self.session_cache.cookies(email)
+            if cookie["domain"].lstrip(".") in ("", url.host)
+        ]
+        for cookie in cookies:
+            morsel = SimpleCookie()
+            morsel[cookie["name"]] = cookie["value"]
+            morsel[cookie["name"]]["path"] = cookie["path"] or "/"
+            self.session.cookie_jar.update_cookies(morsel, url)
+        logger.debug(f"Loaded {len(cookies)} cached cookies")
+        return len(cookies) != 0
+
+    def _save_cookies(self, email: str) -> None:
+        """Write the cookies of the session to the session cache."""
+
+        host = URL(self.base_url).host
+        self.session_cache.save_cookies(
+            email,
+            [
+                {
+                    "name": morsel.key,
+                    "value": morsel.value,
+                    "domain": morsel["domain"] or host,
+                    "path": morsel["path"] or "/",
+                    "secure": bool(morsel["secure"]),
+                    "expires": None,
+                    "rest": {},
+                }
+                for morsel in self.session.cookie_jar
+            ],
+        )
+
+    def _new_account(self) -> AsyncGSAccount:
+        return AsyncGSAccount(
+            self.session,
+            self.page_cache,
+            self.parser,
+            self.base_url,
+            self.stats,
+            self.course_list_cache,
+        )
+
+
+class AsyncGSAccount(GSAccount):
+    """Asyncio counterpart of GSAccount which creates AsyncGSCourse objects."""
+
+    async def add_courses_in_account(
+        self, is_instructor: bool = False, terms=ACTIVE_TERM
+    ) -> None:
+        """Finds the courses of the selected terms in the account and adds them."""
+
+        self.current_date = datetime.datetime.now().astimezone()
+
+        with self.stats.timer("account_fetch"):
+            courses = self._cached_course_list(is_instructor)
+            if courses is None and self._account_page is not None:
+                courses = self._parse_course_list(self._account_page, is_instructor)
+                self._store_course_list(is_instructor, courses)
+            elif courses is None:
+                courses = await _fetch(
+                    self.session,
+                    self.page_cache,
+                    f"{self.base_url}/account",
+                    lambda html: self._parse_course_list(html, is_instructor),
+                    variant=f"{is_instructor}:terms",
+                )
+                self._store_course_list(is_instructor, courses)
+        self._add_courses(courses, terms)
+
+    def add_course(self, cid: str, name: str, short_name: str, year: str) -> None:
+        self.courses[cid] = AsyncGSCourse(
+            cid=cid,
+            name=name,
+            short_name=short_name,
+            year=year,
+            session=self.session,
+            page_cache=self.page_cache,
+            parser=self.parser,
+            current_date=self.current_date,
+            base_url=self.base_url,
+            stats=self.stats,
+        )
+
+
+class AsyncGSCourse(GSCourse):
+    """Asyncio counterpart of GSCourse."""
+
+    async def _load_assignments(self) -> None:
+        """Load the assignments available from the course."""
+
+        with self.stats.timer("course_fetch", course=self.cid):
+            rows = await _fetch(
+                self.session,
+                self.page_cache,
+                f"{self.base_url}/courses/{self.cid}/",
+                self._parse_assignment_rows,
+            )
+        self._add_assignments(rows)
+
+    async def _load_details(self, assignment) -> dict:
+        """Fetch the questions and regrade status of an assignment."""
+
+        with self.stats.timer("detail_fetch", course=self.cid):
+            async with self.session.get(assignment.url) as resp:
+                if resp.status != 200:
+                    logger.warning(
+                        f"Could not fetch details of {assignment.name}: {resp.status}"
+                    )
+                    return None
+                html = await resp.text(errors="replace")
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._parse_details, html
+            )
+
+
+def _transport_middleware(transport: GSTransport):
+    """aiohttp middleware applying the rate limit and retries of a transport.
+
+    Idempotent requests are retried like urllib3 does for the sessions of the
+    transport, after connection errors and RETRY_STATUSES responses, waiting
+    for Retry-After or the exponential backoff and then for the rate limit.
+    """
+
+    async def middleware(request, handler):
+        retries = transport.retries if request.method in RETRY_METHODS else 0
+        for retry in itertools.count():
+            if transport.rate_limiter is not None:
+                waited = await transport.rate_limiter.acquire_async()
+                if waited:
+                    logger.debug(f"Rate limited request for {waited:.2f}s")
+            delay = transport.backoff * 2**retry
+            try:
+                response = await handler(request)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if retry >= retries:
+                    raise
+            else:
+                if response.status not in RETRY_STATUSES or retry >= retries:
+                    return response
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = float(retry_after)
+                response.release()
+            logger.debug(f"Retrying {request.method} {request.url} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    return middleware
+
+
+def _trace_config(stats: SyncStats) -> aiohttp.TraceConfig:
+    """Count the requests of an aiohttp session and the bytes received."""
+
+    async def on_request_end(session, context, params) -> None:
+        stats.count(
+            "http_requests", host=params.url.raw_authority, status=params.response.status
+        )
+
+    async def on_response_chunk_received(session, context, params) -> None:
+        stats.count("http_bytes", len(params.chunk), host=params.url.raw_authority)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_redirect.append(on_request_end)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    return trace_config
+
+
+async def _fetch(
+    session: aiohttp.ClientSession,
+    page_cache: GSPageCache,
+    url: str,
+    parse,
+    variant: str = "",
+):
+    """Get the parsed data of a page, reusing the page cache if possible."""
+
+    headers = page_cache.request_headers(url, variant) if page_cache else {}
+    async with session.get(url, headers=headers) as resp:
+        content = await resp.read()
+        status = resp.status
+        resp_headers = resp.headers
+        encoding = resp.get_encoding()
+
+    if page_cache is not None:
+        valid, data = page_cache.lookup(url, status, content, variant)
+        if valid:
+            return data
+
+    # Error pages parse into an empty page and must not replace the data
+    if status != 200:
+        raise aiohttp.ClientResponseError(
+            resp.request_info,
+            resp.history,
+            status=status,
+            message=f"Could not fetch {url}",
+        )
+    # Parsing is CPU bound, keep it off the event loop
+    data = await asyncio.get_running_loop().run_in_executor(
+        None, parse, content.decode(encoding, errors="replace")
+    )
+    if page_cache is not None:
+        page_cache.store(url, resp_headers, content, data, variant)
+    return data
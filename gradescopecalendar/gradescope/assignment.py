@@ -1,6 +1,17 @@
 from __future__ import annotations
 
 import datetime
+from functools import lru_cache
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+INVALID_ASSIGNMENT_ID = "0000000"
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(date: str) -> datetime.datetime:
+    """Parse a Gradescope date, shared between assignments with the same date."""
+
+    return datetime.datetime.strptime(date, DATE_FORMAT)
 
 
 class GSAssignment:
@@ -17,10 +28,18 @@ class GSAssignment:
         course object assignment is attached to
     status : str
         status of the assignment: submitted, submitted-late, no-submission, open, open-late
-    open_date : str
-        open date of the assignment
-    close_date : str
-        close date of the assignment
+    open_date : datetime
+        open date of the assignment, parsed on first access
+    close_date : datetime
+        close date of the assignment, parsed on first access
+    current_date : datetime
+        time the assignment was loaded, shared by all assignments of a sync
+    time_left : timedelta
+        time between current_date and close_date
+    key : tuple (str, str)
+        course ID and assignment ID, or the name for assignments without an ID
+    uid : str
+        stable identity of the assignment made of the course and assignment ID
     points : tuple (float, float)
         tuple of points earned and total points
     regrades_on : bool
@@ -29,6 +48,22 @@ class GSAssignment:
         list of questions in the assignment
     """
 
+    # Tens of thousands of assignments can be loaded at once, so avoid a
+    # __dict__ per object
+    __slots__ = (
+        "name",
+        "aid",
+        "course",
+        "status",
+        "_open_date",
+        "_close_date",
+        "_current_date",
+        "url",
+        "points",
+        "regrades_on",
+        "questions",
+    )
+
     def __init__(
         self,
         name: str,
@@ -41,24 +76,72 @@ class GSAssignment:
         points: tuple[float, float] = (0, 0),
         regrades_on: bool = False,
         questions: list[str] = None,
+        current_date: datetime.datetime = None,
     ):
-        """Create a GSAssignment object"""
+        """Create a GSAssignment object
+
+        Dates are kept as strings until they are first used.
+
+        Parameters
+        ----------
+        current_date : datetime (optional)
+            snapshot of the current time, defaults to the time of first use
+        """
         self.name = name
         self.aid = aid
         self.course = course
         self.status = status
-        self.open_date = datetime.datetime.strptime(open_date, "%Y-%m-%d %H:%M:%S %z")
-        self.close_date = datetime.datetime.strptime(close_date, "%Y-%m-%d %H:%M:%S %z")
-        self.current_date = datetime.datetime.now().astimezone()
+        self._open_date = open_date
+        self._close_date = close_date
+        self._current_date = current_date
         self.url = url
-        self.time_left = (
+        self.points = points
+        self.regrades_on = regrades_on
+        self.questions = questions
+
+    @property
+    def open_date(self) -> datetime.datetime:
+        if isinstance(self._open_date, str):
+            self._open_date = _parse_date(self._open_date)
+        return self._open_date
+
+    @open_date.setter
+    def open_date(self, value: str | datetime.datetime) -> None:
+        self._open_date = value
+
+    @property
+    def close_date(self) -> datetime.datetime:
+        if isinstance(self._close_date, str):
+            self._close_date = _parse_date(self._close_date)
+        return self._close_date
+
+    @close_date.setter
+    def close_date(self, value: str | datetime.datetime) -> None:
+        self._close_date = value
+
+    @property
+    def current_date(self) -> datetime.datetime:
+        if self._current_date is None:
+            self._current_date = datetime.datetime.now().astimezone()
+        return self._current_date
+
+    @property
+    def time_left(self) -> datetime.timedelta:
+        return (
             datetime.timedelta(0)
             if self.close_date < self.current_date
             else self.current_date - self.close_date
         )
-        self.points = points
-        self.regrades_on = regrades_on
-        self.questions = questions
+
+    @property
+    def key(self) -> tuple[str, str]:
+        # Assignments without an ID fall back to their name
+        aid = self.aid if self.aid != INVALID_ASSIGNMENT_ID else self.name
+        return (self.course.cid, aid)
+
+    @property
+    def uid(self) -> str:
+        return "-".join(self.key)
 
     def __str__(self):
         return f"[#Assignment# {self.name} ({self.aid}) Course: {self.course.name} \t| Points: {self.points} \t {self.status}]"
@@ -1,9 +1,22 @@
 from __future__ import annotations
 
+import datetime
+import logging
 import requests
 import re
-from bs4 import BeautifulSoup
-from gradescopecalendar.gradescope.assignment import GSAssignment
+from typing import Iterator
+
+from gradescopecalendar.gradescope import BASE_URL
+from gradescopecalendar.gradescope.assignment import GSAssignment, INVALID_ASSIGNMENT_ID
+from gradescopecalendar.gradescope.pagecache import GSPageCache
+from gradescopecalendar.gradescope.parsers import (
+    HTMLParserBackend,
+    get_parser,
+    iter_assignment_rows,
+)
+from gradescopecalendar.metrics import SyncStats
+
+logger = logging.getLogger(__name__)
 
 
 class GSCourse:
@@ -18,15 +31,36 @@ class GSCourse:
     cid : str
         6-digit course id of the course
     year : str
-        the year of the course
+        the term of the course, such as "Fall 2021", None if unknown
     session : requests.Session
         the requests library Session object to manage authentication
+    page_cache : GSPageCache
+        cache of the course page, None if disabled
+    parser : HTMLParserBackend
+        backend used to parse the course page
+    current_date : datetime
+        snapshot of the current time shared with the assignments
+    base_url : str
+        address of Gradescope
+    stats : SyncStats
+        timings of fetching and parsing the course page
     assignments : dict
-        the available assignments in the course
+        the available assignments in the course by assignment ID, or by name
+        for assignments without an ID
     """
 
     def __init__(
-        self, name: str, short_name: str, cid: str, year: str, session: requests.Session
+        self,
+        name: str,
+        short_name: str,
+        cid: str,
+        year: str,
+        session: requests.Session,
+        page_cache: GSPageCache = None,
+        parser: HTMLParserBackend = None,
+        current_date: datetime.datetime = None,
+        base_url: str = BASE_URL,
+        stats: SyncStats = None,
     ) -> None:
         """Create a course object that has lazy eval'd assignments"""
         self.name = name
@@ -34,70 +68,195 @@ class GSCourse:
         self.cid = cid
         self.year = year
         self.session = session
+        self.page_cache = page_cache
+        self.parser = get_parser(parser)
+        self.current_date = current_date
+        self.base_url = base_url
+        self.stats = stats if stats is not None else SyncStats()
         self.assignments = {}
         # self._load_assignments()
 
     def __str__(self) -> None:
         return f"[#Course# {self.short_name} ({self.cid}) {self.name} ]"
 
-    def _load_assignments(self) -> None:
-        """Load the assignments available from the course."""
+    def _load_assignments(self, session: requests.Session = None) -> None:
+        """Load the assignments available from the course.
 
-        EPOCHTIME = "1970-01-01 00:00:00 +0000"
-        INVALID_ASSIGNMENT_ID = "0000000"
-
-        assignment_resp = self.session.get(
-            f"https://www.gradescope.com/courses/{self.cid}/"
-        )
-        parsed_assignment_resp = BeautifulSoup(assignment_resp.text, "html.parser")
-
-        assignment_table = []
-        for assignment_row in parsed_assignment_resp.findAll("tr", role="row")[
-            1:
-        ]:  # Skip header row
-            row = []
-            for th in assignment_row.findAll("th"):
-                row.append(th)
-            for td in assignment_row.findAll("td"):
-                row.append(td)
-            assignment_table.append(row)
-
-        for row in assignment_table:
-            name = row[0].text
-            try:  # Assignment ID not guaranteed to be available
-                aid = re.search(
-                    r"/.*/assignments/(.+?)/", row[0].find("a").get("href")
-                ).group(1)
-            except (IndexError, AttributeError):
-                aid = INVALID_ASSIGNMENT_ID
-            try:  # Points not guaranteed
-                points = row[1].text.split(" / ")
-                points_earned = float(points[0])
-                points_total = float(points[1])
-                status = "Submitted"
-            except (IndexError, ValueError):
-                points_earned = -1
-                points_total = -1
-                status = row[1].text
-            try:  # Open and close date not guaranteed to be available
-                open_date = row[3].text if row[3].text != "" else EPOCHTIME
-                close_date = row[4].text if row[4].text != "" else EPOCHTIME
-            except IndexError:
-                open_date = EPOCHTIME
-                close_date = EPOCHTIME
-            # TODO: Determine location of regrade flag
-            regrades_on = False
-
-            self.assignments[name] = GSAssignment(
-                name=name,
-                aid=aid,
+        Parameters
+        ----------
+        session : requests.Session (optional)
+            session to make the request with, defaults to the course session
+        """
+
+        session = session or self.session
+        url = f"{self.base_url}/courses/{self.cid}/"
+        with self.stats.timer("course_fetch", course=self.cid):
+            if self.page_cache is not None:
+                rows = self.page_cache.fetch(session, url, self._parse_assignment_rows)
+            else:
+                resp = session.get(url)
+                # An error page would parse into a course without assignments
+                resp.raise_for_status()
+                rows = self._parse_assignment_rows(resp.text)
+        self._add_assignments(rows)
+
+    def _load_details(
+        self, assignment: GSAssignment, session: requests.Session = None
+    ) -> dict:
+        """Fetch the questions and regrade status of an assignment.
+
+        Parameters
+        ----------
+        assignment : GSAssignment
+            assignment of this course with a URL
+        session : requests.Session (optional)
+            session to make the request with, defaults to the course session
+
+        Returns
+        -------
+        dict
+            the details returned by HTMLParserBackend.assignment_details(), None
+            if the page could not be fetched
+        """
+
+        session = session or self.session
+        with self.stats.timer("detail_fetch", course=self.cid):
+            resp = session.get(assignment.url)
+            if resp.status_code != requests.codes.ok:
+                logger.warning(
+                    f"Could not fetch details of {assignment.name}: {resp.status_code}"
+                )
+                return None
+            return self._parse_details(resp.text)
+
+    def _parse_details(self, html: str) -> dict:
+        with self.stats.timer("parse", page="assignment", course=self.cid):
+            return self.parser.assignment_details(html)
+
+    def iter_assignments(
+        self, session: requests.Session = None, chunk_size: int = 16384
+    ) -> Iterator[GSAssignment]:
+        """Yield the assignments of the course while the page is downloading.
+
+        The course page is parsed incrementally so the first assignments are
+        available before the whole page has arrived and the page is never held
+        in memory as a whole. Assignments are also added to ``assignments``.
+        The page cache is not used in this mode.
+
+        Parameters
+        ----------
+        session : requests.Session (optional)
+            session to make the request with, defaults to the course session
+        chunk_size : int
+            number of bytes to read from the response at a time
+        """
+
+        session = session or self.session
+        with session.get(
+            f"{self.base_url}/courses/{self.cid}/", stream=True
+        ) as assignment_resp:
+            assignment_resp.raise_for_status()
+            if assignment_resp.encoding is None:
+                assignment_resp.encoding = "utf-8"
+            chunks = assignment_resp.iter_content(
+                chunk_size=chunk_size, decode_unicode=True
+            )
+            rows = iter_assignment_rows(chunks)
+            next(rows, None)  # Skip header row
+            for row in rows:
+                details = self._assignment_details(row)
+                assignment = GSAssignment(
+                    course=self, current_date=self.current_date, **details
+                )
+                self.assignments[assignment.key[1]] = assignment
+                yield assignment
+
+    def _add_assignments(self, rows: list[dict]) -> None:
+        """Create a GSAssignment object for every parsed assignment row.
+
+        Parameters
+        ----------
+        rows : list[dict]
+            assignment details returned by _parse_assignment_rows()
+        """
+
+        for row in rows:
+            assignment = GSAssignment(
                 course=self,
-                status=status,
-                open_date=open_date,
-                close_date=close_date,
-                points=(points_earned, points_total),
-                regrades_on=regrades_on,
-                url=f"https://www.gradescope.com/courses/{self.cid}/assignments/{aid}/"
-                if aid != INVALID_ASSIGNMENT_ID
-                else "",
+                current_date=self.current_date,
+                **dict(row, points=tuple(row["points"])),
             )
+            self.assignments[assignment.key[1]] = assignment
+
+    def _parse_assignment_rows(self, html: str) -> list[dict]:
+        """Parse the details of all assignments listed on the course page.
+
+        Parameters
+        ----------
+        html : str
+            content of the course page
+
+        Returns
+        -------
+        list[dict]
+            keyword arguments for GSAssignment of every assignment, without the
+            course so the result can be cached
+        """
+
+        with self.stats.timer("parse", page="course", course=self.cid):
+            # Each row is a list of (text, href) tuples for the th then td cells
+            assignment_table = self.parser.assignment_rows(html)[1:]  # Skip header row
+            return [self._assignment_details(row) for row in assignment_table]
+
+    def _assignment_details(self, row: list[tuple[str, str]]) -> dict:
+        """Get the details of an assignment from a row of the assignment table.
+
+        Parameters
+        ----------
+        row : list[tuple[str, str]]
+            (text, href) tuples of the th then td cells of the row
+
+        Returns
+        -------
+        dict
+            keyword arguments for GSAssignment without the course
+        """
+
+        EPOCHTIME = "1970-01-01 00:00:00 +0000"
+
+        name = row[0][0]
+        try:  # Assignment ID not guaranteed to be available
+            aid = re.search(r"/.*/assignments/(.+?)/", row[0][1]).group(1)
+        except (IndexError, AttributeError, TypeError):
+            aid = INVALID_ASSIGNMENT_ID
+        try:  # Points not guaranteed
+            points = row[1][0].split(" / ")
+            points_earned = float(points[0])
+            points_total = float(points[1])
+            status = "Submitted"
+        except (IndexError, ValueError):
+            points_earned = -1
+            points_total = -1
+            status = row[1][0]
+        try:  # Open and close date not guaranteed to be available
+            open_date = row[3][0] if row[3][0] != "" else EPOCHTIME
+            close_date = row[4][0] if row[4][0] != "" else EPOCHTIME
+        except IndexError:
+            open_date = EPOCHTIME
+            close_date = EPOCHTIME
+        # The course page does not show it, the detail stage reads it from the
+        # assignment page
+        regrades_on = False
+
+        return {
+            "name": name,
+            "aid": aid,
+            "status": status,
+            "open_date": open_date,
+            "close_date": close_date,
+            "points": (points_earned, points_total),
+            "regrades_on": regrades_on,
+            "url": f"{self.base_url}/courses/{self.cid}/assignments/{aid}/"
+            if aid != INVALID_ASSIGNMENT_ID
+            else "",
+        }
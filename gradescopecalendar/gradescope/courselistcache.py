@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import logging
+import time
+
+from gradescopecalendar.gradescope.filecache import GSFileCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds the course list of an account is reused before fetching the account
+# page again, courses are rarely added in the middle of a term
+COURSE_LIST_TTL = 12 * 60 * 60
+
+
+class GSCourseListCache(GSFileCache):
+    """On-disk cache of the courses listed on the account page.
+
+    The courses of every term are stored, so the account page is not fetched
+    while the list is younger than the TTL whichever terms are synced.
+
+    Attributes
+    ----------
+    path : Path
+        directory the course lists are stored in
+    namespace : str
+        key separating the course lists of different accounts
+    ttl : float
+        seconds a course list is valid for
+
+    Methods
+    -------
+    get(variant)
+        returns the cached course list, None if missing or expired
+    store(variant, courses)
+        saves a course list
+    prune()
+        deletes the expired course lists
+    """
+
+    directory = "courses"
+
+    def __init__(
+        self,
+        path: str = None,
+        namespace: str = "",
+        ttl: float = COURSE_LIST_TTL,
+        clock=time.time,
+    ) -> None:
+        """Create the cache directory if it does not exist.
+
+        Parameters
+        ----------
+        path : str (optional)
+            directory to store the course lists in, defaults to
+            ``~/.cache/gradescopecalendar/courses``
+        namespace : str
+            key separating the course lists of different accounts, usually
+            the email
+        ttl : float
+            seconds a course list is valid for
+        clock : Callable[[], float]
+            wall clock time function, replaceable for testing
+        """
+
+        super().__init__(path, namespace, ttl, clock)
+
+    def get(self, variant: str = "") -> list[dict]:
+        """Get the cached course list.
+
+        Parameters
+        ----------
+        variant : str
+            key of the list among the lists of the account, such as the
+            heading it was parsed from
+
+        Returns
+        -------
+        list[dict]
+            keyword arguments for GSAccount.add_course() of every course, None
+            if the list is missing or expired
+        """
+
+        entry = self._load(variant)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            logger.debug("Cached course list expired")
+            return None
+        logger.debug(f"Reusing course list cached {self._age(entry):.0f}s ago")
+        return entry["courses"]
+
+    def store(self, variant: str, courses: list[dict]) -> None:
+        self._save(variant, {"fetched": self._clock(), "courses": courses})
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+
+from gradescopecalendar.gradescope.filecache import GSFileCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds the details of an unchanged assignment are kept before fetching them
+# again, regrade windows open and close without the summary row changing
+DETAILS_TTL = 24 * 60 * 60
+
+
+class GSDetailCache(GSFileCache):
+    """On-disk cache of the details fetched from assignment pages.
+
+    Every entry stores the details of one assignment together with a hash of
+    its row on the course page. The details are reused while that row is
+    unchanged and the entry is younger than the TTL, so only new, changed or
+    expired assignments have their page fetched.
+
+    Attributes
+    ----------
+    path : Path
+        directory the details are stored in
+    namespace : str
+        key separating the assignments of different accounts
+    ttl : float
+        seconds an entry is valid for
+
+    Methods
+    -------
+    get(assignment)
+        returns the cached details of an assignment, None if stale
+    store(assignment, details)
+        saves the details of an assignment
+    prune()
+        deletes the expired entries
+    """
+
+    directory = "details"
+
+    def __init__(
+        self,
+        path: str = None,
+        namespace: str = "",
+        ttl: float = DETAILS_TTL,
+        clock=time.time,
+    ) -> None:
+        """Create the cache directory if it does not exist.
+
+        Parameters
+        ----------
+        path : str (optional)
+            directory to store the details in, defaults to
+            ``~/.cache/gradescopecalendar/details``
+        namespace : str
+            key separating the assignments of different accounts, usually the
+            email
+        ttl : float
+            seconds an entry is valid for
+        clock : Callable[[], float]
+            wall clock time function, replaceable for testing
+        """
+
+        super().__init__(path, namespace, ttl, clock)
+
+    def get(self, assignment) -> dict:
+        """Get the cached details of an assignment.
+
+        Returns
+        -------
+        dict
+            the details, None if they are missing, expired or the assignment
+            row changed since they were fetched
+        """
+
+        entry = self._load(assignment.uid)
+        if entry is None:
+            return None
+        if entry.get("row") != _row_hash(assignment):
+            logger.debug(f"Assignment changed since fetching details: {assignment.uid}")
+            return None
+        if self._expired(entry):
+            return None
+        return entry["details"]
+
+    def store(self, assignment, details: dict) -> None:
+        entry = {
+            "row": _row_hash(assignment),
+            "fetched": self._clock(),
+            "details": details,
+        }
+        self._save(assignment.uid, entry)
+
+
+def _row_hash(assignment) -> str:
+    """Hash of what the course page shows about an assignment."""
+
+    row = [
+        assignment.name,
+        assignment.status,
+        str(assignment.open_date),
+        str(assignment.close_date),
+        list(assignment.points),
+        assignment.url,
+    ]
+    return hashlib.sha256(json.dumps(row).encode()).hexdigest()
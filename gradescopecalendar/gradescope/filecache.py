@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+
+from gradescopecalendar.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class GSFileCache:
+    """Base class of the on-disk caches, storing one JSON entry per file.
+
+    Files are named after a hash of the namespace and the key of the entry, so
+    the names do not reveal the accounts or pages, and are written atomically
+    with owner read/write permissions only. Entries stamped with the time
+    they were fetched expire after the TTL.
+
+    Attributes
+    ----------
+    path : Path
+        directory the entries are stored in
+    namespace : str
+        key separating the entries of different accounts
+    ttl : float
+        seconds an entry is valid for, None if entries do not expire
+
+    Methods
+    -------
+    prune()
+        deletes the expired entries
+    """
+
+    # Directory under ~/.cache/gradescopecalendar used when no path is given
+    directory = None
+
+    def __init__(
+        self,
+        path: str = None,
+        namespace: str = "",
+        ttl: float = None,
+        clock=time.time,
+    ) -> None:
+        """Create the cache directory if it does not exist.
+
+        Parameters
+        ----------
+        path : str (optional)
+            directory to store the entries in, defaults to the directory of
+            the cache under ``~/.cache/gradescopecalendar``
+        namespace : str
+            key separating the entries of different accounts, usually the
+            email
+        ttl : float (optional)
+            seconds an entry is valid for, None if entries do not expire
+        clock : Callable[[], float]
+            wall clock time function, replaceable for testing
+        """
+
+        if not path:
+            path = Path.home() / ".cache" / "gradescopecalendar" / self.directory
+        self.path = Path(path)
+        self.path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.namespace = namespace.strip().lower()
+        self.ttl = ttl
+        self._clock = clock
+
+    def _file(self, key: str) -> Path:
+        digest = hashlib.sha256(f"{self.namespace}\n{key}".encode()).hexdigest()
+        return self.path / f"{digest}.json"
+
+    def _load(self, key: str):
+        """The entry of a key, None if it is missing or corrupt."""
+
+        try:
+            with open(self._file(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, key: str, entry) -> None:
+        atomic_write(self._file(key), json.dumps(entry).encode())
+
+    def _age(self, entry: dict) -> float:
+        """Seconds since an entry was fetched."""
+
+        return self._clock() - entry.get("fetched", 0)
+
+    def _expired(self, entry: dict) -> bool:
+        return self.ttl is not None and self._age(entry) > self.ttl
+
+    def prune(self) -> int:
+        """Delete the entries older than the TTL, of every account.
+
+        Returns
+        -------
+        int
+            number of deleted entries
+        """
+
+        if self.ttl is None:
+            return 0
+        deleted = 0
+        cutoff = self._clock() - self.ttl
+        for file in self.path.glob("*.json"):
+            try:
+                if file.stat().st_mtime < cutoff:
+                    file.unlink()
+                    deleted += 1
+            except OSError:
+                continue
+        if deleted:
+            logger.debug(f"Deleted {deleted} expired entries of {self.path}")
+        return deleted
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import Any, Callable
+
+import requests
+from gradescopecalendar.gradescope.filecache import GSFileCache
+
+logger = logging.getLogger(__name__)
+
+
+class GSPageCache(GSFileCache):
+    """On-disk cache of Gradescope pages and the data parsed from them.
+
+    For every URL the ETag, Last-Modified header and a hash of the page are
+    stored together with the parsed result. Later requests are made conditional
+    and the parsed result is reused without parsing the page again when the
+    server answers 304 Not Modified or the page content is unchanged.
+
+    Attributes
+    ----------
+    path : Path
+        directory the cached pages are stored in
+    namespace : str
+        key separating the pages of different accounts
+
+    Methods
+    -------
+    fetch(session, url, parse)
+        gets the parsed data of a page, reusing the cache when unchanged
+    """
+
+    directory = "pages"
+
+    def __init__(self, path: str = None, namespace: str = "") -> None:
+        """Create the cache directory if it does not exist.
+
+        Parameters
+        ----------
+        path : str (optional)
+            directory to store the pages in, defaults to
+            ``~/.cache/gradescopecalendar/pages``
+        namespace : str
+            key separating the pages of different accounts, usually the email
+        """
+
+        # Pages are revalidated with the server instead of expiring
+        super().__init__(path, namespace)
+
+    def request_headers(self, url: str, variant: str = "") -> dict:
+        """Conditional request headers for the cached version of the page."""
+
+        entry = self._load(_key(url, variant))
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def lookup(
+        self, url: str, status: int, content: bytes, variant: str = ""
+    ) -> tuple[bool, Any]:
+        """Find the cached data of a page for a response.
+
+        Parameters
+        ----------
+        url : str
+            URL of the page
+        status : int
+            HTTP status code of the response
+        content : bytes
+            body of the response
+
+        Returns
+        -------
+        tuple (bool, Any)
+            whether the cached data is still valid and the cached data
+        """
+
+        entry = self._load(_key(url, variant))
+        if entry is None:
+            return False, None
+        if status == requests.codes.not_modified:
+            logger.debug(f"Page not modified: {url}")
+            return True, entry["data"]
+        if status == requests.codes.ok and entry["hash"] == _hash(content):
+            logger.debug(f"Page content unchanged: {url}")
+            return True, entry["data"]
+        return False, None
+
+    def store(
+        self, url: str, headers: dict, content: bytes, data: Any, variant: str = ""
+    ) -> None:
+        """Save the parsed data of a page together with its validators."""
+
+        entry = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "hash": _hash(content),
+            "data": data,
+        }
+        self._save(_key(url, variant), entry)
+
+    def fetch(
+        self,
+        session: requests.Session,
+        url: str,
+        parse: Callable[[str], Any],
+        variant: str = "",
+    ) -> Any:
+        """Get the parsed data of a page, parsing it only if it has changed.
+
+        Parameters
+        ----------
+        session : requests.Session
+            the session to make the request with
+        url : str
+            URL of the page
+        parse : Callable[[str], Any]
+            function returning JSON serializable data from the page HTML
+        variant : str
+            additional key for pages parsed in more than one way
+
+        Returns
+        -------
+        Any
+            the result of parse() for the current version of the page
+
+        Exceptions
+        ----------
+        requests.HTTPError
+            The page could not be fetched, or was not modified but is missing
+            from the cache.
+        """
+
+        resp = session.get(url, headers=self.request_headers(url, variant))
+        valid, data = self.lookup(url, resp.status_code, resp.content, variant)
+        if valid:
+            return data
+
+        # Error pages parse into an empty page and must not replace the data
+        if resp.status_code != requests.codes.ok:
+            raise requests.HTTPError(
+                f"Could not fetch {url}: {resp.status_code}", response=resp
+            )
+        data = parse(resp.text)
+        self.store(url, resp.headers, resp.content, data, variant)
+        return data
+
+
+def _key(url: str, variant: str) -> str:
+    return f"{url}\n{variant}"
+
+
+def _hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+import json
+from abc import ABC, abstractmethod
+from html.parser import HTMLParser
+from typing import Iterable, Iterator
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+ACCOUNT_COURSES_CLASS = "pageHeading"
+COURSE_CLASS = "courseBox"
+COURSE_SHORTNAME_CLASS = "courseBox--shortname"
+COURSE_NAME_CLASS = "courseBox--name"
+# Heading of the term of the courses listed after it, such as "Fall 2021"
+COURSE_TERM_CLASS = "courseList--term"
+# Attribute holding the JSON properties of the React components of a page
+REACT_PROPS_ATTR = "data-react-props"
+
+
+class HTMLParserBackend(ABC):
+    """Base class of the HTML parsing backends.
+
+    Every backend extracts the same plain data from the Gradescope pages so
+    the rest of the package does not depend on a specific HTML library. A
+    backend missing one of the abstract methods fails when it is created.
+
+    Methods
+    -------
+    auth_token(html)
+        returns the authenticity token of the login form on the homepage
+    course_list(html, heading)
+        returns the courses listed under a heading of the account page, with
+        the term they are listed under as ``year``
+    assignment_rows(html)
+        returns the cells of every row of the assignment table as
+        (text, href) tuples, href is the first link in the cell
+    assignment_details(html)
+        returns the questions and regrade status of an assignment page
+    """
+
+    name = None
+
+    @abstractmethod
+    def auth_token(self, html: str) -> str:
+        ...
+
+    @abstractmethod
+    def course_list(self, html: str, heading: str) -> list[dict]:
+        ...
+
+    @abstractmethod
+    def assignment_rows(self, html: str) -> list[list[tuple[str, str]]]:
+        ...
+
+    def assignment_details(self, html: str) -> dict:
+        """Get the questions and regrade status from an assignment page.
+
+        Assignment pages render the submission with React, so the details are
+        read from the JSON properties of its components instead of the markup.
+        The properties are small compared to the page, which is only scanned
+        for them by the standard library parser in every backend.
+
+        Returns
+        -------
+        dict
+            ``questions``, the question titles or None if the page lists none,
+            and ``regrades_on``, whether regrade requests are open
+        """
+
+        scanner = ReactPropsScanner()
+        scanner.feed(html)
+        scanner.close()
+
+        questions = None
+        regrades_on = False
+        for props in scanner.props:
+            if isinstance(props.get("questions"), list):
+                questions = [
+                    str(question.get("title") or question.get("full_index") or "")
+                    for question in props["questions"]
+                    if isinstance(question, dict)
+                ]
+            assignment = props.get("assignment")
+            if isinstance(assignment, dict) and assignment.get(
+                "regrade_requests_open"
+            ):
+                regrades_on = True
+        return {"questions": questions, "regrades_on": regrades_on}
+
+
+class SoupParser(HTMLParserBackend):
+    """BeautifulSoup backend using the pure Python ``html.parser``.
+
+    The login form and the assignment rows are parsed with a SoupStrainer so
+    only the relevant part of the page is turned into a tree.
+    """
+
+    name = "html.parser"
+
+    def auth_token(self, html: str) -> str:
+        parsed = BeautifulSoup(
+            html, "html.parser", parse_only=SoupStrainer("form", action="/login")
+        )
+        auth_token = None
+        for inp in parsed.find_all("input", attrs={"name": "authenticity_token"}):
+            auth_token = inp.get("value")
+        return auth_token
+
+    def course_list(self, html: str, heading: str) -> list[dict]:
+        # The term headings are siblings of the course lists so the whole page
+        # is needed here
+        parsed = BeautifulSoup(html, "html.parser")
+        courses = parsed.find(
+            "h1", class_=ACCOUNT_COURSES_CLASS, string=heading
+        ).find_next_sibling()
+
+        course_list = []
+        for course in courses.find_all("a", class_=COURSE_CLASS):
+            short_name = course.find("h3", class_=COURSE_SHORTNAME_CLASS).text
+            name = course.find("div", class_=COURSE_NAME_CLASS).text
+            cid = course.get("href").split("/")[-1]
+
+            term = course.parent.find_previous_sibling(class_=COURSE_TERM_CLASS)
+            year = term.get_text(strip=True) if term is not None else None
+            course_list.append(
+                {"cid": cid, "name": name, "short_name": short_name, "year": year}
+            )
+        return course_list
+
+    def assignment_rows(self, html: str) -> list[list[tuple[str, str]]]:
+        parsed = BeautifulSoup(
+            html, "html.parser", parse_only=SoupStrainer("tr", role="row")
+        )
+        rows = []
+        for assignment_row in parsed.find_all("tr", role="row"):
+            cells = assignment_row.find_all("th") + assignment_row.find_all("td")
+            rows.append([(cell.text, _soup_href(cell)) for cell in cells])
+        return rows
+
+
+class LxmlParser(HTMLParserBackend):
+    """lxml backend querying the page with XPath."""
+
+    name = "lxml"
+
+    def __init__(self) -> None:
+        import lxml.html
+
+        self._fromstring = lxml.html.fromstring
+
+    def _document(self, html: str):
+        # lxml refuses str input with an encoding declaration
+        return self._fromstring(html.encode("utf-8"))
+
+    def auth_token(self, html: str) -> str:
+        values = self._document(html).xpath(
+            "//form[@action='/login']//input[@name='authenticity_token']/@value"
+        )
+        return values[-1] if values else None
+
+    def course_list(self, html: str, heading: str) -> list[dict]:
+        document = self._document(html)
+        for h1 in document.xpath(f"//h1[{_xpath_class(ACCOUNT_COURSES_CLASS)}]"):
+            if h1.text_content() == heading:
+                # Skip comments and processing instructions between the heading
+                # and the list, only elements have a str tag
+                courses = next(
+                    (node for node in h1.itersiblings() if isinstance(node.tag, str)),
+                    None,
+                )
+                break
+        else:
+            raise AttributeError(f"Heading {heading} not found")
+
+        course_list = []
+        for course in courses.xpath(f".//a[{_xpath_class(COURSE_CLASS)}]"):
+            short_name = course.xpath(f".//h3[{_xpath_class(COURSE_SHORTNAME_CLASS)}]")
+            name = course.xpath(f".//div[{_xpath_class(COURSE_NAME_CLASS)}]")
+            term = course.getparent().xpath(
+                f"preceding-sibling::*[{_xpath_class(COURSE_TERM_CLASS)}][1]"
+            )
+            course_list.append(
+                {
+                    "cid": course.get("href").split("/")[-1],
+                    "name": name[0].text_content(),
+                    "short_name": short_name[0].text_content(),
+                    "year": term[0].text_content().strip() if term else None,
+                }
+            )
+        return course_list
+
+    def assignment_rows(self, html: str) -> list[list[tuple[str, str]]]:
+        rows = []
+        for assignment_row in self._document(html).xpath("//tr[@role='row']"):
+            cells = assignment_row.xpath(".//th") + assignment_row.xpath(".//td")
+            rows.append([(cell.text_content(), _lxml_href(cell)) for cell in cells])
+        return rows
+
+
+class SelectolaxParser(HTMLParserBackend):
+    """selectolax backend which only walks the nodes matched by CSS selectors."""
+
+    name = "selectolax"
+
+    def __init__(self) -> None:
+        try:
+            from selectolax.lexbor import LexborHTMLParser as HTMLParser
+        except ImportError:
+            from selectolax.parser import HTMLParser
+
+        self._parser = HTMLParser
+
+    def auth_token(self, html: str) -> str:
+        nodes = self._parser(html).css(
+            "form[action='/login'] input[name='authenticity_token']"
+        )
+        return nodes[-1].attributes.get("value") if nodes else None
+
+    def course_list(self, html: str, heading: str) -> list[dict]:
+        for h1 in self._parser(html).css(f"h1.{ACCOUNT_COURSES_CLASS}"):
+            if h1.text() == heading:
+                courses = h1.next
+                # Skip whitespace and comments between the heading and the list
+                while courses is not None and courses.tag[0] in "-#":
+                    courses = courses.next
+                break
+        else:
+            raise AttributeError(f"Heading {heading} not found")
+
+        course_list = []
+        for course in courses.css(f"a.{COURSE_CLASS}"):
+            course_list.append(
+                {
+                    "cid": course.attributes.get("href").split("/")[-1],
+                    "name": course.css_first(f"div.{COURSE_NAME_CLASS}").text(),
+                    "short_name": course.css_first(
+                        f"h3.{COURSE_SHORTNAME_CLASS}"
+                    ).text(),
+                    "year": _selectolax_term(course.parent),
+                }
+            )
+        return course_list
+
+    def assignment_rows(self, html: str) -> list[list[tuple[str, str]]]:
+        rows = []
+        for assignment_row in self._parser(html).css("tr[role='row']"):
+            cells = assignment_row.css("th") + assignment_row.css("td")
+            rows.append([(cell.text(), _selectolax_href(cell)) for cell in cells])
+        return rows
+
+
+class AssignmentRowStream(HTMLParser):
+    """Incremental parser of the assignment table rows.
+
+    Data can be fed in chunks as it is downloaded and every row is available as
+    soon as its closing tag has been parsed, without building a tree of the
+    page. The rows have the same format as HTMLParserBackend.assignment_rows().
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag == "tr" and ("role", "row") in attrs:
+            self._row = {"th": [], "td": []}
+        elif self._row is None:
+            return
+        elif tag in ("th", "td") and self._cell is None:
+            self._cell = [tag, [], None]
+            self._row[tag].append(self._cell)
+        elif tag == "a" and self._cell is not None and self._cell[2] is None:
+            self._cell[2] = dict(attrs).get("href")
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._row is None:
+            return
+        if self._cell is not None and tag == self._cell[0]:
+            self._cell = None
+        elif tag == "tr":
+            self.rows.append(
+                [
+                    ("".join(text), href)
+                    for _, text, href in self._row["th"] + self._row["td"]
+                ]
+            )
+            self._row = None
+            self._cell = None
+
+    def handle_data(self, data: str) -> None:
+        if self._cell is not None:
+            self._cell[1].append(data)
+
+
+class ReactPropsScanner(HTMLParser):
+    """Collects the JSON properties of the React components of a page."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.props = []
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        for name, value in attrs:
+            if name == REACT_PROPS_ATTR and value:
+                try:
+                    props = json.loads(value)
+                except ValueError:
+                    continue
+                if isinstance(props, dict):
+                    self.props.append(props)
+
+
+def iter_assignment_rows(chunks: Iterable[str]) -> Iterator[list[tuple[str, str]]]:
+    """Yield the assignment table rows while the course page is parsed.
+
+    Parameters
+    ----------
+    chunks : Iterable[str]
+        the course page in pieces, for example from Response.iter_content()
+    """
+
+    parser = AssignmentRowStream()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.rows
+        parser.rows.clear()
+    parser.close()
+    yield from parser.rows
+
+
+PARSERS = {
+    parser.name: parser for parser in (SoupParser, LxmlParser, SelectolaxParser)
+}
+
+
+def get_parser(parser: str | HTMLParserBackend = None) -> HTMLParserBackend:
+    """Get an HTML parsing backend by name.
+
+    Parameters
+    ----------
+    parser : str or HTMLParserBackend (optional)
+        "html.parser", "lxml" or "selectolax", defaults to "html.parser"
+
+    Exceptions
+    ----------
+    ValueError
+        Unknown parser name.
+    ImportError
+        The package required by the parser is not installed.
+    """
+
+    if isinstance(parser, HTMLParserBackend):
+        return parser
+    if parser is None:
+        parser = SoupParser.name
+    if parser not in PARSERS:
+        raise ValueError(f"Invalid parser {parser}, expected one of {list(PARSERS)}")
+    return PARSERS[parser]()
+
+
+def _xpath_class(class_name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+def _soup_href(cell) -> str:
+    link = cell.find("a")
+    return link.get("href") if link is not None else None
+
+
+def _lxml_href(cell) -> str:
+    links = cell.xpath(".//a")
+    return links[0].get("href") if links else None
+
+
+def _selectolax_href(cell) -> str:
+    link = cell.css_first("a")
+    return link.attributes.get("href") if link is not None else None
+
+
+def _selectolax_term(node) -> str:
+    """Text of the closest term heading before a node, None if there is none."""
+
+    node = node.prev
+    while node is not None:
+        classes = (node.attributes.get("class") or "").split()
+        if COURSE_TERM_CLASS in classes:
+            return node.text(strip=True)
+        node = node.prev
+    return None
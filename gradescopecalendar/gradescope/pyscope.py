@@ -1,8 +1,18 @@
 from __future__ import annotations
 
+import logging
+
 import requests
-from bs4 import BeautifulSoup
+from gradescopecalendar.gradescope import BASE_URL
 from gradescopecalendar.gradescope.account import GSAccount
+from gradescopecalendar.gradescope.courselistcache import GSCourseListCache
+from gradescopecalendar.gradescope.pagecache import GSPageCache
+from gradescopecalendar.gradescope.parsers import HTMLParserBackend, get_parser
+from gradescopecalendar.gradescope.sessioncache import GSSessionCache
+from gradescopecalendar.gradescope.transport import GSTransport
+from gradescopecalendar.metrics import SyncStats
+
+logger = logging.getLogger(__name__)
 
 
 class GSConnection:
@@ -16,9 +26,31 @@ class GSConnection:
         the state of the connection: INIT or LOGGED_IN
     account : GSAccount
         the account object created after logging into Gradescope
+    stats : SyncStats
+        timings and HTTP counters of the connection
+    transport : GSTransport
+        timeouts, retries, pool size and rate limit of the sessions
+
+    Methods
+    -------
+    refresh()
+        reuses the session for a new sync if it is still logged in
+    fork_session()
+        creates a new session sharing the login of this connection
     """
 
-    def __init__(self, email: str, password: str):
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        session_cache: GSSessionCache = None,
+        page_cache: GSPageCache = None,
+        parser: str | HTMLParserBackend = None,
+        base_url: str = BASE_URL,
+        stats: SyncStats = None,
+        transport: GSTransport = None,
+        course_list_cache: GSCourseListCache = None,
+    ):
         """Initialize the session for the connection to Gradescope.
 
         Parameters
@@ -27,11 +59,128 @@ class GSConnection:
             the email address of the Gradescope account to login as
         pwd : str
             the password for the account
+        session_cache : GSSessionCache (optional)
+            cache of session cookies to reuse instead of logging in again
+        page_cache : GSPageCache (optional)
+            cache of the account and course pages
+        parser : str or HTMLParserBackend (optional)
+            backend used to parse the pages, defaults to "html.parser"
+        base_url : str (optional)
+            address of Gradescope
+        stats : SyncStats (optional)
+            collects the timings and HTTP counters of the connection
+        transport : GSTransport (optional)
+            settings of the sessions, defaults to GSTransport()
+        course_list_cache : GSCourseListCache (optional)
+            cache of the courses listed on the account page
         """
 
-        self.session = requests.Session()
+        self.transport = transport if transport is not None else GSTransport()
+        self.session = self.transport.session()
+        self.page_cache = page_cache
+        self.course_list_cache = course_list_cache
+        self.parser = get_parser(parser)
+        self.base_url = base_url
+        self.stats = stats if stats is not None else SyncStats()
+        self.session.hooks["response"].append(self._record_response)
         self.account = None
-        self._login(email, password)
+
+        # Reuse the cached session if Gradescope still accepts it
+        probe_resp = None
+        if session_cache is not None and session_cache.load(self.session, email):
+            with self.stats.timer("session_probe"):
+                probe_resp = self._probe_session()
+        if probe_resp is not None:
+            logger.debug("Reusing cached Gradescope session")
+            self.account = self._new_account()
+            # The probe already fetched the account page
+            self.account._account_page = probe_resp.text
+        else:
+            self.session.cookies.clear()
+            with self.stats.timer("login"):
+                self._login(email, password)
+        if session_cache is not None:
+            session_cache.save(self.session, email)
+
+    def _record_response(self, response: requests.Response, *args, **kwargs) -> None:
+        # Looked up on every response so the stats can be replaced between syncs
+        self.stats.record_response(response, *args, **kwargs)
+
+    def _probe_session(self) -> requests.Response:
+        """Check whether the cookies of the session are still logged in.
+
+        Gradescope redirects to the login page when the session has expired.
+
+        Returns
+        -------
+        requests.Response
+            the account page if the session is logged in, otherwise None
+        """
+
+        probe_resp = self.session.get(
+            f"{self.base_url}/account", allow_redirects=False
+        )
+        if probe_resp.status_code == requests.codes.ok:
+            return probe_resp
+        # An outage is not an expired session, logging in again would fail too
+        if (
+            probe_resp.status_code >= 500
+            or probe_resp.status_code == requests.codes.too_many_requests
+        ):
+            probe_resp.raise_for_status()
+        logger.debug("Gradescope session has expired")
+        return None
+
+    def refresh(self) -> bool:
+        """Start over with a new account on the same logged in session.
+
+        Lets long running processes load the courses again without logging in.
+
+        Returns
+        -------
+        bool
+            whether the session is still logged in
+        """
+
+        with self.stats.timer("session_probe"):
+            probe_resp = self._probe_session()
+        if probe_resp is None:
+            return False
+        self.account = self._new_account()
+        self.account._account_page = probe_resp.text
+        return True
+
+    def _new_account(self) -> GSAccount:
+        return GSAccount(
+            self.session,
+            self.page_cache,
+            self.parser,
+            self.base_url,
+            self.stats,
+            self.course_list_cache,
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+    def fork_session(self) -> requests.Session:
+        """Create a new session sharing the authentication of this connection.
+
+        ``requests.Session`` objects are not guaranteed to be thread-safe, so
+        concurrent workers should each use their own session. The cookies,
+        headers and hooks are copied so the new session is already logged in
+        and counted in the stats. The connection pools are thread-safe and
+        shared, so connections are reused between workers and loads, and the
+        new session must not be closed on its own.
+        """
+
+        session = requests.Session()
+        for prefix, adapter in self.session.adapters.items():
+            session.mount(prefix, adapter)
+        session.headers.update(self.session.headers)
+        session.hooks["response"] = list(self.session.hooks["response"])
+        session.cookies = self.session.cookies.copy()
+        return session
 
     def _login(self, email: str, pwd: str) -> bool:
         """Login to Gradescope using passed in credentials.
@@ -49,30 +198,19 @@ class GSConnection:
         ----------
         ValueError
             Invalid credentials for the Gradescope account.
+        requests.HTTPError
+            Gradescope could not be reached after retrying.
         """
 
         # Get auth_token
-        init_resp = self.session.get("https://www.gradescope.com/")
-        init_resp_parsed = BeautifulSoup(init_resp.text, "html.parser")
-        # TODO: simplify this loop
-        for form in init_resp_parsed.find_all("form"):
-            if form.get("action") == "/login":
-                for inp in form.find_all("input"):
-                    if inp.get("name") == "authenticity_token":
-                        auth_token = inp.get("value")
+        init_resp = self.session.get(f"{self.base_url}/")
+        init_resp.raise_for_status()
+        auth_token = self.parser.auth_token(init_resp.text)
 
         # Login to Gradescope
-        login_data = {
-            "commit": "Log In",
-            "utf8": "✓",
-            "session[email]": email,
-            "session[password]": pwd,
-            "session[remember_me]": 0,
-            "session[remember_me_sso]": 0,
-            "authenticity_token": auth_token,
-        }
         login_resp = self.session.post(
-            "https://www.gradescope.com/login", params=login_data
+            f"{self.base_url}/login",
+            params=self._login_data(email, pwd, auth_token),
         )
 
         # Verify login status
@@ -80,6 +218,20 @@ class GSConnection:
             len(login_resp.history) != 0
             and login_resp.history[0].status_code == requests.codes.found
         ):
-            self.account = GSAccount(self.session)
+            self.account = self._new_account()
             return True
         raise ValueError("Invalid credentials.")
+
+    @staticmethod
+    def _login_data(email: str, pwd: str, auth_token: str) -> dict:
+        """Build the parameters for the login request."""
+
+        return {
+            "commit": "Log In",
+            "utf8": "✓",
+            "session[email]": email,
+            "session[password]": pwd,
+            "session[remember_me]": 0,
+            "session[remember_me_sso]": 0,
+            "authenticity_token": auth_token,
+        }
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+import requests
+from requests.cookies import create_cookie
+from gradescopecalendar.gradescope.filecache import GSFileCache
+
+logger = logging.getLogger(__name__)
+
+
+class GSSessionCache(GSFileCache):
+    """On-disk store of Gradescope session cookies keyed by account email.
+
+    Cookies grant full access to the account so the cache directory is only
+    accessible by the current user and every file is written with owner
+    read/write permissions only.
+
+    Attributes
+    ----------
+    path : Path
+        directory the cookie files are stored in
+
+    Methods
+    -------
+    load(session, email)
+        adds the cached cookies of the account to the session
+    save(session, email)
+        writes the cookies of the session to the cache
+    cookies(email) / save_cookies(email, cookies)
+        reads or writes the cached cookies as dicts, for other HTTP clients
+    clear(email)
+        removes the cached cookies of the account
+    """
+
+    directory = "sessions"
+
+    def __init__(self, path: str = None) -> None:
+        """Create the cache directory if it does not exist.
+
+        Parameters
+        ----------
+        path : str (optional)
+            directory to store the cookies in, defaults to
+            ``~/.cache/gradescopecalendar/sessions``
+        """
+
+        # Cookies expire on the server, the cache has neither namespace nor TTL
+        super().__init__(path)
+
+    def _file(self, email: str) -> Path:
+        # Keyed by the email alone, the file names hide it like the other caches
+        digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.path / f"{digest}.json"
+
+    def load(self, session: requests.Session, email: str) -> bool:
+        """Add the cached cookies of the account to the session.
+
+        Returns
+        -------
+        bool
+            whether any cookies were found for the account
+        """
+
+        cookies = self.cookies(email)
+        if not cookies:
+            return False
+
+        for cookie in cookies:
+            session.cookies.set_cookie(create_cookie(**cookie))
+        logger.debug(f"Loaded {len(cookies)} cached cookies")
+        return True
+
+    def save(self, session: requests.Session, email: str) -> None:
+        """Write the cookies of the session to the cache."""
+
+        cookies = [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+                "expires": cookie.expires,
+                "rest": cookie._rest,
+            }
+            for cookie in session.cookies
+        ]
+
+        self.save_cookies(email, cookies)
+
+    def cookies(self, email: str) -> list[dict]:
+        """Get the cached cookies of the account.
+
+        Returns
+        -------
+        list[dict]
+            keyword arguments for requests.cookies.create_cookie() of every
+            cookie, empty if none are cached
+        """
+
+        return self._load(email) or []
+
+    def save_cookies(self, email: str, cookies: list[dict]) -> None:
+        """Write cookies in the format returned by cookies() to the cache."""
+
+        self._save(email, cookies)
+        logger.debug(f"Saved {len(cookies)} cookies to the session cache")
+
+    def clear(self, email: str) -> None:
+        """Remove the cached cookies of the account."""
+
+        try:
+            os.remove(self._file(email))
+        except FileNotFoundError:
+            pass
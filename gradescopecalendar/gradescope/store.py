@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import bisect
+import datetime
+import threading
+from collections.abc import Mapping
+from typing import Iterable, Iterator
+
+from gradescopecalendar.gradescope.assignment import GSAssignment
+from gradescopecalendar.utils import event_name
+
+
+class GSAssignmentStore(Mapping):
+    """Assignments of an account keyed by course and assignment ID.
+
+    A mapping from ``(cid, aid)`` to GSAssignment, iterated in the order the
+    assignments were added, with an index of the assignments of every course
+    and a sorted index of the close dates answering "what is due between"
+    questions with a binary search instead of a scan of every assignment.
+    The date index is rebuilt on the first query after a change, so adding
+    many assignments at once costs a single sort.
+
+    Attributes
+    ----------
+    courses : dict[str, dict]
+        assignments of every course by key, in the order they were added
+
+    Methods
+    -------
+    add(assignment)
+        adds or replaces an assignment
+    discard(key)
+        removes an assignment if present
+    in_course(cid)
+        returns the assignments of a course
+    due_between(start, end)
+        returns the assignments closing in a time range, by close date
+    due_within(delta, now)
+        returns the assignments closing in the next delta, by close date
+    named_items()
+        yields (event name, assignment) pairs for the calendar backends
+    """
+
+    def __init__(self, assignments: Iterable[GSAssignment] = ()) -> None:
+        """
+        Parameters
+        ----------
+        assignments : Iterable[GSAssignment]
+            assignments to add, for example the result of due_between() to
+            write only those to a calendar
+        """
+
+        self._assignments = {}
+        self.courses = {}
+        self._lock = threading.Lock()
+        # (close date, key) pairs sorted by close date, None when stale
+        self._by_close_date = None
+        self._close_dates = None
+        for assignment in assignments:
+            self.add(assignment)
+
+    def __getitem__(self, key: tuple[str, str]) -> GSAssignment:
+        return self._assignments[key]
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        return iter(self._assignments)
+
+    def __len__(self) -> int:
+        return len(self._assignments)
+
+    def add(self, assignment: GSAssignment) -> None:
+        key = assignment.key
+        with self._lock:
+            self._assignments[key] = assignment
+            self.courses.setdefault(key[0], {})[key] = assignment
+            self._by_close_date = None
+
+    def discard(self, key: tuple[str, str]) -> None:
+        with self._lock:
+            if self._assignments.pop(key, None) is None:
+                return
+            course = self.courses[key[0]]
+            del course[key]
+            if not course:
+                del self.courses[key[0]]
+            self._by_close_date = None
+
+    def in_course(self, cid: str) -> list[GSAssignment]:
+        return list(self.courses.get(cid, {}).values())
+
+    def _date_index(self) -> tuple[list, list]:
+        with self._lock:
+            if self._by_close_date is None:
+                self._by_close_date = sorted(
+                    (assignment.close_date, key)
+                    for key, assignment in self._assignments.items()
+                )
+                self._close_dates = [date for date, _ in self._by_close_date]
+            return self._by_close_date, self._close_dates
+
+    def due_between(
+        self, start: datetime.datetime = None, end: datetime.datetime = None
+    ) -> list[GSAssignment]:
+        """Get the assignments closing in a time range.
+
+        Parameters
+        ----------
+        start : datetime (optional)
+            inclusive start of the range, unbounded if None
+        end : datetime (optional)
+            exclusive end of the range, unbounded if None
+
+        Returns
+        -------
+        list[GSAssignment]
+            the assignments ordered by close date
+        """
+
+        index, dates = self._date_index()
+        low = 0 if start is None else bisect.bisect_left(dates, start)
+        high = len(dates) if end is None else bisect.bisect_left(dates, end)
+        return [self._assignments[key] for _, key in index[low:high]]
+
+    def due_within(
+        self, delta: datetime.timedelta, now: datetime.datetime = None
+    ) -> list[GSAssignment]:
+        """Get the assignments closing between now and now + delta.
+
+        Parameters
+        ----------
+        delta : timedelta
+            length of the time range
+        now : datetime (optional)
+            start of the time range, defaults to the current time
+        """
+
+        if now is None:
+            now = datetime.datetime.now().astimezone()
+        return self.due_between(now, now + delta)
+
+    def named_items(self) -> Iterator[tuple[str, GSAssignment]]:
+        """Yield the event name and the assignment of every assignment."""
+
+        for assignment in list(self._assignments.values()):
+            yield event_name(assignment), assignment
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a connection and then for every read from the server
+TIMEOUT = (5, 30)
+# Retries of a request after connection errors or retryable statuses
+RETRIES = 4
+# Retries wait BACKOFF * 2 ** (retry - 1) seconds unless the server sends
+# Retry-After
+BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Only idempotent requests are retried, logging in is not repeated
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the rate of requests.
+
+    One bucket can be shared by the transports of several accounts to limit
+    their combined rate. Up to ``burst`` requests are sent at once, after that
+    requests are spaced out to ``rate`` per second.
+
+    Methods
+    -------
+    acquire()
+        waits until a request may be sent
+    acquire_async()
+        waits until a request may be sent without blocking the event loop
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        rate : float
+            requests per second
+        burst : int
+            requests allowed at once after a pause
+        clock : Callable[[], float]
+            monotonic time function, replaceable for testing
+        sleep : Callable[[float], None]
+            sleep function, replaceable for testing
+        """
+
+        if rate <= 0:
+            raise ValueError(f"Invalid rate {rate}, expected a positive number")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = clock()
+
+    def acquire(self) -> float:
+        """Take a token, waiting for one if the bucket is empty.
+
+        Tokens are reserved before waiting, so concurrent callers wait in turn
+        instead of all waking up for the same token.
+
+        Returns
+        -------
+        float
+            seconds waited
+        """
+
+        wait = self._reserve()
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Take a token like acquire(), sleeping with asyncio."""
+
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def _reserve(self) -> float:
+        """Take a token and return the seconds to wait before using it."""
+
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class GSTransport:
+    """Settings of the HTTP sessions used to talk to Gradescope.
+
+    Sessions made by the transport use a default timeout, retry idempotent
+    requests with exponential backoff on connection errors and on 429 and 5xx
+    responses, keep up to ``pool_size`` connections open and wait for the
+    token bucket before every request and every retry. A transport can be shared between
+    accounts, each connection gets its own sessions.
+
+    Attributes
+    ----------
+    timeout : tuple (float, float)
+        connect and read timeouts in seconds
+    retries : int
+        retries of a request before its last response or error is returned
+    backoff : float
+        base of the exponential delay between retries in seconds
+    pool_size : int
+        connections kept open per session, at least the number of requests
+        sent at the same time on a session
+    rate_limiter : TokenBucket
+        limits the rate of requests, None if unlimited
+
+    Methods
+    -------
+    session()
+        creates a session with the settings of the transport
+    """
+
+    def __init__(
+        self,
+        timeout: float | tuple[float, float] = TIMEOUT,
+        retries: int = RETRIES,
+        backoff: float = BACKOFF,
+        pool_size: int = 10,
+        rate_limiter: TokenBucket = None,
+    ) -> None:
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = max(1, pool_size)
+        self.rate_limiter = rate_limiter
+
+    def session(self) -> requests.Session:
+        session = requests.Session()
+        retry = _RateLimitedRetry(
+            rate_limiter=self.rate_limiter,
+            total=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            # Hand the last response to the caller instead of raising, callers
+            # check its status with raise_for_status()
+            raise_on_status=False,
+        )
+        adapter = _GSAdapter(
+            self.timeout,
+            self.rate_limiter,
+            max_retries=retry,
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+
+class _RateLimitedRetry(Retry):
+    """Retry waiting for the token bucket after the backoff of every retry.
+
+    urllib3 retries inside HTTPAdapter.send(), so the adapter only waits for
+    the bucket before the first attempt.
+    """
+
+    def __init__(self, *args, rate_limiter: TokenBucket = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def new(self, **kwargs) -> _RateLimitedRetry:
+        # urllib3 makes a new Retry after every attempt
+        retry = super().new(**kwargs)
+        retry.rate_limiter = self.rate_limiter
+        return retry
+
+    def sleep(self, response=None) -> None:
+        super().sleep(response)
+        _acquire(self.rate_limiter)
+
+
+class _GSAdapter(HTTPAdapter):
+    """HTTPAdapter applying a default timeout and a rate limit."""
+
+    def __init__(
+        self,
+        timeout: float | tuple[float, float],
+        rate_limiter: TokenBucket = None,
+        **kwargs,
+    ) -> None:
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        _acquire(self.rate_limiter)
+        if timeout is None:
+            timeout = self.timeout
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+def _acquire(rate_limiter: TokenBucket) -> None:
+    """Wait for a token of the rate limiter, if any."""
+
+    if rate_limiter is not None:
+        waited = rate_limiter.acquire()
+        if waited:
+            logger.debug(f"Rate limited request for {waited:.2f}s")
@@ -1,11 +1,29 @@
 from __future__ import annotations
 
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
 
-from gradescopecalendar.calendars.caldav import CalDav
+from gradescopecalendar.calendars import BACKENDS, get_backend
+from gradescopecalendar.calendars.state import SyncState
+from gradescopecalendar.gradescope import BASE_URL
+from gradescopecalendar.gradescope.account import ACTIVE_TERM
+from gradescopecalendar.gradescope.assignment import GSAssignment
+from gradescopecalendar.gradescope.courselistcache import (
+    COURSE_LIST_TTL,
+    GSCourseListCache,
+)
+from gradescopecalendar.gradescope.detailcache import DETAILS_TTL, GSDetailCache
+from gradescopecalendar.gradescope.pagecache import GSPageCache
 from gradescopecalendar.gradescope.pyscope import GSConnection
-from gradescopecalendar.calendars.ical import ICal
-from gradescopecalendar.calendars.gcal import GCal
+from gradescopecalendar.gradescope.sessioncache import GSSessionCache
+from gradescopecalendar.gradescope.store import GSAssignmentStore
+from gradescopecalendar.gradescope.transport import GSTransport
+from gradescopecalendar.metrics import SyncStats
+from gradescopecalendar.pipeline import QUEUE_SIZE, fan_out
+from gradescopecalendar.utils import event_name
 
 logger = logging.getLogger(__name__)
 
@@ -13,72 +31,611 @@ logger = logging.getLogger(__name__)
 class GradescopeCalendar:
     """Interface for interacting with Gradescope and calendar applications.
 
+    Calendar backends are imported by the first write_to_* call using them, so
+    only the client libraries of the calendars actually written to are needed.
+
     Attributes
     ----------
     username : str
         email address to login as
     password : str
         password of the account
-    DEBUG : bool
-        controls whether additional debug info is printed
-    assignments_all : dict[]
-        collection of all assignments from all courses on Gradescope
+    is_instructor : bool
+        whether the account is an instructor for any course
+    terms : str or Iterable[str]
+        terms whose courses are loaded
+    max_workers : int
+        number of courses to fetch from Gradescope concurrently
+    transport : GSTransport
+        timeouts, retries, pool size and rate limit of the Gradescope requests
+    session_cache : GSSessionCache
+        on-disk cache of login cookies, None if disabled
+    page_cache : GSPageCache
+        on-disk cache of the account and course pages, None if disabled
+    course_list_cache : GSCourseListCache
+        on-disk cache of the courses of the account, None if disabled
+    detail_cache : GSDetailCache
+        on-disk cache of the questions and regrade status of the assignments,
+        None if they are not fetched
+    parser : str
+        name of the backend used to parse Gradescope pages
+    state : SyncState
+        record of what was written to each calendar, None if disabled
+    assignments_all : GSAssignmentStore
+        all assignments from all courses on Gradescope by course and
+        assignment ID, indexed by course and close date
+    stats : SyncStats
+        timings and request counters of the latest load and the writes after it
+
+    connection : GSConnection
+        the connection to Gradescope kept between loads, None before the first
 
     Methods
     -------
+    load()
+        gets assignment information from Gradescope
+    load_async(connector)
+        gets assignment information from Gradescope using asyncio
+    iter_assignments()
+        yields assignments from Gradescope while they are being parsed
+    sync(targets, queue_size)
+        gets assignment information while writing it to several calendars
     write_to_ical()
-        creates an iCalendar file (.ics) of all assignment details
-    write_to_gcal()
+        creates or updates an iCalendar file (.ics) of all assignment details
+    write_to_feed(server, token)
+        publishes the assignment details as an ICS feed of a FeedServer
+    write_to_gcal(prune)
         connects to Google Calendar API and updates or creates Gradescope assignments
+    write_to_caldav(url, calName, username, password)
+        creates or updates the assignment events of a CalDAV calendar
     """
 
-    def __init__(self, email: str, password: str, is_instructor: bool = False) -> None:
-        self.assignments_all = {}
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        is_instructor: bool = False,
+        max_workers: int = 1,
+        load: bool = True,
+        session_cache: bool | str = False,
+        page_cache: bool | str = False,
+        parser: str = "html.parser",
+        state: bool | str = False,
+        base_url: str = BASE_URL,
+        details: bool | str = False,
+        details_ttl: float = DETAILS_TTL,
+        transport: GSTransport = None,
+        terms: str | Iterable[str] = ACTIVE_TERM,
+        course_list_cache: bool | str = False,
+        course_list_ttl: float = COURSE_LIST_TTL,
+    ) -> None:
+        """Create the calendar interface and get assignments from Gradescope.
+
+        Parameters
+        ----------
+        load : bool
+            whether to get assignment information immediately, pass False and
+            await load_async() to use asyncio instead
+        session_cache : bool or str
+            reuse the login cookies between runs, pass a directory to store
+            them somewhere other than the default cache directory
+        page_cache : bool or str
+            skip parsing pages that did not change since the last run, pass a
+            directory to store them somewhere other than the default cache
+            directory
+        parser : str
+            backend used to parse Gradescope pages: "html.parser", "lxml" or
+            "selectolax", the latter two are faster but need extra packages
+        state : bool or str
+            remember what was written to each calendar so unchanged assignments
+            are skipped without contacting the calendar, pass a file path to
+            store the database somewhere other than the default cache directory
+        base_url : str
+            address of Gradescope, only changed to test against a local server
+        details : bool or str
+            also fetch the page of every assignment for its questions and
+            regrade status, up to max_workers at a time, pass a directory to
+            cache them somewhere other than the default cache directory
+        details_ttl : float
+            seconds the cached details of an unchanged assignment are reused,
+            assignments whose row on the course page changed are always
+            fetched again
+        transport : GSTransport (optional)
+            timeouts, retries and rate limit of the requests to Gradescope,
+            defaults to a connection pool of max_workers connections; pass the
+            same transport to several calendars to share its rate limit
+        terms : str or Iterable[str]
+            "active" to only load the courses of the most recent term on the
+            account page, "all" for every term or the names of the terms to
+            load, such as ``["Spring 2022", "Fall 2021"]``
+        course_list_cache : bool or str
+            reuse the course list of the account page for course_list_ttl
+            seconds instead of fetching it on every load, pass a directory to
+            store it somewhere other than the default cache directory
+        course_list_ttl : float
+            seconds the cached course list is reused
+        """
+
+        self.assignments_all = GSAssignmentStore()
+        self.connection = None
+        self.stats = SyncStats()
         self.is_instructor = is_instructor
+        self.terms = terms
         self.email = email
         self.password = password
+        self.max_workers = max(1, max_workers)
+        self.transport = transport or GSTransport(pool_size=self.max_workers)
+        self.session_cache = None
+        if session_cache:
+            self.session_cache = GSSessionCache(
+                session_cache if isinstance(session_cache, str) else None
+            )
+        self.parser = parser
+        self.base_url = base_url
+        self.state = None
+        if state:
+            self.state = SyncState(state if isinstance(state, str) else None)
+        self.page_cache = None
+        if page_cache:
+            self.page_cache = GSPageCache(
+                page_cache if isinstance(page_cache, str) else None, namespace=email
+            )
+        self.course_list_cache = None
+        if course_list_cache:
+            self.course_list_cache = GSCourseListCache(
+                course_list_cache if isinstance(course_list_cache, str) else None,
+                namespace=email,
+                ttl=course_list_ttl,
+            )
+        self.detail_cache = None
+        if details:
+            self.detail_cache = GSDetailCache(
+                details if isinstance(details, str) else None,
+                namespace=email,
+                ttl=details_ttl,
+            )
+        if load:
+            self._get_calendar_info()
+
+    def _connect(self) -> GSConnection:
+        """Login to Gradescope and find all courses in the account.
+
+        The connection of the previous load is reused while Gradescope still
+        accepts its session.
+        """
+
+        session = self.connection
+        if session is not None:
+            session.stats = self.stats
+            if not session.refresh():
+                session.close()
+                session = None
+        if session is None:
+            session = GSConnection(
+                self.email,
+                self.password,
+                self.session_cache,
+                self.page_cache,
+                self.parser,
+                self.base_url,
+                self.stats,
+                self.transport,
+                self.course_list_cache,
+            )
+            self.connection = session
+        session.account.add_courses_in_account(self.is_instructor, self.terms)
+        return session
+
+    def load(self) -> SyncStats:
+        """Get assignment information from Gradescope again.
+
+        Long running processes can call this repeatedly, only logging in again
+        once the session expires.
+
+        Returns
+        -------
+        SyncStats
+            the stats of this load, the writes after it are added to them
+        """
+
         self._get_calendar_info()
+        return self.stats
 
     def _get_calendar_info(self) -> None:
         """Connect to Gradescope and get assignment information."""
 
-        # TODO: Cache assignment details in file to reduce requests to Gradescope?
-        #       Might not be necessary since course page lists all assignment details
-        #       so only 1 request is made per course
-
+        self.stats = SyncStats()
         # Login to Gradescope
-        session = GSConnection(self.email, self.password)
+        session = self._connect()
+
+        courses = list(session.account.courses.values())
+        self._load_courses(session, courses)
+        self._load_details(session, courses)
+        self._collect_assignments(courses)
+
+    async def load_async(self, connector=None) -> SyncStats:
+        """Connect to Gradescope and get assignment information using asyncio.
+
+        Up to max_workers courses, then assignment pages, are fetched at the
+        same time. Requests follow the transport and the cached session is
+        reused like load() does.
+
+        Parameters
+        ----------
+        connector : aiohttp.BaseConnector (optional)
+            connection pool to share with other calendars
+
+        Returns
+        -------
+        SyncStats
+            the stats of this load, the writes after it are added to them
+        """
+
+        import asyncio
+
+        from gradescopecalendar.gradescope.aiopyscope import AsyncGSConnection
+
+        self.stats = SyncStats()
+        async with AsyncGSConnection(
+            connector=connector,
+            page_cache=self.page_cache,
+            parser=self.parser,
+            base_url=self.base_url,
+            stats=self.stats,
+            course_list_cache=self.course_list_cache,
+            transport=self.transport,
+            session_cache=self.session_cache,
+        ) as session:
+            await session.login(self.email, self.password)
+            await session.account.add_courses_in_account(
+                self.is_instructor, self.terms
+            )
+
+            courses = list(session.account.courses.values())
+            semaphore = asyncio.Semaphore(self.max_workers)
+
+            async def load(course) -> None:
+                async with semaphore:
+                    await course._load_assignments()
+                logger.debug(f"Done parsing course on Gradescope for: {course.name}")
+
+            await asyncio.gather(*(load(course) for course in courses))
+
+            async def load_details(assignment) -> None:
+                async with semaphore:
+                    details = await assignment.course._load_details(assignment)
+                self._apply_details(assignment, details)
+
+            await asyncio.gather(
+                *(load_details(a) for a in self._stale_assignments(courses))
+            )
+        self._collect_assignments(courses)
+        return self.stats
+
+    def iter_assignments(self) -> Iterator[tuple[str, GSAssignment]]:
+        """Connect to Gradescope and yield assignments as they are parsed.
+
+        Course pages are fetched one at a time and parsed while downloading so
+        the calendar writers can start before all courses are loaded. The
+        result can be passed as ``assignments`` to any write_to_* method.
+        ``assignments_all`` is filled in as the assignments are yielded.
+        Assignment details are not fetched in this mode.
+
+        Yields
+        ------
+        tuple (str, GSAssignment)
+            the event name and the assignment
+        """
+
+        self.stats = SyncStats()
+        session = self._connect()
+        self.assignments_all = GSAssignmentStore()
+        for course in session.account.courses.values():
+            for assignment in course.iter_assignments():
+                self.assignments_all.add(assignment)
+                yield event_name(assignment), assignment
+            logger.debug(f"Done parsing course on Gradescope for: {course.name}")
+
+    def sync(
+        self,
+        targets: dict[str, dict | Callable],
+        queue_size: int = QUEUE_SIZE,
+    ) -> SyncStats:
+        """Get assignment information while writing it to several calendars.
+
+        Courses are loaded up to max_workers at a time, with their assignment
+        details, and passed in account order through a bounded queue to every
+        target as soon as they are loaded. Each target is written from its own
+        thread, so a sync takes about as long as its slowest stage instead of
+        loading and every write one after the other. A failing target does not
+        stop the others.
+
+        Parameters
+        ----------
+        targets : dict[str, dict or Callable]
+            keyword arguments of the write_to_* method of every calendar to
+            write, keyed by "ical", "feed", "gcal" or "caldav", for example
+            ``{"ical": {"path": "."}, "gcal": {}}``, or any name and a function
+            of the stream of (name, assignment) pairs to write elsewhere
+        queue_size : int
+            assignments loaded ahead of the slowest target
+
+        Returns
+        -------
+        SyncStats
+            the stats of the load and the writes
+
+        Exceptions
+        ----------
+        ValueError
+            Unknown target.
+        ImportError
+            The packages required by a target are not installed.
+        Exception
+            The error of the load or of the first failed target, raised after
+            every target finished.
+        """
+
+        writers = {
+            "ical": self.write_to_ical,
+            "feed": self.write_to_feed,
+            "gcal": self.write_to_gcal,
+            "caldav": self.write_to_caldav,
+        }
+        consumers = {}
+        for name, target in targets.items():
+            if callable(target):
+                consumers[name] = target
+                continue
+            if name not in writers:
+                raise ValueError(
+                    f"Invalid target {name}, expected one of {list(writers)}"
+                )
+            # Fail before logging in if the client library is missing
+            if name in BACKENDS:
+                get_backend(name)
+
+            def consumer(assignments, write=writers[name], kwargs=target):
+                return write(assignments=assignments, **kwargs)
+
+            consumers[name] = consumer
+
+        self.stats = SyncStats()
+        session = self._connect()
+        self.assignments_all = GSAssignmentStore()
+        with self.stats.timer("sync"):
+            errors = fan_out(self._iter_loaded(session), consumers, queue_size)
+        for name, error in errors.items():
+            logger.error(f"Failed to write assignments to {name}: {error!r}")
+        if errors:
+            raise next(iter(errors.values()))
+        return self.stats
+
+    def _iter_loaded(
+        self, session: GSConnection
+    ) -> Iterator[tuple[str, GSAssignment]]:
+        """Load every course and its details, yielding the assignments.
 
-        session.account.add_courses_in_account(self.is_instructor)
+        Courses are loaded up to max_workers at a time and their assignments
+        yielded in account order, adding them to ``assignments_all``.
+        """
 
-        # Dictionary of all assignments current in the calendar
-        self.assignments_all = {}
-        # Loop through all course and assignments and make Google Calendar events
-        for cnum in session.account.courses:
-            course = session.account.courses[cnum]
-            course._load_assignments()
+        courses = list(session.account.courses.values())
+        if self.detail_cache is not None:
+            self.detail_cache.prune()
 
-            # Loop through all the assignments and save them
+        def load(course, worker_session=None) -> None:
+            course._load_assignments(session=worker_session)
+            for assignment in self._stale_assignments([course], prune=False):
+                details = course._load_details(assignment, session=worker_session)
+                self._apply_details(assignment, details)
+            logger.debug(f"Done parsing course on Gradescope for: {course.name}")
+
+        for course in self._iter_workers(session, courses, load):
             for assignment in course.assignments.values():
-                name = f"{assignment.name} - {assignment.course.name}"
-                self.assignments_all[name] = assignment
+                self.assignments_all.add(assignment)
+                yield event_name(assignment), assignment
+
+    def _collect_assignments(self, courses: list) -> None:
+        """Save the assignments of all courses into assignments_all.
+
+        Built in account order so the result does not depend on fetch order.
+        """
+
+        # All assignments current in the calendar
+        self.assignments_all = GSAssignmentStore(
+            assignment
+            for course in courses
+            for assignment in course.assignments.values()
+        )
+
+    def _load_courses(self, session: GSConnection, courses: list) -> None:
+        """Load the assignments of every course, up to max_workers at a time.
+
+        Parameters
+        ----------
+        session : GSConnection
+            the logged in connection to Gradescope
+        courses : list[GSCourse]
+            courses to load assignments for
+        """
 
+        def load(course, worker_session=None) -> None:
+            course._load_assignments(session=worker_session)
             logger.debug(f"Done parsing course on Gradescope for: {course.name}")
 
-    def write_to_ical(self, path: str = None) -> str:
-        self.ical = ICal()
-        self.ical.write_to_ical(self.assignments_all, path)
+        self._run_workers(session, courses, load)
+
+    def _load_details(self, session: GSConnection, courses: list) -> None:
+        """Fetch the details of the assignments, up to max_workers at a time.
+
+        Only assignments without valid cached details are fetched.
+
+        Parameters
+        ----------
+        session : GSConnection
+            the logged in connection to Gradescope
+        courses : list[GSCourse]
+            courses with loaded assignments
+        """
+
+        def load(assignment, worker_session=None) -> None:
+            details = assignment.course._load_details(
+                assignment, session=worker_session
+            )
+            self._apply_details(assignment, details)
+
+        self._run_workers(session, self._stale_assignments(courses), load)
+
+    def _stale_assignments(
+        self, courses: list, prune: bool = True
+    ) -> list[GSAssignment]:
+        """Fill in the cached details and list the assignments to fetch.
+
+        Parameters
+        ----------
+        courses : list[GSCourse]
+            courses with loaded assignments
+        prune : bool
+            delete the expired entries of the cache first
+
+        Returns
+        -------
+        list[GSAssignment]
+            assignments without valid cached details, none if details are
+            disabled
+        """
+
+        if self.detail_cache is None:
+            return []
+        if prune:
+            self.detail_cache.prune()
+        stale = []
+        cached = 0
+        for course in courses:
+            for assignment in course.assignments.values():
+                if not assignment.url:
+                    continue
+                details = self.detail_cache.get(assignment)
+                if details is None:
+                    stale.append(assignment)
+                else:
+                    self._apply_details(assignment, details, store=False)
+                    cached += 1
+        self.stats.count("detail_cache", cached, result="hit")
+        self.stats.count("detail_cache", len(stale), result="miss")
+        logger.debug(f"Fetching details of {len(stale)} assignments")
+        return stale
+
+    def _apply_details(
+        self, assignment: GSAssignment, details: dict, store: bool = True
+    ) -> None:
+        """Set the details of an assignment and cache them."""
+
+        if details is None:
+            return
+        assignment.questions = details["questions"]
+        assignment.regrades_on = details["regrades_on"]
+        if store:
+            self.detail_cache.store(assignment, details)
 
-    def write_to_gcal(self) -> None:
-        self.gcal = GCal()
-        self.gcal.write_to_gcal(self.assignments_all)
+    def _run_workers(self, session: GSConnection, items: list, work) -> None:
+        """Call work(item, worker_session) for every item on max_workers threads.
 
-    def write_to_caldav(self, url, calName=None, username="", password="") -> None:
-        self.caldav = CalDav()
+        Each worker thread gets its own session with the login cookies, all
+        sharing the connection pool of the connection. A single worker uses
+        the connection session.
+
+        Parameters
+        ----------
+        session : GSConnection
+            the logged in connection to Gradescope
+        items : list
+            the arguments of work
+        work : Callable
+            function of an item and the session to make requests with
+        """
+
+        # Consume the results so exceptions from workers are raised
+        for _ in self._iter_workers(session, items, work):
+            pass
+
+    def _iter_workers(self, session: GSConnection, items: list, work) -> Iterator:
+        """Like _run_workers, yielding every item in order once its work is done.
+
+        At most twice max_workers items are worked on ahead of the item the
+        caller is waiting for.
+        """
+
+        if self.max_workers == 1 or len(items) <= 1:
+            for item in items:
+                work(item)
+                yield item
+            return
+
+        local = threading.local()
+
+        def run(item):
+            if not hasattr(local, "session"):
+                local.session = session.fork_session()
+            work(item, local.session)
+            return item
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = deque()
+            for item in items:
+                pending.append(pool.submit(run, item))
+                if len(pending) >= 2 * self.max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def write_to_ical(self, path: str = None, assignments=None) -> bool:
+        self.ical = get_backend("ical")(stats=self.stats)
+        return self.ical.write_to_ical(self._assignments(assignments), path, self.state)
+
+    def write_to_feed(self, server, token: str, assignments=None) -> bool:
+        """Publish the assignments as the ICS feed of a FeedServer.
+
+        Parameters
+        ----------
+        server : FeedServer
+            the server publishing the feed
+        token : str
+            secret token of the feed URL
+        """
+
+        with self.stats.timer("write", backend="feed"):
+            return server.publish(token, self._assignments(assignments))
+
+    def write_to_gcal(self, assignments=None, prune: bool = False) -> None:
+        """Create, update and optionally delete the events of the assignments.
+
+        Parameters
+        ----------
+        prune : bool
+            delete the events of removed assignments of the written courses
+        """
+
+        self.gcal = get_backend("gcal")(stats=self.stats)
+        self.gcal.write_to_gcal(
+            self._assignments(assignments), self.state, prune, account=self.email
+        )
+
+    def write_to_caldav(
+        self, url, calName=None, username="", password="", assignments=None
+    ) -> None:
+        self.caldav = get_backend("caldav")(stats=self.stats)
         self.caldav.write_to_caldav(
-            assignments_all=self.assignments_all,
+            assignments_all=self._assignments(assignments),
             url=url,
             calName=calName,
             username=username,
-            password=password
+            password=password,
+            state=self.state,
         )
+
+    def _assignments(self, assignments=None):
+        """Assignments to write, defaults to all loaded assignments."""
+
+        return self.assignments_all if assignments is None else assignments
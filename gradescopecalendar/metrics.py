@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import urlparse
+
+
+class SyncStats:
+    """Timings and counters collected while syncing an account.
+
+    Timings are kept per phase (for example ``login``, ``course_fetch`` or
+    ``write``) and counters per name (for example ``http_requests``), both
+    further split by labels such as the course ID or calendar backend. All
+    methods are thread-safe.
+
+    Attributes
+    ----------
+    timings : dict
+        count, total and maximum seconds keyed by phase and labels
+    counters : dict
+        values keyed by name and labels
+
+    Methods
+    -------
+    timer(phase, **labels)
+        context manager timing a phase
+    count(name, value, **labels)
+        increments a counter
+    record_response(response)
+        requests response hook counting HTTP requests and bytes
+    as_dict() / to_json_lines() / to_prometheus()
+        exports the collected values
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.timings = {}
+            self.counters = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+    @contextmanager
+    def timer(self, phase: str, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start, **labels)
+
+    def add_time(self, phase: str, seconds: float, **labels) -> None:
+        key = self._key(phase, labels)
+        with self._lock:
+            count, total, longest = self.timings.get(key, (0, 0.0, 0.0))
+            self.timings[key] = (count + 1, total + seconds, max(longest, seconds))
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def record_response(self, response, *args, **kwargs) -> None:
+        """Count an HTTP request, its retries and the bytes of its response.
+
+        Used as a ``requests`` response hook. The body of streamed responses
+        is not read, their size is taken from the Content-Length header.
+        """
+
+        host = urlparse(response.url).netloc
+        self.count("http_requests", host=host, status=response.status_code)
+        # Retries made by urllib3 before this response
+        retries = getattr(getattr(response, "raw", None), "retries", None)
+        if retries is not None and retries.history:
+            self.count("retries", len(retries.history), host=host)
+        if kwargs.get("stream"):
+            size = int(response.headers.get("Content-Length") or 0)
+        else:
+            size = len(response.content)
+        self.count("http_bytes", size, host=host)
+
+    def as_dict(self) -> dict:
+        """Collected values as JSON serializable lists."""
+
+        with self._lock:
+            timings = [
+                {
+                    "phase": phase,
+                    "labels": dict(labels),
+                    "count": count,
+                    "seconds": total,
+                    "max_seconds": longest,
+                }
+                for (phase, labels), (count, total, longest) in self.timings.items()
+            ]
+            counters = [
+                {"counter": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self.counters.items()
+            ]
+        return {"timings": timings, "counters": counters}
+
+    def to_json_lines(self, **extra) -> str:
+        """One JSON object per timing and counter, with the extra fields added."""
+
+        stats = self.as_dict()
+        return "".join(
+            json.dumps({**extra, **entry}) + "\n"
+            for entry in stats["timings"] + stats["counters"]
+        )
+
+    def to_prometheus(self, prefix: str = "gradescopecalendar", **extra) -> str:
+        """Collected values in the Prometheus text exposition format.
+
+        Timings are exported as summaries without quantiles and counters as
+        counters, the extra labels are added to every sample.
+        """
+
+        def labels(pairs) -> str:
+            pairs = list(extra.items()) + list(pairs)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            timings = sorted(self.timings.items())
+            counters = sorted(self.counters.items())
+
+        lines = []
+        if timings:
+            lines.append(f"# TYPE {prefix}_phase_seconds summary")
+        for (phase, pairs), (count, total, _) in timings:
+            pairs = (("phase", phase),) + pairs
+            lines.append(f"{prefix}_phase_seconds_sum{labels(pairs)} {total}")
+            lines.append(f"{prefix}_phase_seconds_count{labels(pairs)} {count}")
+        previous = None
+        for (name, pairs), value in counters:
+            if name != previous:
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                previous = name
+            lines.append(f"{prefix}_{name}_total{labels(pairs)} {value}")
+        return "".join(line + "\n" for line in lines)
+
+
+def _escape(value) -> str:
+    """Escape a Prometheus label value."""
+
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
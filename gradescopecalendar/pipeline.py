@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Items a consumer may lag behind the producer before the producer waits
+QUEUE_SIZE = 64
+# Seconds between checks whether the consumer of a full queue stopped reading
+_POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class _Failed:
+    """Marks the failure of the producer in the queue of a consumer."""
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+class _Channel:
+    """Bounded queue between the producer and one consumer."""
+
+    def __init__(self, size: int) -> None:
+        self.queue = queue.Queue(size)
+        self.closed = threading.Event()
+
+    def put(self, item) -> None:
+        """Queue an item, dropping it once the consumer stopped reading."""
+
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self) -> Iterator:
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failed):
+                    raise item.error
+                yield item
+        finally:
+            self.closed.set()
+
+
+def fan_out(
+    items: Iterable,
+    consumers: dict[str, Callable[[Iterator], object]],
+    size: int = QUEUE_SIZE,
+) -> dict[str, BaseException]:
+    """Stream every item to several consumers running at the same time.
+
+    Every consumer runs on its own thread and reads the items from its own
+    bounded queue while the items are still being produced on the calling
+    thread. The producer is at most ``size`` items ahead of the slowest
+    consumer, so the items in flight stay bounded, and the whole run takes
+    about as long as its slowest stage. A consumer which fails or stops
+    reading early no longer receives items, the others are unaffected.
+
+    Parameters
+    ----------
+    items : Iterable
+        the items to stream, produced on the calling thread
+    consumers : dict[str, Callable[[Iterator], object]]
+        functions of an iterator over the items, by name
+    size : int
+        items queued for each consumer
+
+    Returns
+    -------
+    dict[str, BaseException]
+        the errors raised by consumers by name, empty if all succeeded
+
+    Exceptions
+    ----------
+    Exception
+        Raised while producing the items, after every consumer stopped. The
+        consumers see the same error raised by their iterator.
+    """
+
+    channels = {name: _Channel(max(1, size)) for name in consumers}
+
+    def consume(name: str) -> None:
+        try:
+            consumers[name](iter(channels[name]))
+        finally:
+            # Consumers may return without reading every item
+            channels[name].closed.set()
+
+    if not consumers:
+        for _ in items:
+            pass
+        return {}
+
+    with ThreadPoolExecutor(
+        max_workers=len(consumers), thread_name_prefix="fan-out"
+    ) as pool:
+        futures = {name: pool.submit(consume, name) for name in consumers}
+        try:
+            for item in items:
+                for channel in channels.values():
+                    channel.put(item)
+        except BaseException as e:
+            for channel in channels.values():
+                channel.put(_Failed(e))
+            raise
+        for channel in channels.values():
+            channel.put(_DONE)
+
+    errors = {}
+    for name, future in futures.items():
+        error = future.exception()
+        if error is not None:
+            logger.debug(f"Consumer {name} failed: {error!r}")
+            errors[name] = error
+    return errors
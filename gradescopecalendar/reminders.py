@@ -0,0 +1,493 @@
+"""Reminders sent some time before the assignments of accounts close.
+
+The deadlines of every account are kept in a single min-heap of reminder times,
+so one thread sleeps until the earliest reminder is due instead of scanning
+the assignments of every account on a timer. A sync only reschedules the
+assignments whose close date changed, superseded heap entries are skipped when
+they come up and the heap is compacted once they make up most of it.
+"""
+
+from __future__ import annotations
+
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import smtplib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from typing import Callable, Iterable
+
+import requests
+
+from gradescopecalendar.gradescope.assignment import GSAssignment
+from gradescopecalendar.utils import event_name
+
+logger = logging.getLogger(__name__)
+
+# Times before the close date of an assignment a reminder is sent at
+OFFSETS = (datetime.timedelta(days=1), datetime.timedelta(hours=1))
+# Statuses of assignments nobody needs to be reminded of
+SUBMITTED = ("submitted", "submitted-late")
+# Superseded heap entries tolerated before the heap is compacted, compacting
+# a small heap is not worth it
+_COMPACT_MIN = 1024
+
+
+class Reminder:
+    """A reminder of an assignment, passed to the notifiers.
+
+    Attributes
+    ----------
+    account : str
+        the account the assignment belongs to, usually its email
+    assignment : GSAssignment
+        the assignment closing soon
+    offset : timedelta
+        time before the close date the reminder was scheduled at
+    """
+
+    __slots__ = ("account", "assignment", "offset")
+
+    def __init__(
+        self, account: str, assignment: GSAssignment, offset: datetime.timedelta
+    ) -> None:
+        self.account = account
+        self.assignment = assignment
+        self.offset = offset
+
+    @property
+    def subject(self) -> str:
+        return f"{event_name(self.assignment)} is due in {_format_offset(self.offset)}"
+
+    @property
+    def message(self) -> str:
+        lines = [
+            f"{self.assignment.name} ({self.assignment.course.name}) closes at "
+            f"{self.assignment.close_date:%a, %d %b %Y %H:%M %Z}."
+        ]
+        if self.assignment.url:
+            lines.append(self.assignment.url)
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "account": self.account,
+            "uid": self.assignment.uid,
+            "name": self.assignment.name,
+            "course": self.assignment.course.name,
+            "close_date": self.assignment.close_date.isoformat(),
+            "offset": self.offset.total_seconds(),
+            "url": self.assignment.url,
+        }
+
+
+def _format_offset(offset: datetime.timedelta) -> str:
+    minutes = int(offset.total_seconds() // 60)
+    for unit, size in (("day", 24 * 60), ("hour", 60), ("minute", 1)):
+        if minutes >= size and minutes % size == 0:
+            count = minutes // size
+            return f"{count} {unit}{'s' if count != 1 else ''}"
+    return str(offset)
+
+
+class StdoutNotifier:
+    """Prints reminders, to a terminal or the log of a service manager."""
+
+    def __init__(self, stream=None) -> None:
+        """
+        Parameters
+        ----------
+        stream : file (optional)
+            file to write to, defaults to sys.stdout at the time of writing
+        """
+
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, reminder: Reminder) -> None:
+        stream = self.stream or sys.stdout
+        with self._lock:
+            stream.write(f"[{reminder.account}] {reminder.subject}\n")
+            stream.flush()
+
+
+class WebhookNotifier:
+    """POSTs reminders as JSON to a URL, such as a local chat bot."""
+
+    def __init__(self, url: str, timeout: float = 10.0) -> None:
+        """
+        Parameters
+        ----------
+        url : str
+            URL to POST the reminders to
+        timeout : float
+            seconds to wait for the endpoint to answer
+        """
+
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def __call__(self, reminder: Reminder) -> None:
+        response = self._session.post(
+            self.url,
+            data=json.dumps(reminder.to_dict()),
+            headers={"Content-Type": "application/json"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+
+class EmailNotifier:
+    """Emails reminders to the account through an SMTP server.
+
+    A connection is opened for every reminder, reminders are rare enough that
+    keeping one open would mostly see it time out.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 25,
+        sender: str = "gradescopecalendar@localhost",
+        recipient: Callable[[str], str] = None,
+        username: str = None,
+        password: str = None,
+        starttls: bool = False,
+        timeout: float = 10.0,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        host : str
+            SMTP server to send through
+        port : int
+            port of the SMTP server
+        sender : str
+            From address of the emails
+        recipient : Callable[[str], str] (optional)
+            returns the address to email for an account, defaults to the
+            account itself
+        username : str (optional)
+            user to login to the SMTP server as, no login if None
+        password : str (optional)
+            password of the SMTP user
+        starttls : bool
+            whether to encrypt the connection with STARTTLS
+        timeout : float
+            seconds to wait for the SMTP server
+        """
+
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipient = recipient or (lambda account: account)
+        self.username = username
+        self._password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def __call__(self, reminder: Reminder) -> None:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = self.recipient(reminder.account)
+        message["Subject"] = reminder.subject
+        message.set_content(reminder.message)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username is not None:
+                smtp.login(self.username, self._password)
+            smtp.send_message(message)
+
+
+class _Deadline:
+    """The scheduled reminders of one assignment of an account."""
+
+    __slots__ = ("assignment", "close", "generation")
+
+    def __init__(self, assignment: GSAssignment, close: float, generation: int):
+        self.assignment = assignment
+        self.close = close
+        self.generation = generation
+
+
+class ReminderScheduler:
+    """Sends reminders at fixed offsets before the close dates of assignments.
+
+    Every reminder is a (time, order, account, key, generation, offset) entry
+    of a min-heap. update() compares the assignments of a sync with the
+    scheduled ones and only pushes entries for new assignments or changed
+    close dates, bumping the generation of the assignment so its old entries
+    are skipped once they reach the top of the heap. run() sleeps until the
+    earliest entry is due or an update schedules an earlier one, so the cost
+    of a sync is proportional to the assignments it changed and an idle
+    scheduler does no work.
+
+    Attributes
+    ----------
+    notifiers : list[Callable[[Reminder], None]]
+        called with every due reminder, a failing notifier does not stop the
+        others
+    offsets : tuple[timedelta]
+        times before the close date reminders are sent at
+
+    Methods
+    -------
+    update(account, assignments)
+        schedules the reminders of the current assignments of an account
+    remove(account)
+        cancels the reminders of an account
+    pop_due()
+        returns the due reminders without waiting
+    run()
+        sends the reminders as they become due until stop() is called
+    stop()
+        stops sending reminders, run() returns once the sent ones finish
+    """
+
+    def __init__(
+        self,
+        notifiers: list[Callable[[Reminder], None]],
+        offsets: Iterable[datetime.timedelta] = OFFSETS,
+        skip_submitted: bool = True,
+        workers: int = 4,
+        clock=time.time,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        notifiers : list[Callable[[Reminder], None]]
+            called with every due reminder
+        offsets : Iterable[timedelta]
+            times before the close date reminders are sent at
+        skip_submitted : bool
+            whether to cancel the reminders of submitted assignments
+        workers : int
+            maximum number of reminders sent at the same time, so a slow
+            webhook or SMTP server does not delay the other reminders
+        clock : Callable[[], float]
+            wall clock time function, replaceable for testing
+        """
+
+        self.notifiers = list(notifiers)
+        self.offsets = tuple(sorted(set(offsets), reverse=True))
+        self.skip_submitted = skip_submitted
+        self.workers = max(1, workers)
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._heap = []
+        self._order = itertools.count()
+        self._generations = itertools.count()
+        # Scheduled assignments of every account by key
+        self._deadlines = {}
+        self._stale = 0
+        self._stopped = False
+
+    def __len__(self) -> int:
+        """Number of reminders waiting to be sent."""
+
+        with self._condition:
+            return len(self._heap) - self._stale
+
+    def update(self, account: str, assignments) -> int:
+        """Schedule the reminders of the current assignments of an account.
+
+        Assignments that closed, were removed or, with skip_submitted, were
+        submitted since the last update have their reminders cancelled.
+        Reminders whose time already passed when an assignment is first seen
+        are not sent.
+
+        Parameters
+        ----------
+        account : str
+            the account, usually its email
+        assignments : GSAssignmentStore or Iterable[GSAssignment]
+            all assignments of the account, a store is only asked for those
+            closing in the future
+
+        Returns
+        -------
+        int
+            number of assignments whose reminders were rescheduled
+        """
+
+        now = self._clock()
+        if hasattr(assignments, "due_between"):
+            assignments = assignments.due_between(
+                datetime.datetime.fromtimestamp(now).astimezone()
+            )
+        elif hasattr(assignments, "values"):
+            assignments = assignments.values()
+
+        changed = 0
+        with self._condition:
+            previous = self._deadlines.get(account, {})
+            current = {}
+            earliest = self._heap[0][0] if self._heap else None
+            for assignment in assignments:
+                close = assignment.close_date.timestamp()
+                if close <= now or (
+                    self.skip_submitted and assignment.status in SUBMITTED
+                ):
+                    continue
+                key = assignment.key
+                deadline = previous.pop(key, None)
+                if deadline is not None and deadline.close == close:
+                    # Keep the scheduled reminders, with the newest details
+                    deadline.assignment = assignment
+                    current[key] = deadline
+                    continue
+                if deadline is not None:
+                    self._stale += self._pending(deadline, now)
+                deadline = _Deadline(assignment, close, next(self._generations))
+                current[key] = deadline
+                changed += 1
+                for offset in self.offsets:
+                    due = close - offset.total_seconds()
+                    if due > now:
+                        heapq.heappush(
+                            self._heap,
+                            (
+                                due,
+                                next(self._order),
+                                account,
+                                key,
+                                deadline.generation,
+                                offset,
+                            ),
+                        )
+            for deadline in previous.values():
+                self._stale += self._pending(deadline, now)
+            if current:
+                self._deadlines[account] = current
+            else:
+                self._deadlines.pop(account, None)
+            self._compact()
+            if self._heap and (earliest is None or self._heap[0][0] < earliest):
+                self._condition.notify_all()
+        if changed or previous:
+            logger.debug(
+                f"Rescheduled {changed} and cancelled {len(previous)} deadlines "
+                f"of {account}"
+            )
+        return changed
+
+    def remove(self, account: str) -> None:
+        with self._condition:
+            now = self._clock()
+            for deadline in self._deadlines.pop(account, {}).values():
+                self._stale += self._pending(deadline, now)
+            self._compact()
+
+    def _pending(self, deadline: _Deadline, now: float) -> int:
+        """Number of heap entries of a deadline not sent yet."""
+
+        return sum(
+            1
+            for offset in self.offsets
+            if deadline.close - offset.total_seconds() > now
+        )
+
+    def _is_current(self, entry: tuple) -> bool:
+        _, _, account, key, generation, _ = entry
+        deadline = self._deadlines.get(account, {}).get(key)
+        return deadline is not None and deadline.generation == generation
+
+    def _compact(self) -> None:
+        """Drop the superseded entries once they make up most of the heap."""
+
+        if self._stale < _COMPACT_MIN or self._stale * 2 < len(self._heap):
+            return
+        self._heap = [entry for entry in self._heap if self._is_current(entry)]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def run(self) -> None:
+        """Send the reminders as they become due until stop() is called."""
+
+        logger.info(f"Sending reminders {', '.join(map(str, self.offsets))} early")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                with self._condition:
+                    reminders = self._next_due()
+                    if reminders is None:
+                        break
+                for reminder in reminders:
+                    pool.submit(self._send, reminder)
+        logger.info("Stopped sending reminders")
+
+    def _next_due(self) -> list[Reminder]:
+        """Wait until reminders are due.
+
+        Must be called holding the condition.
+
+        Returns
+        -------
+        list[Reminder]
+            the due reminders, None once the scheduler is stopped
+        """
+
+        while not self._stopped:
+            due, timeout = self._pop_due()
+            if due:
+                return due
+            self._condition.wait(timeout)
+        return None
+
+    def pop_due(self) -> list[Reminder]:
+        """Take the reminders that are due without waiting.
+
+        For callers running their own loop instead of run().
+        """
+
+        with self._condition:
+            return self._pop_due()[0]
+
+    def _pop_due(self) -> tuple[list[Reminder], float]:
+        """Take the due reminders off the heap.
+
+        Must be called holding the condition.
+
+        Returns
+        -------
+        tuple (list[Reminder], float)
+            the due reminders and the seconds until the next one, None if no
+            reminder is scheduled
+        """
+
+        due = []
+        while self._heap:
+            entry = self._heap[0]
+            if not self._is_current(entry):
+                heapq.heappop(self._heap)
+                self._stale = max(0, self._stale - 1)
+                continue
+            timeout = entry[0] - self._clock()
+            if timeout > 0:
+                return due, timeout
+            heapq.heappop(self._heap)
+            _, _, account, key, _, offset = entry
+            deadline = self._deadlines[account][key]
+            due.append(Reminder(account, deadline.assignment, offset))
+        return due, None
+
+    def _send(self, reminder: Reminder) -> None:
+        for notify in self.notifiers:
+            try:
+                notify(reminder)
+            except Exception:
+                logger.exception(
+                    f"Failed to send reminder of {reminder.assignment.uid} to "
+                    f"{reminder.account} with {type(notify).__name__}"
+                )
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, Mapping
+
+
+def atomic_write(path: str | Path, data: bytes, mode: int = 0o600) -> None:
+    """Replace the contents of a file without ever exposing a partial file.
+
+    The data is written to a temporary file in the same directory which is then
+    renamed over the destination.
+
+    Parameters
+    ----------
+    path : str or Path
+        the file to write
+    data : bytes
+        the new contents of the file
+    mode : int
+        permissions of the file, defaults to owner read/write only
+    """
+
+    atomic_write_chunks(path, [data], mode, skip_unchanged=False)
+
+
+def atomic_write_chunks(
+    path: str | Path,
+    chunks: Iterable[bytes],
+    mode: int = 0o600,
+    skip_unchanged: bool = True,
+) -> bool:
+    """Stream data to a file, replacing it atomically only if it changed.
+
+    Parameters
+    ----------
+    path : str or Path
+        the file to write
+    chunks : Iterable[bytes]
+        the new contents of the file
+    mode : int
+        permissions of a new file, defaults to owner read/write only
+    skip_unchanged : bool
+        leave the file untouched, including its modification time, if the new
+        contents are identical
+
+    Returns
+    -------
+    bool
+        whether the file was replaced
+    """
+
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    digest = hashlib.sha256()
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+        if skip_unchanged and file_digest(path) == digest.hexdigest():
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
+
+
+def file_digest(path: str | Path) -> str:
+    """SHA-256 of the contents of a file, None if it does not exist."""
+
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def assignment_items(assignments: Mapping | Iterable) -> Iterator[tuple]:
+    """Iterate over (name, assignment) pairs of a dictionary or a stream.
+
+    Parameters
+    ----------
+    assignments : GSAssignmentStore, Mapping or Iterable
+        store of assignments, dictionary of assignments keyed by event name,
+        or an iterable of (name, assignment) pairs such as
+        GradescopeCalendar.iter_assignments()
+    """
+
+    # GSAssignmentStore is keyed by ID, it names its assignments itself
+    named_items = getattr(assignments, "named_items", None)
+    if named_items is not None:
+        return named_items()
+    if isinstance(assignments, Mapping):
+        return iter(assignments.items())
+    return iter(assignments)
+
+
+def event_name(assignment) -> str:
+    """Name of the calendar event of an assignment."""
+
+    return f"{assignment.name} - {assignment.course.name}"
+
+
+def event_uid(assignment) -> str:
+    """UID of the calendar event of an assignment, stable across runs."""
+
+    return f"{assignment.uid}@gradescope.com"
@@ -0,0 +1,75 @@
+"""Selecting the terms of an account and caching its course list."""
+
+from __future__ import annotations
+
+import pytest
+
+from gradescopecalendar.gradescope.account import select_terms
+from gradescopecalendar.gradescope.courselistcache import GSCourseListCache
+
+COURSES = [
+    {"cid": "1", "name": "Algorithms", "short_name": "CS 1", "year": "Fall 2021"},
+    {"cid": "2", "name": "Systems", "short_name": "CS 2", "year": "Fall 2021"},
+    {"cid": "3", "name": "Compilers", "short_name": "CS 3", "year": "Spring 2021"},
+    {"cid": "4", "name": "Seminar", "short_name": "CS 4", "year": None},
+]
+
+
+def cids(courses: list[dict]) -> list[str]:
+    return [course["cid"] for course in courses]
+
+
+@pytest.mark.parametrize(
+    "terms, expected",
+    [
+        ("active", ["1", "2", "4"]),
+        ("all", ["1", "2", "3", "4"]),
+        (None, ["1", "2", "3", "4"]),
+        ("spring  2021", ["3", "4"]),
+        (["Spring 2021", "Fall 2021"], ["1", "2", "3", "4"]),
+        (["Winter 2020"], ["4"]),
+    ],
+)
+def test_select_terms(terms, expected):
+    assert cids(select_terms(COURSES, terms)) == expected
+
+
+def test_active_term_without_terms_keeps_every_course():
+    courses = [dict(course, year=None) for course in COURSES]
+
+    assert cids(select_terms(courses)) == ["1", "2", "3", "4"]
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_course_list_is_reused_until_it_expires(tmp_path):
+    clock = Clock()
+    cache = GSCourseListCache(tmp_path, "A@example.com", ttl=60, clock=clock)
+    assert cache.get("False") is None
+
+    cache.store("False", COURSES)
+    clock.now += 60
+    assert cache.get("False") == COURSES
+    # Lists of other headings and accounts are kept apart
+    assert cache.get("True") is None
+    other = GSCourseListCache(tmp_path, "b@example.com", clock=clock)
+    assert other.get("False") is None
+    assert GSCourseListCache(tmp_path, " A@example.com ", clock=clock).get("False")
+
+    clock.now += 1
+    assert cache.get("False") is None
+
+
+def test_corrupt_course_list_is_ignored(tmp_path):
+    cache = GSCourseListCache(tmp_path, "a@example.com")
+    cache.store("False", COURSES)
+    (file,) = tmp_path.glob("*.json")
+    file.write_text("{")
+
+    assert cache.get("False") is None
@@ -0,0 +1,80 @@
+"""Loading assignments with asyncio against the local Gradescope."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from benchmarks.servers import FakeGradescope
+from gradescopecalendar.gradescope.transport import GSTransport, TokenBucket
+from gradescopecalendar.gradescopecalendar import GradescopeCalendar
+
+
+@pytest.fixture
+def gradescope():
+    with FakeGradescope(courses=3, assignments=4) as server:
+        yield server
+
+
+def calendar(gradescope: FakeGradescope, **options) -> GradescopeCalendar:
+    options.setdefault("transport", GSTransport(retries=3, backoff=0))
+    return GradescopeCalendar(
+        "a@example.com",
+        "password",
+        max_workers=4,
+        load=False,
+        base_url=gradescope.url,
+        **options,
+    )
+
+
+def test_load_async_logs_in_on_an_ip_address(gradescope):
+    loaded = calendar(gradescope)
+
+    asyncio.run(loaded.load_async())
+
+    assert len(loaded.assignments_all) == 12
+    assert gradescope.requests["POST /login"] == 1
+    assert gradescope.requests["GET (logged out)"] == 0
+
+
+def test_load_async_retries_errors(gradescope):
+    gradescope.error_rate = 0.3
+    loaded = calendar(gradescope, transport=GSTransport(retries=10, backoff=0))
+
+    asyncio.run(loaded.load_async())
+
+    assert len(loaded.assignments_all) == 12
+    assert gradescope.requests["GET (error)"] > 0
+
+
+def test_load_async_waits_for_the_rate_limit(gradescope):
+    class CountingBucket(TokenBucket):
+        acquired = 0
+
+        async def acquire_async(self) -> float:
+            CountingBucket.acquired += 1
+            return 0.0
+
+    bucket = CountingBucket(rate=1000)
+    transport = GSTransport(retries=2, backoff=0, rate_limiter=bucket)
+
+    asyncio.run(calendar(gradescope, transport=transport).load_async())
+
+    assert CountingBucket.acquired == gradescope.total_requests()
+
+
+def test_load_async_reuses_the_cached_session(gradescope, tmp_path):
+    asyncio.run(calendar(gradescope, session_cache=str(tmp_path)).load_async())
+    reloaded = calendar(gradescope, session_cache=str(tmp_path))
+
+    asyncio.run(reloaded.load_async())
+
+    assert len(reloaded.assignments_all) == 12
+    assert gradescope.requests["POST /login"] == 1
+    # Once after the login and to list the courses, then only to check the
+    # cached session
+    assert gradescope.requests["GET /account"] == 3
@@ -0,0 +1,92 @@
+"""Expiry, invalidation and pruning of the on-disk caches."""
+
+from __future__ import annotations
+
+import os
+
+from gradescopecalendar.gradescope.assignment import GSAssignment
+from gradescopecalendar.gradescope.course import GSCourse
+from gradescopecalendar.gradescope.detailcache import GSDetailCache
+from gradescopecalendar.gradescope.filecache import GSFileCache
+
+COURSE = GSCourse("Algorithms", "CS 1", "100", "", None)
+DETAILS = {"questions": ["1.1", "1.2"], "regrades_on": False}
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def assignment(status: str = "open", points=(0, 0), aid: str = "2000") -> GSAssignment:
+    return GSAssignment(
+        f"HW {aid}",
+        aid,
+        COURSE,
+        status,
+        "2021-08-25 00:00:00 +0000",
+        "2021-09-01 23:59:00 +0000",
+        points=points,
+    )
+
+
+def test_details_expire_after_the_ttl(tmp_path):
+    clock = Clock()
+    cache = GSDetailCache(tmp_path, "a@example.com", ttl=60, clock=clock)
+    assert cache.get(assignment()) is None
+
+    cache.store(assignment(), DETAILS)
+    clock.now += 60
+    assert cache.get(assignment()) == DETAILS
+    other = GSDetailCache(tmp_path, "b@example.com", clock=clock)
+    assert other.get(assignment()) is None
+
+    clock.now += 1
+    assert cache.get(assignment()) is None
+
+
+def test_changed_row_invalidates_the_details(tmp_path):
+    cache = GSDetailCache(tmp_path, "a@example.com")
+    cache.store(assignment(), DETAILS)
+
+    assert cache.get(assignment("submitted")) is None
+    assert cache.get(assignment(points=(8, 10))) is None
+    assert cache.get(assignment()) == DETAILS
+
+
+def test_prune_deletes_only_expired_entries(tmp_path):
+    clock = Clock()
+    cache = GSDetailCache(tmp_path, "a@example.com", ttl=60, clock=clock)
+    cache.store(assignment(), DETAILS)
+    cache.store(assignment(aid="2001"), DETAILS)
+    old, new = sorted(tmp_path.glob("*.json"))
+    os.utime(old, (clock.now - 61, clock.now - 61))
+    os.utime(new, (clock.now - 59, clock.now - 59))
+
+    assert cache.prune() == 1
+    assert list(tmp_path.glob("*.json")) == [new]
+    assert cache.prune() == 0
+
+
+def test_entries_without_ttl_never_expire(tmp_path):
+    clock = Clock()
+    cache = GSFileCache(tmp_path, clock=clock)
+    cache._save("key", {"fetched": 0})
+    (file,) = tmp_path.glob("*.json")
+    os.utime(file, (0, 0))
+
+    assert not cache._expired(cache._load("key"))
+    assert cache.prune() == 0
+    assert file.exists()
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = GSDetailCache(tmp_path, "a@example.com")
+    cache.store(assignment(), DETAILS)
+    (file,) = tmp_path.glob("*.json")
+    file.write_text("{")
+
+    assert cache.get(assignment()) is None
@@ -0,0 +1,173 @@
+"""Writing CalDAV events against the local CalDAV server."""
+
+from __future__ import annotations
+
+import datetime
+import threading
+
+import pytest
+
+caldav = pytest.importorskip("caldav")
+
+from benchmarks.servers import FakeCalDAV
+from gradescopecalendar.calendars.caldav import LEGACY_SLACK, CalDav
+from gradescopecalendar.gradescope.assignment import INVALID_ASSIGNMENT_ID, GSAssignment
+from gradescopecalendar.gradescope.course import GSCourse
+from gradescopecalendar.utils import event_name
+
+COURSE = GSCourse("Algorithms", "CS 1", "100", "", None)
+
+
+@pytest.fixture
+def server():
+    with FakeCalDAV() as server:
+        yield server
+
+
+def assignment(name: str, aid: str, close_date: str) -> GSAssignment:
+    url = f"https://www.gradescope.com/courses/100/assignments/{aid}/"
+    return GSAssignment(
+        name,
+        aid,
+        COURSE,
+        "open",
+        "2021-08-25 00:00:00 +0000",
+        close_date,
+        url=url if aid != INVALID_ASSIGNMENT_ID else "",
+    )
+
+
+def write(server: FakeCalDAV, assignments: list[GSAssignment]) -> CalDav:
+    caldav = CalDav(max_workers=2)
+    caldav.write_to_caldav(
+        [(event_name(a), a) for a in assignments],
+        f"{server.url}{FakeCalDAV.HOME}",
+        "Gradescope",
+        None,
+        None,
+    )
+    return caldav
+
+
+def written(caldav: CalDav) -> float:
+    return sum(
+        value
+        for (name, _), value in caldav.stats.counters.items()
+        if name == "events_written"
+    )
+
+
+def test_name_with_slash_is_written_in_the_calendar(server):
+    homework = assignment("HW 1/2", INVALID_ASSIGNMENT_ID, "2021-09-01 23:59:00 +0000")
+
+    assert written(write(server, [homework])) == 1
+    (path,) = server.objects
+    assert path.startswith(FakeCalDAV.CALENDAR)
+    assert "/" not in path[len(FakeCalDAV.CALENDAR) :]
+
+    # Found again at the same path on the next sync
+    assert written(write(server, [homework])) == 0
+    assert list(server.objects) == [path]
+
+
+def test_update_without_etag(server):
+    server.etags = False
+    write(server, [assignment("HW 1", "2000", "2021-09-01 23:59:00 +0000")])
+
+    moved = assignment("HW 1", "2000", "2021-09-02 23:59:00 +0000")
+    assert written(write(server, [moved])) == 1
+    (data,) = server.objects.values()
+    assert "DTSTART:20210902T235900Z" in data
+
+
+def test_assignment_without_deadline_does_not_widen_the_legacy_query(server):
+    dated = assignment("HW 1", "2000", "2021-09-01 23:59:00 +0000")
+    undated = assignment("Quiz", "2001", "1970-01-01 00:00:00 +0000")
+
+    write(server, [dated, undated])
+
+    ((start, end),) = server.time_ranges
+    assert start == dated.close_date - LEGACY_SLACK
+    assert end - start < 2 * LEGACY_SLACK + datetime.timedelta(minutes=1)
+
+
+def test_legacy_event_with_unknown_time_zone_is_updated(server):
+    homework = assignment("HW 1", "2000", "2021-09-01 23:59:00 -0700")
+    # Written by older versions at a random href, the fake server reads the
+    # unknown TZID as UTC, 7 hours before the deadline
+    legacy = f"{FakeCalDAV.CALENDAR}legacy.ics"
+    server.objects[legacy] = (
+        "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\n"
+        "BEGIN:VEVENT\r\nUID:legacy\r\nSUMMARY:HW 1 - Algorithms\r\n"
+        f"LOCATION:{homework.url}\r\n"
+        'DTSTART;TZID="UTC-07:00":20210901T235900\r\n'
+        'DTEND;TZID="UTC-07:00":20210901T235900\r\n'
+        "END:VEVENT\r\nEND:VCALENDAR\r\n"
+    )
+
+    assert written(write(server, [homework])) == 1
+    assert list(server.objects) == [legacy]
+    assert "DTSTART:20210902T065900Z" in server.objects[legacy]
+
+
+def test_legacy_event_at_another_time_is_not_reused(server):
+    homework = assignment("HW 1", "2000", "2021-09-01 23:59:00 -0700")
+    legacy = f"{FakeCalDAV.CALENDAR}legacy.ics"
+    server.objects[legacy] = (
+        "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\n"
+        "BEGIN:VEVENT\r\nUID:legacy\r\nSUMMARY:HW 1 - Algorithms\r\n"
+        f"LOCATION:{homework.url}\r\n"
+        "DTSTART:20210902T005900Z\r\nDTEND:20210902T005900Z\r\n"
+        "END:VEVENT\r\nEND:VCALENDAR\r\n"
+    )
+
+    assert written(write(server, [homework])) == 1
+    assert len(server.objects) == 2
+
+
+def calendar(server: FakeCalDAV):
+    client = caldav.DAVClient(url=f"{server.url}{FakeCalDAV.HOME}")
+    return client, client.principal().calendar(name="Gradescope")
+
+
+def test_event_deleted_since_listing_is_created_again(server):
+    homework = assignment("HW 1", "2000", "2021-09-01 23:59:00 +0000")
+    href = f"{FakeCalDAV.CALENDAR}deleted.ics"
+    client, cal = calendar(server)
+
+    event_url = CalDav()._write_event(client, cal, "HW 1", homework, href)
+
+    assert event_url.endswith(href)
+    assert "SUMMARY:HW 1" in server.objects[href]
+
+
+def test_failed_get_of_an_event_raises(server):
+    homework = assignment("HW 1", "2000", "2021-09-01 23:59:00 +0000")
+    href = f"{FakeCalDAV.CALENDAR}broken.ics"
+    client, cal = calendar(server)
+    server.handle = lambda method, *args: (
+        (500, {}, b"") if method == "GET" else FakeCalDAV.handle(server, method, *args)
+    )
+
+    with pytest.raises(caldav.lib.error.DAVError):
+        CalDav()._write_event(client, cal, "HW 1", homework, href)
+    assert server.objects == {}
+
+
+def test_workers_write_with_their_own_session(server, monkeypatch):
+    homeworks = [
+        assignment(f"HW {i}", str(2000 + i), "2021-09-01 23:59:00 +0000")
+        for i in range(40)
+    ]
+    sessions = {}
+    put = caldav.DAVClient.put
+
+    def record(client, *args, **kwargs):
+        sessions.setdefault(threading.get_ident(), set()).add(id(client.session))
+        return put(client, *args, **kwargs)
+
+    monkeypatch.setattr(caldav.DAVClient, "put", record)
+
+    assert written(write(server, homeworks)) == 40
+    assert all(len(ids) == 1 for ids in sessions.values())
+    assert len(set.union(*sessions.values())) == len(sessions)
@@ -0,0 +1,46 @@
+"""Reading the accounts file of the daemon."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from gradescopecalendar.daemon import load_accounts
+
+
+def accounts_file(tmp_path, entries) -> str:
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+
+def test_accounts_are_loaded(tmp_path):
+    path = accounts_file(
+        tmp_path,
+        [{"email": "a@example.edu", "password": "pw", "gcal": {"prune": True}}],
+    )
+
+    (account,) = load_accounts(path)
+
+    assert account.email == "a@example.edu"
+    assert account.gcal == {"prune": True}
+
+
+def test_unknown_key_names_the_key_and_account(tmp_path):
+    path = accounts_file(
+        tmp_path,
+        [
+            {"email": "a@example.edu", "password": "pw"},
+            {"email": "b@example.edu", "password": "pw", "calName": "Gradescope"},
+        ],
+    )
+
+    with pytest.raises(ValueError, match="'calName'.*b@example.edu"):
+        load_accounts(path)
+
+
+@pytest.mark.parametrize("entries", [{}, [{"email": "a@example.edu"}], ["a"]])
+def test_invalid_files_raise_value_error(tmp_path, entries):
+    with pytest.raises(ValueError):
+        load_accounts(accounts_file(tmp_path, entries))
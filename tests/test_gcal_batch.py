@@ -0,0 +1,149 @@
+"""Rate limited batch writes to Google Calendar against a local batch endpoint."""
+
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from benchmarks.servers import FakeGoogleCalendar
+from gradescopecalendar.calendars.gcal import MAX_RETRIES, GCal
+from gradescopecalendar.calendars.ratelimit import AdaptiveRateLimiter
+
+RATE_LIMITED = (429, "rateLimitExceeded")
+FORBIDDEN_RATE_LIMITED = (403, "rateLimitExceeded")
+
+
+@pytest.fixture
+def google():
+    with FakeGoogleCalendar() as server:
+        yield server
+
+
+@pytest.fixture
+def sleeps():
+    return []
+
+
+@pytest.fixture
+def gcal(google, sleeps):
+    gcal = GCal(rate_limiter=AdaptiveRateLimiter(sleep=sleeps.append))
+    gcal.service = google.service()
+    gcal.calendar_id = (
+        gcal.service.calendars().insert(body={"summary": "Gradescope"}).execute()["id"]
+    )
+    return gcal
+
+
+def create(uid: str) -> dict:
+    return {
+        "name": uid,
+        "uid": uid,
+        "fingerprint": None,
+        "mode": "create",
+        "event_id": None,
+        "event_body": {
+            "summary": uid,
+            "start": {"dateTime": "2021-09-01T23:59:00Z"},
+            "end": {"dateTime": "2021-09-01T23:59:00Z"},
+        },
+    }
+
+
+def write(gcal: GCal, writes: list[dict]) -> None:
+    gcal._gcal_execute_batches(gcal.service, gcal.calendar_id, writes)
+
+
+def summaries(google: FakeGoogleCalendar, gcal: GCal) -> list[str]:
+    return sorted(
+        event["summary"]
+        for event in google.events[gcal.calendar_id].values()
+        if event["status"] != "cancelled"
+    )
+
+
+@pytest.mark.parametrize("error", [RATE_LIMITED, FORBIDDEN_RATE_LIMITED])
+def test_rate_limited_parts_are_retried(google, gcal, sleeps, error):
+    google.part_errors = [error, error]
+
+    write(gcal, [create("a"), create("b"), create("c")])
+
+    assert summaries(google, gcal) == ["a", "b", "c"]
+    assert google.requests["POST batch"] == 2
+    assert gcal.stats.counters[("retries", (("backend", "gcal"),))] == 2
+    # Only the retry waited for the rate limit
+    assert len(sleeps) == 1
+
+
+def test_other_forbidden_errors_are_not_retried(google, gcal):
+    google.part_errors = [(403, "forbidden")]
+
+    write(gcal, [create("a"), create("b")])
+
+    assert summaries(google, gcal) == ["b"]
+    assert google.requests["POST batch"] == 1
+
+
+def test_rate_limited_batch_request_is_retried(google, gcal, sleeps):
+    google.batch_errors = [RATE_LIMITED]
+
+    write(gcal, [create("a"), create("b")])
+
+    assert summaries(google, gcal) == ["a", "b"]
+    assert google.requests["POST batch"] == 2
+    assert len(sleeps) == 1
+
+
+def test_gives_up_after_max_retries(google, gcal, sleeps):
+    google.part_errors = [RATE_LIMITED] * (MAX_RETRIES + 1)
+
+    write(gcal, [create("a")])
+
+    assert summaries(google, gcal) == []
+    assert google.requests["POST batch"] == MAX_RETRIES + 1
+    assert gcal.stats.counters[("retries", (("backend", "gcal"),))] == MAX_RETRIES
+    assert len(sleeps) == MAX_RETRIES
+
+
+def test_patch_of_deleted_event_creates_it(google, gcal):
+    patch = dict(create("a"), mode="patch", event_id="missing")
+    patch["patch_body"] = {"summary": "a"}
+
+    write(gcal, [patch])
+
+    assert summaries(google, gcal) == ["a"]
+    assert google.requests["POST batch"] == 2
+    assert google.requests["PATCH /calendar/v3/calendars/-/events/- (batched)"] == 1
+    assert google.requests["POST /calendar/v3/calendars/cal1/events (batched)"] == 1
+
+
+def test_delay_grows_while_rate_limited_and_decays(google, gcal, sleeps):
+    limiter = gcal.rate_limiter
+    google.part_errors = [RATE_LIMITED] * 5
+
+    # The write is rate limited five times before it succeeds
+    write(gcal, [create("a")])
+    assert summaries(google, gcal) == ["a"]
+    assert len(sleeps) == 5
+    assert all(later > earlier for earlier, later in zip(sleeps, sleeps[1:]))
+    assert sleeps[-1] <= limiter.max_delay
+    grown = limiter.delay
+    assert grown > 0
+
+    # Successful batches halve the delay until it drops back to zero
+    delays = []
+    for uid in "bcdefgh":
+        write(gcal, [create(uid)])
+        delays.append(limiter.delay)
+    assert delays[0] == grown / 2
+    assert delays == sorted(delays, reverse=True)
+    assert delays[-1] == 0.0
+
+
+def test_backoff_never_exceeds_max_delay():
+    limiter = AdaptiveRateLimiter(base_delay=1.0, max_delay=4.0, sleep=lambda _: None)
+
+    for _ in range(20):
+        limiter.backoff()
+        assert limiter.delay <= 4.0
+    assert limiter.delay == 4.0
@@ -0,0 +1,83 @@
+"""Comparing listed Google Calendar events with assignments."""
+
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from gradescopecalendar.calendars.gcal import UID_PROPERTY, GCal
+from gradescopecalendar.gradescope.assignment import GSAssignment
+from gradescopecalendar.gradescope.course import GSCourse
+
+COURSE = GSCourse("Algorithms", "CS 1", "100", "", None)
+
+
+def assignment() -> GSAssignment:
+    return GSAssignment(
+        "HW 1",
+        "2000",
+        COURSE,
+        "open",
+        "2021-08-25 00:00:00 +0000",
+        "2021-09-01 23:59:00 -0700",
+        url="https://www.gradescope.com/courses/100/assignments/2000/",
+    )
+
+
+def event(date_time: str, summary: str = "HW 1 - Algorithms") -> dict:
+    return {
+        "id": "ev1",
+        "summary": summary,
+        "location": "https://www.gradescope.com/courses/100/assignments/2000/",
+        "start": {"dateTime": date_time},
+        "end": {"dateTime": date_time},
+        "extendedProperties": {"private": {UID_PROPERTY: "100-2000"}},
+    }
+
+
+def compare(listed: dict, name: str = "HW 1 - Algorithms") -> dict:
+    end = "2021-09-01T23:59:00-0700"
+    write = {
+        "name": name,
+        "event_body": {
+            "summary": name,
+            "start": {"dateTime": end},
+            "end": {"dateTime": end},
+        },
+    }
+    return GCal()._gcal_compare_event(listed, assignment(), write)
+
+
+@pytest.mark.parametrize(
+    "date_time",
+    [
+        "2021-09-02T06:59:00Z",
+        "2021-09-02T06:59:00+00:00",
+        "2021-09-01T23:59:00-07:00",
+        "2021-09-02T02:59:00-04:00",
+    ],
+)
+def test_same_instant_in_any_offset_is_up_to_date(date_time):
+    assert compare(event(date_time)) == {"event_id": "ev1"}
+
+
+def test_rename_patches_only_the_summary():
+    listed = event("2021-09-01T23:59:00-07:00", summary="Homework 1 - Algorithms")
+
+    assert compare(listed) == {
+        "mode": "patch",
+        "patch_body": {"summary": "HW 1 - Algorithms"},
+        "event_id": "ev1",
+    }
+
+
+def test_moved_deadline_patches_start_and_end():
+    result = compare(event("2021-09-01T22:59:00-07:00"))
+
+    assert result["mode"] == "patch"
+    assert set(result["patch_body"]) == {"start", "end"}
+
+
+def test_missing_event_is_created():
+    assert compare(None) == {"mode": "create"}
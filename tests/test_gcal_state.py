@@ -0,0 +1,88 @@
+"""Syncing Google Calendar with a sync state shared by several accounts."""
+
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from benchmarks.servers import FakeGoogleCalendar
+from gradescopecalendar.calendars.gcal import GCal
+from gradescopecalendar.calendars.state import SyncState
+from gradescopecalendar.gradescope.assignment import GSAssignment
+from gradescopecalendar.gradescope.course import GSCourse
+from gradescopecalendar.utils import event_name
+
+COURSE = GSCourse("Algorithms", "CS 1", "100", "", None)
+
+
+class LocalGCal(GCal):
+    """GCal talking to the local Google Calendar API without OAuth."""
+
+    def __init__(self, server: FakeGoogleCalendar) -> None:
+        super().__init__()
+        self.server = server
+
+    def _gcal_api_setup(self):
+        return self.server.service()
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = SyncState(tmp_path / "state.db")
+    yield state
+    state.close()
+
+
+def assignments(*aids: str) -> dict:
+    homeworks = [
+        GSAssignment(
+            f"HW {aid}",
+            aid,
+            COURSE,
+            "open",
+            "2021-08-25 00:00:00 +0000",
+            "2021-09-01 23:59:00 +0000",
+            url=f"https://www.gradescope.com/courses/100/assignments/{aid}/",
+        )
+        for aid in aids
+    ]
+    return {event_name(homework): homework for homework in homeworks}
+
+
+def summaries(server: FakeGoogleCalendar) -> list[str]:
+    return sorted(
+        event["summary"]
+        for events in server.events.values()
+        for event in events.values()
+        if event["status"] != "cancelled"
+    )
+
+
+def test_unchanged_assignments_make_no_api_calls(state):
+    with FakeGoogleCalendar() as google:
+        LocalGCal(google).write_to_gcal(assignments("1", "2"), state, account="a")
+        sent = google.total_requests()
+        assert sent > 0
+
+        LocalGCal(google).write_to_gcal(
+            assignments("1", "2"), state, prune=True, account="a"
+        )
+
+        assert google.total_requests() == sent
+        assert summaries(google) == ["HW 1 - Algorithms", "HW 2 - Algorithms"]
+
+
+def test_accounts_do_not_share_synced_events(state):
+    with FakeGoogleCalendar() as first, FakeGoogleCalendar() as second:
+        LocalGCal(first).write_to_gcal(assignments("1", "2"), state, account="a")
+        # Same course in another Google account
+        LocalGCal(second).write_to_gcal(
+            assignments("1"), state, prune=True, account="b"
+        )
+        assert summaries(second) == ["HW 1 - Algorithms"]
+
+        # Pruning the second account leaves the events of the first alone
+        LocalGCal(first).write_to_gcal(assignments("1", "2"), state, account="a")
+        assert summaries(first) == ["HW 1 - Algorithms", "HW 2 - Algorithms"]
+        assert first.requests["POST batch"] == 1
@@ -0,0 +1,48 @@
+"""Conditional requests of the page cache against the local Gradescope."""
+
+from __future__ import annotations
+
+import pytest
+import requests
+
+from benchmarks.servers import FakeGradescope
+from gradescopecalendar.gradescope.pagecache import GSPageCache
+
+
+@pytest.fixture
+def gradescope():
+    with FakeGradescope(courses=2, assignments=3) as server:
+        yield server
+
+
+@pytest.fixture
+def session():
+    session = requests.Session()
+    session.cookies.set("_gradescope_session", "test")
+    return session
+
+
+def test_unchanged_page_is_not_parsed_again(gradescope, session, tmp_path):
+    cache = GSPageCache(tmp_path)
+    parsed = []
+
+    def parse(html: str) -> int:
+        parsed.append(html)
+        return len(html)
+
+    url = f"{gradescope.url}/account"
+    first = cache.fetch(session, url, parse)
+    assert cache.fetch(session, url, parse) == first
+    assert len(parsed) == 1
+
+
+def test_error_page_raises_and_keeps_the_cached_page(gradescope, session, tmp_path):
+    cache = GSPageCache(tmp_path)
+    url = f"{gradescope.url}/account"
+    cache.fetch(session, url, len)
+    cached = {path: path.read_bytes() for path in tmp_path.iterdir()}
+
+    gradescope.error_rate = 1.0
+    with pytest.raises(requests.HTTPError):
+        cache.fetch(session, url, lambda html: pytest.fail("error page parsed"))
+    assert {path: path.read_bytes() for path in tmp_path.iterdir()} == cached
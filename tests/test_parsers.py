@@ -0,0 +1,74 @@
+"""HTML parser backends on the saved Gradescope pages."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from benchmarks.pages import account_page
+from gradescopecalendar.gradescope.parsers import (
+    PARSERS,
+    HTMLParserBackend,
+    SoupParser,
+    get_parser,
+)
+
+FIXTURES = Path(__file__).parent.parent / "benchmarks" / "fixtures"
+
+
+def test_incomplete_backend_fails_when_created():
+    class NoRows(HTMLParserBackend):
+        name = "no-rows"
+
+        def auth_token(self, html: str) -> str:
+            return ""
+
+        def course_list(self, html: str, heading: str) -> list[dict]:
+            return []
+
+    with pytest.raises(TypeError):
+        NoRows()
+
+
+@pytest.mark.parametrize("name", list(PARSERS))
+def test_backends_agree(name):
+    try:
+        backend = get_parser(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+    reference = SoupParser()
+    for page, method, args in (
+        ("home.html", "auth_token", ()),
+        ("account.html", "course_list", ("Your Courses",)),
+        ("course.html", "assignment_rows", ()),
+    ):
+        html = (FIXTURES / page).read_text()
+        expected = getattr(reference, method)(html, *args)
+        assert expected
+        assert getattr(backend, method)(html, *args) == expected
+
+
+@pytest.mark.parametrize("name", list(PARSERS))
+def test_courses_are_listed_with_their_term(name):
+    try:
+        backend = get_parser(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+    html = account_page(courses=6, terms=3).replace(
+        '<h1 class="pageHeading">Your Courses</h1>',
+        '<h1 class="pageHeading">Your Courses</h1>\n<!-- Terms -->\n',
+    )
+
+    courses = backend.course_list(html, "Your Courses")
+
+    assert [(course["cid"], course["year"]) for course in courses] == [
+        ("100000", "Fall 2021"),
+        ("100001", "Fall 2021"),
+        ("100002", "Summer 2021"),
+        ("100003", "Summer 2021"),
+        ("100004", "Spring 2021"),
+        ("100005", "Spring 2021"),
+    ]
+    assert courses[0]["short_name"] == "CS 000"
+    assert courses[0]["name"] == "Course number 100000"
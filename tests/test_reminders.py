@@ -0,0 +1,95 @@
+"""Scheduling, rescheduling and cancelling reminders."""
+
+from __future__ import annotations
+
+import datetime
+
+from gradescopecalendar.gradescope.assignment import GSAssignment
+from gradescopecalendar.gradescope.course import GSCourse
+from gradescopecalendar.reminders import ReminderScheduler
+
+COURSE = GSCourse("Algorithms", "CS 1", "100", "", None)
+# Wall clock time the tests start at, 2021-09-01 00:00:00 UTC
+START = 1630454400.0
+HOUR = datetime.timedelta(hours=1)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = START
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def assignment(hours: float, aid: str = "2000", status: str = "open") -> GSAssignment:
+    close = datetime.datetime.fromtimestamp(START, datetime.timezone.utc)
+    close += datetime.timedelta(hours=hours)
+    return GSAssignment(
+        f"HW {aid}",
+        aid,
+        COURSE,
+        status,
+        "2021-08-25 00:00:00 +0000",
+        f"{close:%Y-%m-%d %H:%M:%S %z}",
+    )
+
+
+def scheduler() -> tuple[ReminderScheduler, Clock]:
+    clock = Clock()
+    return ReminderScheduler([], offsets=[HOUR], clock=clock), clock
+
+
+def fired(reminders: ReminderScheduler, clock: Clock, hours: float) -> list[float]:
+    """Hours the reminders fire at, moving the clock every minute for some hours."""
+
+    times = []
+    for _ in range(int(hours * 60)):
+        clock.now += 60
+        times.extend((clock.now - START) / 3600 for _ in reminders.pop_due())
+    return times
+
+
+def test_reminder_fires_once_before_the_close_date():
+    reminders, clock = scheduler()
+    assert reminders.update("a@example.com", [assignment(5)]) == 1
+    assert len(reminders) == 1
+
+    assert fired(reminders, clock, 10) == [4]
+    assert len(reminders) == 0
+
+
+def test_rescheduled_reminder_fires_once_at_the_new_time():
+    reminders, clock = scheduler()
+    reminders.update("a@example.com", [assignment(5)])
+
+    assert reminders.update("a@example.com", [assignment(8)]) == 1
+    assert len(reminders) == 1
+    # The same close date again does not reschedule anything
+    assert reminders.update("a@example.com", [assignment(8)]) == 0
+
+    assert fired(reminders, clock, 10) == [7]
+
+
+def test_cancelled_reminders_never_fire():
+    reminders, clock = scheduler()
+    reminders.update("a@example.com", [assignment(5, "1"), assignment(6, "2")])
+    reminders.update("b@example.com", [assignment(5, "3")])
+
+    # Removed from the account and submitted
+    reminders.update("a@example.com", [assignment(6, "2", status="submitted")])
+    reminders.remove("b@example.com")
+
+    assert len(reminders) == 0
+    assert fired(reminders, clock, 10) == []
+
+
+def test_changed_deadline_rearms_a_sent_reminder():
+    reminders, clock = scheduler()
+    reminders.update("a@example.com", [assignment(2)])
+    assert fired(reminders, clock, 1.5) == [1]
+
+    # Extended after the reminder was sent
+    reminders.update("a@example.com", [assignment(4)])
+
+    assert fired(reminders, clock, 5) == [3]
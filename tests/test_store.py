@@ -0,0 +1,88 @@
+"""Range queries of the assignment store."""
+
+from __future__ import annotations
+
+import datetime
+
+from gradescopecalendar.gradescope.assignment import GSAssignment
+from gradescopecalendar.gradescope.course import GSCourse
+from gradescopecalendar.gradescope.store import GSAssignmentStore
+
+ALGORITHMS = GSCourse("Algorithms", "CS 1", "100", "", None)
+SYSTEMS = GSCourse("Systems", "CS 2", "200", "", None)
+# Placeholder close date of assignments without a deadline
+NO_DEADLINE = "1970-01-01 00:00:00 +0000"
+
+
+def assignment(course: GSCourse, aid: str, close_date: str) -> GSAssignment:
+    return GSAssignment(f"HW {aid}", aid, course, "open", NO_DEADLINE, close_date)
+
+
+def date(value: str) -> datetime.datetime:
+    return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S %z")
+
+
+def names(assignments) -> list[str]:
+    return [a.name for a in assignments]
+
+
+def store() -> GSAssignmentStore:
+    return GSAssignmentStore(
+        [
+            assignment(ALGORITHMS, "3", "2021-09-03 12:00:00 +0000"),
+            assignment(ALGORITHMS, "1", "2021-09-01 12:00:00 +0000"),
+            assignment(SYSTEMS, "2", "2021-09-02 05:00:00 -0700"),
+            assignment(SYSTEMS, "0", NO_DEADLINE),
+        ]
+    )
+
+
+def test_due_between_is_ordered_by_close_date():
+    assert names(store().due_between()) == ["HW 0", "HW 1", "HW 2", "HW 3"]
+
+
+def test_due_between_includes_start_and_excludes_end():
+    assignments = store()
+
+    # HW 2 closes at 2021-09-02 12:00 UTC, given with a -0700 offset
+    start = date("2021-09-02 12:00:00 +0000")
+    end = date("2021-09-03 12:00:00 +0000")
+    assert names(assignments.due_between(start, end)) == ["HW 2"]
+    assert names(assignments.due_between(end=start)) == ["HW 0", "HW 1"]
+    assert names(assignments.due_between(start=end)) == ["HW 3"]
+
+
+def test_assignments_without_deadline_are_not_upcoming():
+    now = date("2021-08-01 00:00:00 +0000")
+
+    upcoming = store().due_within(datetime.timedelta(days=60), now=now)
+
+    assert names(upcoming) == ["HW 1", "HW 2", "HW 3"]
+
+
+def test_index_is_rebuilt_after_insert_and_replace():
+    assignments = store()
+    start = date("2021-09-02 00:00:00 +0000")
+    assert names(assignments.due_between(start)) == ["HW 2", "HW 3"]
+
+    assignments.add(assignment(ALGORITHMS, "4", "2021-09-02 18:00:00 +0000"))
+    assert names(assignments.due_between(start)) == ["HW 2", "HW 4", "HW 3"]
+
+    # Replacing an assignment moves it in the index
+    assignments.add(assignment(ALGORITHMS, "3", "2021-08-30 12:00:00 +0000"))
+    assert names(assignments.due_between(start)) == ["HW 2", "HW 4"]
+    assert len(assignments) == 5
+
+    assignments.discard(("200", "2"))
+    assert names(assignments.due_between(start)) == ["HW 4"]
+
+
+def test_in_course_and_courses():
+    assignments = store()
+
+    assert names(assignments.in_course("100")) == ["HW 3", "HW 1"]
+    assert names(assignments.in_course("300")) == []
+
+    assignments.discard(("200", "2"))
+    assignments.discard(("200", "0"))
+    assert list(assignments.courses) == ["100"]
@@ -0,0 +1,93 @@
+"""Failed Gradescope requests against the local Gradescope."""
+
+from __future__ import annotations
+
+import pytest
+import requests
+
+from benchmarks.servers import FakeGradescope
+from gradescopecalendar.gradescope.account import GSAccount
+from gradescopecalendar.gradescope.course import GSCourse
+from gradescopecalendar.gradescope.transport import GSTransport, TokenBucket
+
+
+@pytest.fixture
+def gradescope():
+    with FakeGradescope(courses=2, assignments=3) as server:
+        yield server
+
+
+@pytest.fixture
+def session():
+    session = GSTransport(retries=2, backoff=0).session()
+    session.cookies.set("_gradescope_session", "test")
+    return session
+
+
+def course(gradescope: FakeGradescope, session: requests.Session) -> GSCourse:
+    return GSCourse("Course", "C", "1", "", session, base_url=gradescope.url)
+
+
+def test_retries_recover_from_errors(gradescope, session):
+    gradescope.error_rate = 0.5
+    loaded = course(gradescope, session)
+
+    loaded._load_assignments()
+
+    assert len(loaded.assignments) == 3
+
+
+def test_course_fails_once_retries_run_out(gradescope, session):
+    gradescope.error_rate = 1.0
+    failed = course(gradescope, session)
+
+    with pytest.raises(requests.HTTPError):
+        failed._load_assignments()
+    with pytest.raises(requests.HTTPError):
+        list(failed.iter_assignments())
+    assert failed.assignments == {}
+    assert gradescope.requests["GET (error)"] == 6
+
+
+def test_account_fails_once_retries_run_out(gradescope, session):
+    gradescope.error_rate = 1.0
+    account = GSAccount(session, base_url=gradescope.url)
+
+    with pytest.raises(requests.HTTPError):
+        account.add_courses_in_account()
+    assert account.courses == {}
+
+
+class CountingBucket(TokenBucket):
+    """Unlimited bucket counting the tokens taken."""
+
+    def __init__(self) -> None:
+        super().__init__(rate=1000, burst=1000)
+        self.acquired = 0
+
+    def acquire(self) -> float:
+        self.acquired += 1
+        return 0.0
+
+
+def test_every_retry_waits_for_the_rate_limit(gradescope):
+    bucket = CountingBucket()
+    session = GSTransport(retries=2, backoff=0, rate_limiter=bucket).session()
+    gradescope.error_rate = 1.0
+
+    response = session.get(f"{gradescope.url}/courses/1")
+
+    assert response.status_code in (429, 503)
+    assert gradescope.requests["GET (error)"] == 3
+    assert bucket.acquired == 3
+
+
+def test_rate_limit_spaces_out_requests():
+    now = [0.0]
+    waits = []
+    bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0], sleep=waits.append)
+
+    assert [bucket.acquire() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] += 10
+    assert bucket.acquire() == 0.0
+    assert waits == [0.5, 1.0]